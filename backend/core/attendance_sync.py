@@ -1,73 +1,126 @@
 """
 Today's attendance sync: mark punch-in rows as Present; after cutoff time mark no-punch as Absent
-and create Absent rows for active employees with no row. Used by middleware (every ~3 min),
-Celery (every 1 hour), and after attendance upload.
+and create Absent rows for active employees with no row. Used by the background scheduler
+(core.scheduler, separate cadences for the two parts), Celery (every 1 hour), and after attendance upload.
 """
+import logging
+
 from django.utils import timezone
-from .models import Attendance, Employee, SystemSetting
+from .models import Attendance, Company, CompanySetting, Employee
+from .settings_utils import get_company_setting, set_company_setting
+from .streak_state import safe_update_streak_state
+from . import data_version
 
-_LAST_ABSENT_RUN_DATE = None  # when not force_run, run Absent logic only once per day
+logger = logging.getLogger(__name__)
 
+AUTO_ABSENT_LAST_RUN_KEY = 'auto_absent_last_run'  # CompanySetting per company: date auto-absent last ran
+DEFAULT_ABSENT_CUTOFF = '11:50'
 
-def _run_auto_absent(force_run=False):
-    """
-    After cutoff time (default 11:50 AM): mark today's no-punch rows as Absent and create
-    Absent rows for active employees with no row. If force_run=True, run even if already run today.
-    """
-    global _LAST_ABSENT_RUN_DATE
-    try:
-        cutoff_val = SystemSetting.objects.filter(key='absent_cutoff_time').values_list('value', flat=True).first()
-    except Exception:
-        cutoff_val = None
+
+def _cutoff_minutes(company_id=None):
+    """Absent cutoff (absent_cutoff_time, 'HH:MM') for the company as minutes after midnight."""
+    cutoff_val = get_company_setting('absent_cutoff_time', company_id=company_id, default=DEFAULT_ABSENT_CUTOFF)
     if not cutoff_val or not str(cutoff_val).strip():
-        cutoff_val = '11:50'
+        cutoff_val = DEFAULT_ABSENT_CUTOFF
     parts = str(cutoff_val).strip().split(':')
     try:
         cutoff_hour = int(parts[0])
         cutoff_min = int(parts[1]) if len(parts) > 1 else 0
     except (ValueError, IndexError):
         cutoff_hour, cutoff_min = 11, 50
-    now = timezone.now()
-    today = timezone.localdate()
-    current_minutes = now.hour * 60 + now.minute
-    cutoff_minutes = cutoff_hour * 60 + cutoff_min
-    if current_minutes < cutoff_minutes and not force_run:
-        return
-    if not force_run and _LAST_ABSENT_RUN_DATE == today:
-        return
-    if not force_run:
-        _LAST_ABSENT_RUN_DATE = today
-    if today.weekday() == 6:  # Sunday
-        return
-    Attendance.objects.filter(
+    return cutoff_hour * 60 + cutoff_min
+
+
+def _auto_absent_last_run(company_id):
+    """Own CompanySetting row only (no fallback to the global layer, which is a different scope)."""
+    return CompanySetting.objects.filter(company_id=company_id, key=AUTO_ABSENT_LAST_RUN_KEY).values_list('value', flat=True).first()
+
+
+def _auto_absent_for_company(company_id, today):
+    """
+    Mark today's no-punch rows Absent and bulk-create Absent rows for active employees without one,
+    for one company (None = employees with no company). Returns {'marked_absent', 'created'}.
+    """
+    company_emps = Employee.objects.filter(company_id=company_id) if company_id is not None else Employee.objects.filter(company__isnull=True)
+    to_absent = Attendance.objects.filter(
         date=today,
-        punch_in__isnull=True
-    ).exclude(status='Absent').update(status='Absent')
-    existing_emp_codes = set(
-        Attendance.objects.filter(date=today).values_list('emp_code', flat=True)
-    )
-    active_codes = list(
-        Employee.objects.filter(status=Employee.STATUS_ACTIVE).values_list('emp_code', flat=True)
-    )
-    for emp_code in active_codes:
-        if emp_code in existing_emp_codes:
-            continue
-        Attendance.objects.get_or_create(
-            emp_code=emp_code,
-            date=today,
-            defaults={'status': 'Absent', 'name': ''}
+        punch_in__isnull=True,
+        emp_code__in=company_emps.values('emp_code'),
+    ).exclude(status='Absent')
+    changed_codes = list(to_absent.values_list('emp_code', flat=True))
+    marked = to_absent.update(status='Absent') if changed_codes else 0
+    active = dict(company_emps.filter(status=Employee.STATUS_ACTIVE).values_list('emp_code', 'name'))
+    existing = set(
+        Attendance.objects.filter(date=today, emp_code__in=list(active)).values_list('emp_code', flat=True)
+    ) if active else set()
+    missing = [code for code in active if code not in existing]
+    if missing:
+        Attendance.objects.bulk_create(
+            [Attendance(emp_code=code, date=today, status='Absent', name=active[code] or '') for code in missing],
+            batch_size=1000,
+            ignore_conflicts=True,  # a punch may land between the read and the insert
         )
+    safe_update_streak_state((c, today) for c in changed_codes + missing)
+    if changed_codes or missing:
+        data_version.bump(company_ids=[company_id])
+    return {'marked_absent': marked, 'created': len(missing)}
 
 
-def run_today_attendance_sync(force_absent=False):
+def _run_auto_absent(force_run=False, company_id=None):
     """
-    Sync today's attendance: (1) Mark rows with punch_in as Present.
-    (2) After cutoff time, mark no-punch as Absent and create Absent rows for active employees.
-    Call with force_absent=True after attendance upload to recalc immediately.
+    Per company, after that company's cutoff time (absent_cutoff_time, default 11:50 AM) on its working days:
+    mark today's no-punch rows as Absent and create Absent rows for active employees with no row.
+    Runs once per day per company unless force_run=True (then also before the cutoff).
+    company_id limits the run to one company. Returns {company_id: {'marked_absent', 'created'}} for companies run.
     """
+    from .work_calendar import is_working_day
+    now = timezone.localtime()
+    today = now.date()
+    current_minutes = now.hour * 60 + now.minute
+    if company_id is not None:
+        company_ids = [company_id]
+    else:
+        company_ids = list(Company.objects.values_list('id', flat=True))
+        if Employee.objects.filter(company__isnull=True).exists():
+            company_ids.append(None)
+    results = {}
+    for cid in company_ids:
+        if not force_run:
+            if current_minutes < _cutoff_minutes(cid):
+                continue
+            if _auto_absent_last_run(cid) == today.isoformat():
+                continue
+            set_company_setting(AUTO_ABSENT_LAST_RUN_KEY, today.isoformat(), cid, description='Last date auto-absent ran')
+        if not is_working_day(today, company_id=cid):  # weekly off / holiday
+            continue
+        results[cid] = _auto_absent_for_company(cid, today)
+        if results[cid]['marked_absent'] or results[cid]['created']:
+            logger.info('Auto-absent company %s: %s', cid, results[cid])
+    return results
+
+
+def mark_today_punched_present():
+    """Set status=Present on today's rows that have a punch_in. Returns count updated."""
     today = timezone.localdate()
-    Attendance.objects.filter(
+    to_present = Attendance.objects.filter(
         date=today,
         punch_in__isnull=False
-    ).exclude(status='Present').update(status='Present')
-    _run_auto_absent(force_run=force_absent)
+    ).exclude(status='Present')
+    changed_codes = list(to_present.values_list('emp_code', flat=True))
+    if changed_codes:
+        to_present.update(status='Present')
+        safe_update_streak_state((c, today) for c in changed_codes)
+        data_version.bump(emp_codes=changed_codes)
+    return len(changed_codes)
+
+
+def run_today_attendance_sync(force_absent=False, company_id=None):
+    """
+    Sync today's attendance: (1) Mark rows with punch_in as Present.
+    (2) After cutoff time, mark no-punch as Absent and create Absent rows for active employees.
+    Call with force_absent=True after attendance upload to recalc immediately.
+    Returns {'present': n, 'absent': {company_id: counts}}.
+    """
+    present = mark_today_punched_present()
+    absent = _run_auto_absent(force_run=force_absent, company_id=company_id)
+    return {'present': present, 'absent': absent}
@@ -0,0 +1,195 @@
+"""
+Per-company data version (CompanyDataVersion) so the Google Sheet sync only runs for companies whose
+data changed. Row saves/deletes of Attendance, Employee, Salary, SalaryAdvance, Penalty and
+ShiftOvertimeBonus bump the owning company through model signals; bulk write paths (queryset
+update / bulk_create) call bump() themselves. Inside deferred() bumps are collected and applied once
+on exit, so an upload of thousands of rows costs one bump per company.
+The sync is due when the version moved past the last pushed one and writes have settled for
+SETTLE_SECONDS (or have been pending MAX_DELAY_SECONDS), or when the last push was before today
+(the sheets show yesterday / this month / this year).
+"""
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from django.db import IntegrityError, models
+from django.db.models import F, Max, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+SETTLE_SECONDS = 20  # wait for a burst (upload, bulk edit) to finish before syncing
+MAX_DELAY_SECONDS = 300  # but never hold a changed company back longer than this
+GLOBAL_SYNCED_AT_KEY = 'google_sheet_synced_at'  # CompanySetting (company null): start of last global sheet push
+
+_local = threading.local()
+
+
+def _company_q(company_id):
+    return models.Q(company_id=company_id) if company_id is not None else models.Q(company__isnull=True)
+
+
+# ---------- Bumps ----------
+def _apply(emp_codes, company_ids):
+    from .models import CompanyDataVersion, Employee
+    company_ids = set(company_ids)
+    emp_codes = {c for c in emp_codes if c}
+    if emp_codes:
+        found = set()
+        for emp_code, company_id in Employee.objects.filter(emp_code__in=list(emp_codes)).values_list('emp_code', 'company_id'):
+            found.add(emp_code)
+            company_ids.add(company_id)
+        if emp_codes - found:
+            company_ids.add(None)  # attendance / salary rows of unknown emp codes: global sheet only
+    now = timezone.now()
+    for company_id in company_ids:
+        changed = CompanyDataVersion.objects.filter(_company_q(company_id)).update(
+            version=F('version') + 1, changed_at=now,
+            pending_since=Coalesce('pending_since', Value(now, output_field=models.DateTimeField())),
+        )
+        if not changed:
+            try:
+                CompanyDataVersion.objects.create(company_id=company_id, version=1, changed_at=now, pending_since=now)
+            except IntegrityError:  # created concurrently
+                CompanyDataVersion.objects.filter(_company_q(company_id)).update(version=F('version') + 1, changed_at=now)
+
+
+def bump(emp_codes=(), company_ids=()):
+    """
+    Record a change for the companies of emp_codes (None when a code matches no employee) and company_ids.
+    Never raises: a failed bump only delays the sheet until the next change or the daily resync.
+    """
+    pending = getattr(_local, 'pending', None)
+    if pending is not None:
+        pending[0].update(emp_codes)
+        pending[1].update(company_ids)
+        return
+    try:
+        _apply(emp_codes, company_ids)
+    except Exception:
+        logger.warning('Data version bump failed', exc_info=True)
+
+
+@contextmanager
+def deferred():
+    """Collect bumps in the block (signals and bump() calls) and apply them once on exit. Nests; usable as a decorator."""
+    outer = getattr(_local, 'pending', None)
+    if outer is not None:
+        yield
+        return
+    _local.pending = (set(), set())
+    try:
+        yield
+    finally:
+        emp_codes, company_ids = _local.pending
+        _local.pending = None
+        if emp_codes or company_ids:
+            bump(emp_codes, company_ids)
+
+
+def _on_row_change(sender, instance, **kwargs):
+    from .models import Employee
+    if isinstance(instance, Employee):
+        # Company itself (covers a company change: the old company is caught by pre_save below)
+        bump(company_ids=[instance.company_id])
+        old_company = getattr(instance, '_data_version_old_company', instance.company_id)
+        if old_company != instance.company_id:
+            bump(company_ids=[old_company])
+    else:
+        bump(emp_codes=[getattr(instance, 'emp_code', None)])
+
+
+def _remember_employee_company(sender, instance, **kwargs):
+    if instance.pk:
+        instance._data_version_old_company = sender.objects.filter(pk=instance.pk).values_list('company_id', flat=True).first()
+
+
+def connect_signals():
+    """Called from CoreConfig.ready()."""
+    from .models import Attendance, Employee, Penalty, Salary, SalaryAdvance, ShiftOvertimeBonus
+    for model in (Attendance, Employee, Salary, SalaryAdvance, Penalty, ShiftOvertimeBonus):
+        post_save.connect(_on_row_change, sender=model, dispatch_uid=f'data_version_save_{model.__name__}')
+        post_delete.connect(_on_row_change, sender=model, dispatch_uid=f'data_version_delete_{model.__name__}')
+    pre_save.connect(_remember_employee_company, sender=Employee, dispatch_uid='data_version_employee_company')
+
+
+def current_version(company_id=None):
+    """Version token of a company's data; company_id None = all companies (any bump anywhere changes it)."""
+    from .models import CompanyDataVersion
+    if company_id is not None:
+        return CompanyDataVersion.objects.filter(company_id=company_id).values_list('version', flat=True).first() or 0
+    agg = CompanyDataVersion.objects.aggregate(total=models.Sum('version'), latest=Max('changed_at'))
+    return f"{agg['total'] or 0}:{agg['latest'].isoformat() if agg['latest'] else ''}"
+
+
+# ---------- Sync side ----------
+def sync_point(company_id):
+    """Token to pass to mark_synced() after a successful push: the company's version, or (global sheet) the start time."""
+    from .models import CompanyDataVersion
+    if company_id is None:
+        return timezone.now()
+    return CompanyDataVersion.objects.filter(company_id=company_id).values_list('version', flat=True).first() or 0
+
+
+def mark_synced(company_id, token):
+    """The sheet now reflects everything up to token (from sync_point before the push started)."""
+    from .models import CompanyDataVersion
+    now = timezone.now()
+    if company_id is None:
+        from .settings_utils import set_company_setting
+        set_company_setting(GLOBAL_SYNCED_AT_KEY, token.isoformat(), None, description='Start of last global Google Sheet push')
+        return
+    if not CompanyDataVersion.objects.filter(company_id=company_id).exists():
+        try:
+            CompanyDataVersion.objects.create(company_id=company_id)
+        except IntegrityError:
+            pass
+    rows = CompanyDataVersion.objects.filter(company_id=company_id)
+    # Writes that landed during the push keep the company pending
+    rows.filter(version__lte=token).update(synced_version=token, synced_at=now, pending_since=None)
+    rows.filter(version__gt=token).update(synced_version=token, synced_at=now)
+
+
+def _settled(changed_at, pending_since, now):
+    if changed_at is None:
+        return True
+    if now - changed_at >= timedelta(seconds=SETTLE_SECONDS):
+        return True
+    return pending_since is not None and now - pending_since >= timedelta(seconds=MAX_DELAY_SECONDS)
+
+
+def due_for_sync(company_ids):
+    """Subset of company_ids whose sheet needs a push now (see module docstring). Never-synced companies are due."""
+    from .models import CompanyDataVersion
+    now = timezone.now()
+    today = timezone.localdate()
+    rows = {r.company_id: r for r in CompanyDataVersion.objects.filter(company_id__in=list(company_ids))}
+    due = []
+    for company_id in company_ids:
+        row = rows.get(company_id)
+        if row is None or row.synced_at is None or timezone.localdate(row.synced_at) < today:
+            due.append(company_id)
+        elif row.version > row.synced_version and _settled(row.changed_at, row.pending_since, now):
+            due.append(company_id)
+    return due
+
+
+def global_sheet_due():
+    """Whether the global sheet (all companies, sync_all(company_id=None)) needs a push."""
+    from .models import CompanyDataVersion
+    from .settings_utils import get_company_setting
+    raw = get_company_setting(GLOBAL_SYNCED_AT_KEY, company_id=None, default='')
+    try:
+        last = datetime.fromisoformat(raw) if raw else None
+    except ValueError:
+        last = None
+    if last is None or timezone.localdate(last) < timezone.localdate():
+        return True
+    latest = CompanyDataVersion.objects.filter(changed_at__gt=last).aggregate(latest=Max('changed_at'))['latest']
+    if latest is None:
+        return False
+    now = timezone.now()
+    return now - latest >= timedelta(seconds=SETTLE_SECONDS) or now - last >= timedelta(seconds=MAX_DELAY_SECONDS)
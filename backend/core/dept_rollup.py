@@ -0,0 +1,255 @@
+"""
+Department x month rollup (DeptMonthRollup) for the plant reports.
+Sheet 1 (all dates by month) and Sheet 2 (current year) read these rows instead of rebuilding the
+payroll matrix over all attendance history. Write paths mark (company, year, month) stale
+(DeptRollupStaleMonth); refresh_rollups() rebuilds only those months plus the current one.
+Rows use each employee's current department and rates, like the sheets always did, so editing an
+employee marks every month they have data in. A nightly rebuild_all() catches anything missed.
+Scope: company_id rows hold that company's employees; company None rows hold employees without a
+company and attendance of emp codes that match no employee.
+"""
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from .models import Attendance, Company, Employee, Salary, DeptMonthRollup, DeptRollupStaleMonth
+from . import job_lock
+
+logger = logging.getLogger(__name__)
+
+HOURS_PER_MONTH = 208.0  # 26 days x 8 hrs, same as build_payroll_rows
+
+
+def _company_q(company_id):
+    return Q(company_id=company_id) if company_id is not None else Q(company__isnull=True)
+
+
+def _scope_employees(company_id):
+    return Employee.objects.filter(_company_q(company_id))
+
+
+def _scope_attendance(company_id):
+    """Attendance belonging to the scope (see module docstring)."""
+    if company_id is not None:
+        return Attendance.objects.filter(emp_code__in=_scope_employees(company_id).values('emp_code'))
+    return Attendance.objects.filter(
+        Q(emp_code__in=_scope_employees(None).values('emp_code'))
+        | ~Q(emp_code__in=Employee.objects.filter(company__isnull=False).values('emp_code'))
+    )
+
+
+def _all_scopes():
+    return list(Company.objects.values_list('id', flat=True)) + [None]
+
+
+def _hourly_rate(salary_type, base):
+    return base if salary_type == 'Hourly' else (base / HOURS_PER_MONTH if base else 0.0)
+
+
+# ---------- Stale marks (write paths) ----------
+def mark_months_stale(emp_months, company_ids=()):
+    """
+    emp_months: iterable of (emp_code, year, month) whose attendance or Salary.bonus changed.
+    Marks the month for every company the emp code belongs to (None when it matches no employee),
+    and for each of company_ids (e.g. the company an employee just left).
+    """
+    months_by_code = defaultdict(set)
+    for emp_code, year, month in emp_months:
+        if emp_code and year and month:
+            months_by_code[emp_code].add((int(year), int(month)))
+    if not months_by_code:
+        return 0
+    companies_by_code = defaultdict(set)
+    for emp_code, company_id in Employee.objects.filter(emp_code__in=list(months_by_code)).values_list('emp_code', 'company_id'):
+        companies_by_code[emp_code].add(company_id)
+    marks = set()
+    for emp_code, months in months_by_code.items():
+        for company_id in (companies_by_code.get(emp_code) or {None}) | set(company_ids):
+            for year, month in months:
+                marks.add((company_id, year, month))
+    DeptRollupStaleMonth.objects.bulk_create(
+        [DeptRollupStaleMonth(company_id=c, year=y, month=m) for c, y, m in marks],
+        batch_size=1000, ignore_conflicts=True,
+    )
+    return len(marks)
+
+
+def mark_dates_stale(emp_dates):
+    """emp_dates: iterable of (emp_code, date) whose attendance row was created/changed."""
+    return mark_months_stale((emp_code, d.year, d.month) for emp_code, d in emp_dates if d)
+
+
+def mark_employees_stale(emp_codes, company_ids=()):
+    """Employee department / salary type / company changed: every month with attendance or Salary for them."""
+    emp_codes = [c for c in emp_codes if c]
+    if not emp_codes:
+        return 0
+    months = set()
+    for d in Attendance.objects.filter(emp_code__in=emp_codes).dates('date', 'month'):
+        months.add((d.year, d.month))
+    months |= set(Salary.objects.filter(emp_code__in=emp_codes).values_list('year', 'month').distinct())
+    return mark_months_stale(((c, y, m) for c in emp_codes for y, m in months), company_ids=company_ids)
+
+
+def mark_month_stale(year, month):
+    """Whole month for every company (e.g. ensure_monthly_salaries rewrote Salary base for everyone)."""
+    DeptRollupStaleMonth.objects.bulk_create(
+        [DeptRollupStaleMonth(company_id=c, year=year, month=month) for c in _all_scopes()],
+        ignore_conflicts=True,
+    )
+
+
+def _safe(func, *args, **kwargs):
+    try:
+        return func(*args, **kwargs)
+    except Exception:
+        logger.warning('Dept rollup stale mark failed (%s)', func.__name__, exc_info=True)
+        return 0
+
+
+def safe_mark_dates_stale(emp_dates):
+    """mark_dates_stale for write paths: never fail the caller's request/upload."""
+    return _safe(mark_dates_stale, emp_dates)
+
+
+def safe_mark_months_stale(emp_months, company_ids=()):
+    return _safe(mark_months_stale, emp_months, company_ids=company_ids)
+
+
+def safe_mark_employees_stale(emp_codes, company_ids=()):
+    return _safe(mark_employees_stale, emp_codes, company_ids=company_ids)
+
+
+def safe_mark_month_stale(year, month):
+    return _safe(mark_month_stale, year, month)
+
+
+# ---------- Rebuild ----------
+def rebuild_month(company_id, year, month):
+    """Recompute the scope's rows for one month from Attendance + Salary. Returns number of dept rows."""
+    emps = {
+        e['emp_code']: ((e['dept_name'] or ''), (e['salary_type'] or 'Monthly').strip() or 'Monthly', float(e['base_salary'] or 0))
+        for e in _scope_employees(company_id).values('emp_code', 'dept_name', 'salary_type', 'base_salary')
+    }
+    totals = defaultdict(lambda: {'man_hours': 0.0, 'present_count': 0, 'absent_count': 0, 'salary': 0.0, 'bonus_hours': 0.0, 'bonus_amount': 0.0})
+
+    att = _scope_attendance(company_id).filter(date__year=year, date__month=month).values_list('emp_code', 'total_working_hours', 'status')
+    for emp_code, hrs, status in att.iterator(chunk_size=5000):
+        emp = emps.get(emp_code)
+        t = totals[emp[0] if emp else '']
+        hours = float(hrs or 0)
+        t['man_hours'] += hours
+        if (status or 'Present') == 'Present':
+            t['present_count'] += 1
+        else:
+            t['absent_count'] += 1
+        if emp and emp[1] != 'Fixed':
+            t['salary'] += round(_hourly_rate(emp[1], emp[2]) * hours, 2)
+
+    # Salary.bonus hours x rate from that month's base; later rows win like the payroll exports
+    bonus_by_emp = {}
+    for emp_code, bonus, base in Salary.objects.filter(
+        emp_code__in=list(emps), year=year, month=month,
+    ).values_list('emp_code', 'bonus', 'base_salary'):
+        bonus_by_emp[emp_code] = (float(bonus or 0), float(base or 0))
+    for emp_code, (bonus_hrs, base) in bonus_by_emp.items():
+        if bonus_hrs <= 0:
+            continue
+        dept, salary_type, _ = emps[emp_code]
+        t = totals[dept]
+        t['bonus_hours'] += bonus_hrs
+        t['bonus_amount'] += round(bonus_hrs * _hourly_rate(salary_type, base), 2)
+
+    rows = [
+        DeptMonthRollup(
+            company_id=company_id, dept_name=dept, year=year, month=month,
+            man_hours=Decimal(str(round(t['man_hours'], 2))),
+            present_count=t['present_count'], absent_count=t['absent_count'],
+            salary=Decimal(str(round(t['salary'], 2))),
+            bonus_hours=Decimal(str(round(t['bonus_hours'], 2))),
+            bonus_amount=Decimal(str(round(t['bonus_amount'], 2))),
+        )
+        for dept, t in totals.items()
+    ]
+    with transaction.atomic():
+        DeptMonthRollup.objects.filter(_company_q(company_id), year=year, month=month).delete()
+        DeptMonthRollup.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def _data_months(company_id):
+    """(year, month) pairs with attendance or Salary bonus in the scope, plus months that already have rows."""
+    months = {(d.year, d.month) for d in _scope_attendance(company_id).dates('date', 'month')}
+    months |= set(Salary.objects.filter(
+        emp_code__in=_scope_employees(company_id).values('emp_code'), bonus__gt=0,
+    ).values_list('year', 'month').distinct())
+    months |= set(DeptMonthRollup.objects.filter(_company_q(company_id)).values_list('year', 'month').distinct())
+    return sorted(months)
+
+
+def _lock_name(company_id):
+    return f'dept_rollup:{company_id if company_id is not None else "global"}'
+
+
+def _refresh_scope(company_id, full=False):
+    with job_lock.single_flight(_lock_name(company_id)) as acquired:
+        if not acquired:
+            return 0  # another process is rebuilding this scope
+        stale = DeptRollupStaleMonth.objects.filter(_company_q(company_id))
+        if full or not DeptMonthRollup.objects.filter(_company_q(company_id)).exists():
+            stale.delete()
+            months = _data_months(company_id)
+        else:
+            marks = list(stale.values_list('id', 'year', 'month'))
+            # Drop the marks before rebuilding: a write landing mid-rebuild marks the month again
+            DeptRollupStaleMonth.objects.filter(id__in=[i for i, _, _ in marks]).delete()
+            today = timezone.localdate()
+            months = sorted({(y, m) for _, y, m in marks} | {(today.year, today.month)})
+        for year, month in months:
+            rebuild_month(company_id, year, month)
+        return len(months)
+
+
+def refresh_rollups(company_id=None):
+    """
+    Bring rollups up to date before a report read: stale months plus the current month (today's
+    punches and auto-absent write in bulk without marking). First call for a scope builds all months.
+    company_id=None refreshes every company and the no-company scope. Returns months rebuilt.
+    """
+    scopes = [company_id] if company_id is not None else _all_scopes()
+    return sum(_refresh_scope(c) for c in scopes)
+
+
+def rebuild_all(company_id=None):
+    """Full rebuild (nightly job / manual). company_id=None = every scope. Returns months rebuilt."""
+    scopes = [company_id] if company_id is not None else _all_scopes()
+    return sum(_refresh_scope(c, full=True) for c in scopes)
+
+
+# ---------- Read ----------
+def load_rollup(company_id=None):
+    """
+    (dept_name, year, month) -> {man_hours, present, absent, salary, bonus_hours, bonus_amount}
+    for one company, or summed over all scopes when company_id is None (global sheet).
+    """
+    qs = DeptMonthRollup.objects.all()
+    if company_id is not None:
+        qs = qs.filter(company_id=company_id)
+    out = {}
+    for r in qs.values('dept_name', 'year', 'month').annotate(
+        man_hours_sum=Sum('man_hours'), present_sum=Sum('present_count'), absent_sum=Sum('absent_count'),
+        salary_sum=Sum('salary'), bonus_hours_sum=Sum('bonus_hours'), bonus_amount_sum=Sum('bonus_amount'),
+    ):
+        out[(r['dept_name'], r['year'], r['month'])] = {
+            'man_hours': float(r['man_hours_sum'] or 0),
+            'present': int(r['present_sum'] or 0),
+            'absent': int(r['absent_sum'] or 0),
+            'salary': float(r['salary_sum'] or 0),
+            'bonus_hours': float(r['bonus_hours_sum'] or 0),
+            'bonus_amount': float(r['bonus_amount_sum'] or 0),
+        }
+    return out
@@ -10,6 +10,7 @@ from decimal import Decimal
 from django.utils import timezone
 
 from .models import Employee, Attendance, Admin
+from . import data_version
 from .utils import (
     normalize_column_name,
     map_columns_to_schema,
@@ -445,6 +446,7 @@ def build_force_punch_sample_rows():
     return header, rows
 
 
+@data_version.deferred()
 def upload_employees_excel(file, preview=False, company_id=None) -> dict:
     """
     Rows may have emp_code or not. New employees are linked to company_id when provided.
@@ -641,6 +643,13 @@ def upload_employees_excel(file, preview=False, company_id=None) -> dict:
             update_qs = update_qs.filter(company_id__isnull=True)
         update_qs.update(**update_data['new'])
 
+    # Department / rate / company changes re-bucket the plant report rollup; new codes may adopt orphan attendance
+    from .dept_rollup import safe_mark_employees_stale
+    safe_mark_employees_stale(
+        [e['emp_code'] for e in to_create] + [u['emp_code'] for u in to_update], company_ids=(None,),
+    )
+    data_version.bump(emp_codes=[u['emp_code'] for u in to_update])
+
     # New departments from this upload: create admin for each that does not exist (manage-admins)
     created_admins = ensure_admins_for_departments(upload_dept_names)
 
@@ -653,6 +662,7 @@ def upload_employees_excel(file, preview=False, company_id=None) -> dict:
     }
 
 
+@data_version.deferred()
 def upload_attendance_excel(file, preview=False, company_id=None) -> dict:
     """
     Insert if (emp_code, date) not exists.
@@ -879,6 +889,13 @@ def upload_attendance_excel(file, preview=False, company_id=None) -> dict:
                 return None
         return None
 
+    from .streak_state import safe_update_streak_state
+    from .dept_rollup import safe_mark_dates_stale
+    touched = [(a['emp_code'], _parse_date(a['date'])) for a in to_insert + [u['data'] for u in to_update]]
+    safe_update_streak_state(touched)
+    safe_mark_dates_stale(touched)
+    data_version.bump(emp_codes=[u['emp_code'] for u in to_update])
+
     for att_data in to_insert:
         d = _parse_date(att_data['date'])
         if d:
@@ -905,6 +922,7 @@ def upload_attendance_excel(file, preview=False, company_id=None) -> dict:
     }
 
 
+@data_version.deferred()
 def upload_shift_excel(file, preview=False, company_id=None) -> dict:
     """
     Upload shift assignment per employee. Shift is assigned to the Employee and
@@ -1038,6 +1056,7 @@ def upload_shift_excel(file, preview=False, company_id=None) -> dict:
             if ot != att.over_time:
                 Attendance.objects.filter(id=att.id).update(over_time=ot)
                 total_att_updated += 1
+    data_version.bump(emp_codes=[entry['emp_code'] for entry in to_assign])
 
     return {
         'success': True,
@@ -1048,6 +1067,7 @@ def upload_shift_excel(file, preview=False, company_id=None) -> dict:
     }
 
 
+@data_version.deferred()
 def upload_force_punch_excel(file, preview=False, company_id=None) -> dict:
     """
     Force overwrite punch_in and punch_out from attendance Excel.
@@ -1192,8 +1212,16 @@ def upload_force_punch_excel(file, preview=False, company_id=None) -> dict:
             punch_spans_next_day=upd['punch_spans_next_day'],
             total_working_hours=upd['total_working_hours'],
             over_time=upd['over_time'],
+            status='Present',  # punch_in is always set here; keep status in step at write time
         )
 
+    from .streak_state import safe_update_streak_state
+    from .dept_rollup import safe_mark_dates_stale
+    touched = [(u['emp_code'], date.fromisoformat(u['date'])) for u in to_update]
+    safe_update_streak_state(touched)
+    safe_mark_dates_stale(touched)
+    data_version.bump(emp_codes=[u['emp_code'] for u in to_update])
+
     # Shift OT bonus + late penalty
     from .shift_bonus import apply_shift_overtime_bonus_for_date
     from .penalty_logic import recalculate_late_penalty_for_date
@@ -0,0 +1,211 @@
+"""
+Columnar exports (Parquet or Arrow IPC stream) of attendance, salary, penalty and shift OT bonus
+for analytics: typed columns instead of CSV text (date32, times as minutes since midnight, decimal128
+money / hours, booleans), with year / month columns and batches that never span two months (one
+Parquet row group or Arrow record batch per month chunk), so readers can filter by month cheaply.
+Rows are read month by month through a server-side cursor (.iterator) and converted column-wise in
+batches of BATCH_ROWS; the file is yielded as it is written (stream()).
+pyarrow is optional: available() is False without it and the export endpoint says so.
+"""
+import logging
+
+from .models import Attendance, Penalty, Salary, ShiftOvertimeBonus
+
+logger = logging.getLogger(__name__)
+
+BATCH_ROWS = 50000
+FORMATS = {
+    'parquet': ('.parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('.arrows', 'application/vnd.apache.arrow.stream'),
+}
+REPORTS = ('attendance', 'salary', 'penalty', 'bonus')
+
+
+def available():
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _minutes(t):
+    return t.hour * 60 + t.minute if t is not None else None
+
+
+def _columns(pa, report):
+    """[(column name, model field, arrow type, converter or None)] for a report."""
+    money = pa.decimal128(12, 2)
+    if report == 'attendance':
+        hours = pa.decimal128(5, 2)
+        return [
+            ('date', 'date', pa.date32(), None),
+            ('emp_code', 'emp_code', pa.string(), None),
+            ('name', 'name', pa.string(), None),
+            ('status', 'status', pa.string(), None),
+            ('shift', 'shift', pa.string(), None),
+            ('shift_from_minutes', 'shift_from', pa.int16(), _minutes),
+            ('shift_to_minutes', 'shift_to', pa.int16(), _minutes),
+            ('punch_in_minutes', 'punch_in', pa.int16(), _minutes),
+            ('punch_out_minutes', 'punch_out', pa.int16(), _minutes),
+            ('punch_spans_next_day', 'punch_spans_next_day', pa.bool_(), None),
+            ('total_working_hours', 'total_working_hours', hours, None),
+            ('total_break', 'total_break', hours, None),
+            ('over_time', 'over_time', hours, None),
+        ]
+    if report == 'salary':
+        return [
+            ('emp_code', 'emp_code', pa.string(), None),
+            ('salary_type', 'salary_type', pa.string(), None),
+            ('base_salary', 'base_salary', money, None),
+            ('overtime_hours', 'overtime_hours', pa.decimal128(6, 2), None),
+            ('bonus_hours', 'bonus', pa.decimal128(6, 2), None),
+            ('total_working_hours', 'total_working_hours', pa.decimal128(8, 2), None),
+            ('days_present', 'days_present', pa.int16(), None),
+        ]
+    if report == 'penalty':
+        return [
+            ('date', 'date', pa.date32(), None),
+            ('emp_code', 'emp_code', pa.string(), None),
+            ('minutes_late', 'minutes_late', pa.int32(), None),
+            ('deduction_amount', 'deduction_amount', money, None),
+            ('rate_used', 'rate_used', pa.decimal128(5, 2), None),
+            ('is_manual', 'is_manual', pa.bool_(), None),
+            ('description', 'description', pa.string(), None),
+        ]
+    if report == 'bonus':
+        return [
+            ('date', 'date', pa.date32(), None),
+            ('emp_code', 'emp_code', pa.string(), None),
+            ('bonus_hours', 'bonus_hours', pa.decimal128(5, 2), None),
+            ('description', 'description', pa.string(), None),
+        ]
+    raise ValueError(f'Unknown report: {report}')
+
+
+def build_queryset(report, allowed_emp_codes=None, emp_code=None, date_from=None, date_to=None):
+    """Rows of the report in the caller's scope. date_from / date_to (dates) bound the date, or the month for salary."""
+    model = {'attendance': Attendance, 'salary': Salary, 'penalty': Penalty, 'bonus': ShiftOvertimeBonus}[report]
+    qs = model.objects.all()
+    if allowed_emp_codes is not None:
+        qs = qs.filter(emp_code__in=allowed_emp_codes) if allowed_emp_codes else qs.none()
+    if emp_code:
+        qs = qs.filter(emp_code__iexact=emp_code)
+    if report == 'salary':
+        from django.db.models import Q
+        if date_from:
+            qs = qs.filter(Q(year__gt=date_from.year) | Q(year=date_from.year, month__gte=date_from.month))
+        if date_to:
+            qs = qs.filter(Q(year__lt=date_to.year) | Q(year=date_to.year, month__lte=date_to.month))
+    else:
+        if date_from:
+            qs = qs.filter(date__gte=date_from)
+        if date_to:
+            qs = qs.filter(date__lte=date_to)
+    return qs
+
+
+def _months(report, qs):
+    """(year, month, queryset of that month) in date order; reports progress to a running export job."""
+    from .export_jobs import report_progress
+    if report == 'salary':
+        periods = list(qs.order_by('year', 'month').values_list('year', 'month').distinct())
+    else:
+        periods = [(d.year, d.month) for d in qs.dates('date', 'month')]
+    for i, (year, month) in enumerate(periods):
+        report_progress(i / len(periods), f'{year}-{month:02d}')
+        if report == 'salary':
+            yield year, month, qs.filter(year=year, month=month).order_by('emp_code', 'id')
+        else:
+            yield year, month, qs.filter(date__year=year, date__month=month).order_by('date', 'emp_code', 'id')
+
+
+def _batches(pa, report, qs):
+    columns = _columns(pa, report)
+    schema = pa.schema(
+        [pa.field('year', pa.int16()), pa.field('month', pa.int8())]
+        + [pa.field(name, typ) for name, _, typ, _ in columns]
+    )
+    fields = [field for _, field, _, _ in columns]
+
+    def to_batch(year, month, rows):
+        arrays = [pa.array([year] * len(rows), pa.int16()), pa.array([month] * len(rows), pa.int8())]
+        for i, (_, _, typ, convert) in enumerate(columns):
+            values = [r[i] for r in rows]
+            if convert is not None:
+                values = [convert(v) for v in values]
+            arrays.append(pa.array(values, type=typ))
+        return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+    def generate():
+        for year, month, month_qs in _months(report, qs):
+            rows = []
+            for r in month_qs.values_list(*fields).iterator(chunk_size=BATCH_ROWS):
+                rows.append(r)
+                if len(rows) >= BATCH_ROWS:
+                    yield to_batch(year, month, rows)
+                    rows = []
+            if rows:
+                yield to_batch(year, month, rows)
+
+    return schema, generate()
+
+
+class _ChunkSink:
+    """Write-only file object for pyarrow writers; stream() drains what was written after every batch."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self):
+        return True
+
+    def drain(self):
+        out = b''.join(self.chunks)
+        self.chunks = []
+        return out
+
+
+def stream(report, fmt, qs):
+    """Yield the export file (fmt 'parquet' or 'arrow') in pieces as batches are written."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema, batches = _batches(pa, report, qs)
+    sink = _ChunkSink()
+    if fmt == 'parquet':
+        writer = pq.ParquetWriter(pa.PythonFile(sink, mode='w'), schema, compression='zstd')
+    else:
+        writer = pa.ipc.new_stream(pa.PythonFile(sink, mode='w'), schema)
+    try:
+        for batch in batches:
+            if fmt == 'parquet':
+                writer.write_batch(batch, row_group_size=BATCH_ROWS)
+            else:
+                writer.write_batch(batch)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    chunk = sink.drain()
+    if chunk:
+        yield chunk
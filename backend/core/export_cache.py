@@ -0,0 +1,197 @@
+"""
+On-disk cache for generated exports (payroll workbooks, attendance CSV) so repeat downloads during
+payroll week are served from a file instead of recomputed.
+Key = company scope + allowed emp codes + report + parameters + the scope's data version
+(core.data_version), so any write that bumps the version makes older entries unreachable; they are
+never read again and age out of the size-bounded LRU (EXPORT_CACHE_MAX_MB, least recently served
+first). Entries older than EXPORT_CACHE_MAX_AGE_SECONDS are ignored as a backstop for missed bumps.
+Files: EXPORT_CACHE_DIR/<sha256><suffix>, written to a temp file and renamed in, so readers never
+see a partial file. A hit refreshes the file's mtime (the LRU clock).
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+STALE_TMP_SECONDS = 3600
+
+_evict_lock = threading.Lock()
+
+
+def _cache_dir():
+    path = Path(getattr(settings, 'EXPORT_CACHE_DIR', Path(settings.BASE_DIR) / 'export_cache'))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _max_bytes():
+    return int(getattr(settings, 'EXPORT_CACHE_MAX_MB', 500)) * 1024 * 1024
+
+
+def _max_age():
+    return int(getattr(settings, 'EXPORT_CACHE_MAX_AGE_SECONDS', 24 * 3600))
+
+
+def enabled():
+    return _max_bytes() > 0
+
+
+def make_key(report, params, company_id=None, allowed_emp_codes=None):
+    """Cache key for one export; includes the current data version of company_id (all companies when None)."""
+    from .data_version import current_version
+    scope = None if allowed_emp_codes is None else hashlib.sha256(
+        '\n'.join(sorted(allowed_emp_codes)).encode('utf-8')
+    ).hexdigest()
+    raw = json.dumps({
+        'report': report, 'params': params, 'company': company_id, 'scope': scope,
+        'version': current_version(company_id),
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _path(key, suffix):
+    return _cache_dir() / f'{key}{suffix}'
+
+
+def get(key, suffix):
+    """Open cached file (binary, position 0) or None. Refreshes its LRU position."""
+    if not enabled():
+        return None
+    path = _path(key, suffix)
+    try:
+        if time.time() - path.stat().st_mtime > _max_age():
+            return None
+        f = open(path, 'rb')
+    except OSError:
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return f
+
+
+def _commit(tmp_name, key, suffix):
+    path = _path(key, suffix)
+    os.replace(tmp_name, path)
+    _evict()
+    return path
+
+
+def put(key, suffix, fileobj):
+    """
+    Store fileobj (read from its current position) under key and return the cached file opened for reading.
+    If the cache is off or the write fails, fileobj itself is returned rewound, so callers can always send the result.
+    """
+    if not enabled():
+        fileobj.seek(0)
+        return fileobj
+    start = fileobj.tell()
+    tmp_name = None
+    try:
+        with tempfile.NamedTemporaryFile(dir=_cache_dir(), suffix='.tmp', delete=False) as tmp:
+            tmp_name = tmp.name
+            shutil.copyfileobj(fileobj, tmp)
+        path = _commit(tmp_name, key, suffix)
+        fileobj.close()
+        return open(path, 'rb')
+    except OSError:
+        logger.warning('Export cache write failed (%s%s)', key, suffix, exc_info=True)
+        if tmp_name:
+            _discard(tmp_name)
+        fileobj.seek(start)
+        return fileobj
+
+
+def stream_and_store(key, suffix, chunks):
+    """
+    Yield chunks (str or bytes) unchanged while writing them to a temp file; the file is added to the cache
+    only when the stream ran to the end (a client that disconnects leaves nothing behind).
+    """
+    if not enabled():
+        yield from chunks
+        return
+    tmp = None
+    try:
+        tmp = tempfile.NamedTemporaryFile(dir=_cache_dir(), suffix='.tmp', delete=False)
+    except OSError:
+        logger.warning('Export cache unavailable, streaming without caching', exc_info=True)
+    completed = False
+    try:
+        for chunk in chunks:
+            if tmp is not None:
+                try:
+                    tmp.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+                except OSError:
+                    logger.warning('Export cache write failed (%s%s)', key, suffix, exc_info=True)
+                    tmp.close()
+                    _discard(tmp.name)
+                    tmp = None
+            yield chunk
+        completed = True
+    finally:
+        if tmp is not None:
+            tmp.close()
+            if completed:
+                try:
+                    _commit(tmp.name, key, suffix)
+                except OSError:
+                    logger.warning('Export cache write failed (%s%s)', key, suffix, exc_info=True)
+                    _discard(tmp.name)
+            else:
+                _discard(tmp.name)
+
+
+def _discard(name):
+    try:
+        os.unlink(name)
+    except OSError:
+        pass
+
+
+def _evict():
+    """Delete least recently served files until the cache fits EXPORT_CACHE_MAX_MB (temp files of running writes are kept)."""
+    limit = _max_bytes()
+    now = time.time()
+    with _evict_lock:
+        entries = []
+        total = 0
+        for entry in os.scandir(_cache_dir()):
+            if not entry.is_file():
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            if entry.name.endswith('.tmp'):
+                if now - st.st_mtime > STALE_TMP_SECONDS:  # left by a killed process
+                    _discard(entry.path)
+                continue
+            entries.append((st.st_mtime, st.st_size, entry.path))
+            total += st.st_size
+        if total <= limit:
+            return
+        for _, size, path in sorted(entries):
+            _discard(path)
+            total -= size
+            if total <= limit:
+                break
+
+
+def clear():
+    """Remove every cached export (manual / tests). Returns number of files removed."""
+    removed = 0
+    for entry in os.scandir(_cache_dir()):
+        if entry.is_file() and not entry.name.endswith('.tmp'):
+            _discard(entry.path)
+            removed += 1
+    return removed
@@ -3,18 +3,43 @@ Generate payroll-style Excel export for Export Center.
 Uses Django ORM. Date filter: month+year, single_date, or date_from/date_to.
 previous_day: daily data = yesterday only, Total Salary = current month (1st through yesterday).
 """
+import tempfile
+from collections import defaultdict
 from datetime import date, timedelta
-from io import BytesIO
 
+import numpy as np
 from django.db.models import Q, Sum
 from django.utils import timezone
 from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, NamedStyle, PatternFill
 from openpyxl.utils import get_column_letter
 
 from .models import Employee, Attendance, SalaryAdvance, Salary, Penalty, ShiftOvertimeBonus
 
 
+SPOOL_MAX_BYTES = 8 * 1024 * 1024  # exports up to this size stay in memory, larger ones roll over to disk
+HEADER_STYLE = 'payroll_header'
+TOTAL_STYLE = 'payroll_total'
+
+
+def _new_workbook():
+    """Write-only workbook with the export's named styles (one style record shared by all styled cells)."""
+    wb = Workbook(write_only=True)
+    wb.add_named_style(NamedStyle(
+        name=HEADER_STYLE, font=Font(bold=True, color='FFFFFF'),
+        fill=PatternFill(start_color='366092', end_color='366092', fill_type='solid'),
+    ))
+    wb.add_named_style(NamedStyle(name=TOTAL_STYLE, font=Font(bold=True)))
+    return wb
+
+
+def _styled(ws, value, style):
+    cell = WriteOnlyCell(ws, value=value)
+    cell.style = style
+    return cell
+
+
 def _time_to_hours(t):
     if t is None:
         return None
@@ -106,37 +131,77 @@ def _get_penalty_by_emp(month=None, year=None, date_from=None, date_to=None, all
     return {r['emp_code']: float(r['total'] or 0) for r in qs}
 
 
+def _attendance_list(attendance, *fields):
+    """Attendance as a list of dicts: a queryset is evaluated with .values(*fields); a list (ReportDataset slice) is used as is."""
+    if isinstance(attendance, list):
+        return attendance
+    return list(attendance.values(*fields))
+
+
+def _round2(values):
+    """
+    round(x, 2) over a float array with exactly Python's results: np.round (x*100, rint, /100) except where x*100
+    sits next to a .5 tie (float error of the multiply could tip it), which go through round() itself.
+    """
+    out = np.round(values, 2)
+    scaled = values * 100
+    tie = np.abs(scaled - np.floor(scaled) - 0.5) <= 1e-9 * np.maximum(1.0, np.abs(scaled))
+    for idx in zip(*np.nonzero(tie)):
+        out[idx] = round(float(values[idx]), 2)
+    return out
+
+
+def _seq_sum(values, axis):
+    """Sum along axis adding left to right like a Python loop (np.sum adds pairwise; results can differ in the last bit)."""
+    if values.shape[axis] == 0:
+        return np.zeros(values.shape[:axis] + values.shape[axis + 1:])
+    return np.take(np.cumsum(values, axis=axis), -1, axis=axis)
+
+
 def build_payroll_rows(employees, attendance_queryset, advance_by_emp=None, penalty_by_emp=None):
-    """Build payroll matrix: one row per employee, date cols = daily earnings (rate × hours). advance_by_emp: dict emp_code -> advance amount. penalty_by_emp: dict emp_code -> penalty deduction."""
+    """Build payroll matrix: one row per employee, date cols = daily earnings (rate × hours). advance_by_emp: dict emp_code -> advance amount. penalty_by_emp: dict emp_code -> penalty deduction.
+    attendance_queryset: Attendance queryset or a list of attendance dicts (ReportDataset.attendance()).
+    Hours go into one employees x dates array (a single scatter); day amounts and row totals are array ops on it."""
     if advance_by_emp is None:
         advance_by_emp = {}
     if penalty_by_emp is None:
         penalty_by_emp = {}
-    # (emp_code, date) -> total_working_hours
-    att_list = list(attendance_queryset.values('emp_code', 'date', 'total_working_hours'))
-    att_map = {}
-    dates_set = set()
-    for r in att_list:
-        key = (r['emp_code'], r['date'])
-        h = r.get('total_working_hours')
-        att_map[key] = float(h) if h is not None else 0.0
-        dates_set.add(r['date'])
-    sorted_dates = sorted(dates_set)
+    att_list = _attendance_list(attendance_queryset, 'emp_code', 'date', 'total_working_hours')
+    sorted_dates = sorted({r['date'] for r in att_list})
+    date_to_idx = {d: i for i, d in enumerate(sorted_dates)}
 
-    payroll_rows = []
-    for emp in employees:
-        base = float(emp.base_salary or 0)
-        salary_type = (emp.salary_type or 'Monthly').strip() or 'Monthly'
+    employees = list(employees)
+    code_to_idx = {}
+    emp_idx = [code_to_idx.setdefault(emp.emp_code, len(code_to_idx)) for emp in employees]
+    # (emp_code, date) is unique in Attendance, so the scatter never writes one cell twice
+    cells = [
+        (code_to_idx[r['emp_code']], date_to_idx[r['date']], float(r['total_working_hours']) if r.get('total_working_hours') is not None else 0.0)
+        for r in att_list if r['emp_code'] in code_to_idx
+    ]
+    hours = np.zeros((len(code_to_idx), len(sorted_dates)))
+    if cells:
+        rows_i, cols_i, vals = zip(*cells)
+        hours[list(rows_i), list(cols_i)] = vals
+    hours = hours[emp_idx] if employees else np.zeros((0, len(sorted_dates)))
+
+    salary_types = [(emp.salary_type or 'Monthly').strip() or 'Monthly' for emp in employees]
+    bases = [float(emp.base_salary or 0) for emp in employees]
+    rates = []
+    for salary_type, base in zip(salary_types, bases):
         if salary_type == 'Hourly':
-            hourly_rate = base
+            rates.append(base)
         elif salary_type == 'Fixed':
-            hourly_rate = 0.0
+            rates.append(0.0)
         else:
-            hourly_rate = base / (26 * 8) if base else 0.0
-        du = _shift_hours(emp.shift_from, emp.shift_to)
-        advance_val = round(advance_by_emp.get(emp.emp_code, 0), 2)
-        penalty_val = round(penalty_by_emp.get(emp.emp_code, 0), 2)
+            rates.append(base / (26 * 8) if base else 0.0)
+    is_fixed = np.array([t == 'Fixed' for t in salary_types], dtype=bool)
+    amounts = _round2(np.array(rates, dtype=float).reshape(-1, 1) * hours)
+    amounts[is_fixed] = 0.0
+    row_totals = _seq_sum(amounts, axis=1)
 
+    payroll_rows = []
+    for i, emp in enumerate(employees):
+        salary_type = salary_types[i]
         row = {
             'emp_code': emp.emp_code,
             'name': emp.name or '',
@@ -144,39 +209,51 @@ def build_payroll_rows(employees, attendance_queryset, advance_by_emp=None, pena
             'status': emp.status or 'Working',
             'under_work': '',
             'department': emp.dept_name or '',
-            'sala': round(hourly_rate, 2),
-            'du': du,
-            'advance': advance_val,
-            'penalty': penalty_val,
+            'sala': round(rates[i], 2),
+            'du': _shift_hours(emp.shift_from, emp.shift_to),
+            'advance': round(advance_by_emp.get(emp.emp_code, 0), 2),
+            'penalty': round(penalty_by_emp.get(emp.emp_code, 0), 2),
         }
-        day_totals = []
-        row_total = 0.0
-        for d in sorted_dates:
-            hours = att_map.get((emp.emp_code, d), 0.0)
-            amount = round(hourly_rate * hours, 2) if salary_type != 'Fixed' else 0.0
-            day_totals.append(amount)
-            row_total += amount
-        if salary_type == 'Fixed':
-            row_total = base
-        else:
-            row_total = round(row_total, 2)
+        row_total = bases[i] if salary_type == 'Fixed' else round(float(row_totals[i]), 2)
         row['total'] = round(row_total, 2)
         row['_dates'] = sorted_dates
-        row['_day_totals'] = day_totals
+        row['_day_totals'] = amounts[i].tolist()
         payroll_rows.append(row)
 
     return sorted_dates, payroll_rows
 
 
-def _add_bonus_to_payroll_rows(payroll_rows, month, year):
-    """Add bonus (hours × hourly_rate) to each row's total. Also set row['bonus_hours'] and row['bonus_amount']."""
+def _salary_type_by_emp(emp_codes, dataset=None):
+    if dataset is not None:
+        return {ec: dataset.salary_type(ec) for ec in emp_codes}
+    return {
+        e['emp_code']: (e.get('salary_type') or 'Monthly').strip() or 'Monthly'
+        for e in Employee.objects.filter(emp_code__in=emp_codes).values('emp_code', 'salary_type')
+    }
+
+
+def _salary_bonus_data(emp_codes, months_years, dataset=None):
+    """(emp_code, month, year) -> (bonus_hrs, base_salary) for the given (month, year) pairs."""
+    if dataset is not None:
+        wanted = set(emp_codes)
+        periods = set(months_years)
+        return {k: v for k, v in dataset.salary.items() if k[0] in wanted and (k[1], k[2]) in periods}
+    bonus_data = {}
+    for (m, y) in months_years:
+        for s in Salary.objects.filter(emp_code__in=emp_codes, month=m, year=y).values('emp_code', 'bonus', 'base_salary'):
+            key = (s['emp_code'], m, y)
+            bonus_data[key] = (float(s.get('bonus') or 0), float(s.get('base_salary') or 0))
+    return bonus_data
+
+
+def _add_bonus_to_payroll_rows(payroll_rows, month, year, dataset=None):
+    """Add bonus (hours × hourly_rate) to each row's total. Also set row['bonus_hours'] and row['bonus_amount'].
+    dataset: ReportDataset to read Salary / Employee from instead of querying."""
     if not payroll_rows or month is None or year is None:
         return
     emp_codes = [r['emp_code'] for r in payroll_rows]
-    salary_type_by_emp = {e['emp_code']: (e.get('salary_type') or 'Monthly').strip() or 'Monthly' for e in Employee.objects.filter(emp_code__in=emp_codes).values('emp_code', 'salary_type')}
-    bonus_by_emp = {}
-    for s in Salary.objects.filter(emp_code__in=emp_codes, month=month, year=year).values('emp_code', 'bonus', 'base_salary'):
-        bonus_by_emp[s['emp_code']] = (float(s.get('bonus') or 0), float(s.get('base_salary') or 0))
+    salary_type_by_emp = _salary_type_by_emp(emp_codes, dataset)
+    bonus_by_emp = {ec: v for (ec, _, _), v in _salary_bonus_data(emp_codes, [(month, year)], dataset).items()}
     for row in payroll_rows:
         ec = row['emp_code']
         sala = row.get('sala') or 0.0  # hourly rate already set in build_payroll_rows
@@ -197,7 +274,7 @@ def _add_bonus_to_payroll_rows(payroll_rows, month, year):
         row['total'] = round((row.get('total') or 0) + bonus_money, 2)
 
 
-def _set_bonus_columns_for_date_range(payroll_rows, sorted_dates, add_bonus_to_total=True):
+def _set_bonus_columns_for_date_range(payroll_rows, sorted_dates, add_bonus_to_total=True, dataset=None):
     """Set bonus_hours and bonus_amount on each row by summing bonus for all (month, year) in sorted_dates.
     If add_bonus_to_total True, also add bonus amount to row['total'] (so All dates / From–to Total Salary includes bonus)."""
     if not payroll_rows or not sorted_dates:
@@ -206,16 +283,9 @@ def _set_bonus_columns_for_date_range(payroll_rows, sorted_dates, add_bonus_to_t
     if not months_years:
         return
     emp_codes = [r['emp_code'] for r in payroll_rows]
-    salary_type_by_emp = {
-        e['emp_code']: (e.get('salary_type') or 'Monthly').strip() or 'Monthly'
-        for e in Employee.objects.filter(emp_code__in=emp_codes).values('emp_code', 'salary_type')
-    }
+    salary_type_by_emp = _salary_type_by_emp(emp_codes, dataset)
     # (emp_code, month, year) -> (bonus_hrs, base_salary)
-    bonus_data = {}
-    for (m, y) in months_years:
-        for s in Salary.objects.filter(emp_code__in=emp_codes, month=m, year=y).values('emp_code', 'bonus', 'base_salary'):
-            key = (s['emp_code'], m, y)
-            bonus_data[key] = (float(s.get('bonus') or 0), float(s.get('base_salary') or 0))
+    bonus_data = _salary_bonus_data(emp_codes, months_years, dataset)
     for row in payroll_rows:
         ec = row['emp_code']
         sala = row.get('sala') or 0.0
@@ -241,8 +311,7 @@ def _set_bonus_columns_for_date_range(payroll_rows, sorted_dates, add_bonus_to_t
 
 
 def write_payroll_sheet(ws, sorted_dates, payroll_rows, include_punch_columns=False, include_bonus_columns=False):
-    header_fill = PatternFill(start_color='366092', end_color='366092', fill_type='solid')
-    header_font = Font(bold=True, color='FFFFFF')
+    """Stream one payroll sheet (header, one row per employee, Total row) into a write-only worksheet of a workbook from _new_workbook()."""
     headers = ['Emp Code', 'STAFF', 'Pla', 'Status', 'Under Work', 'Department', 'Sala', 'Du']
     if include_punch_columns:
         headers.extend(['Punch In', 'Punch Out'])
@@ -256,73 +325,56 @@ def write_payroll_sheet(ws, sorted_dates, payroll_rows, include_punch_columns=Fa
 
     base_date_col = 11 if include_punch_columns else 9
     total_col = base_date_col + len(sorted_dates)
-    advance_col = total_col + 1
     penalty_col = total_col + 2
     bonus_hrs_col = penalty_col + 1 if include_bonus_columns else None
     bonus_amt_col = penalty_col + 2 if include_bonus_columns else None
 
-    for col_idx, h in enumerate(headers, 1):
-        c = ws.cell(row=1, column=col_idx, value=h)
-        c.fill = header_fill
-        c.font = header_font
-
-    for row_idx, row in enumerate(payroll_rows, 2):
-        ws.cell(row=row_idx, column=1, value=row.get('emp_code'))
-        ws.cell(row=row_idx, column=2, value=row.get('name'))
-        ws.cell(row=row_idx, column=3, value=row.get('pla'))
-        ws.cell(row=row_idx, column=4, value=row.get('status'))
-        ws.cell(row=row_idx, column=5, value=row.get('under_work'))
-        ws.cell(row=row_idx, column=6, value=row.get('department'))
-        ws.cell(row=row_idx, column=7, value=row.get('sala'))
-        ws.cell(row=row_idx, column=8, value=row.get('du'))
-        if include_punch_columns:
-            ws.cell(row=row_idx, column=9, value=row.get('punch_in', ''))
-            ws.cell(row=row_idx, column=10, value=row.get('punch_out', ''))
-        for col_idx, day_val in enumerate(row.get('_day_totals', []), base_date_col):
-            ws.cell(row=row_idx, column=col_idx, value=day_val)
-        ws.cell(row=row_idx, column=total_col, value=row.get('total'))
-        ws.cell(row=row_idx, column=advance_col, value=row.get('advance'))
-        ws.cell(row=row_idx, column=penalty_col, value=row.get('penalty'))
-        if include_bonus_columns:
-            ws.cell(row=row_idx, column=bonus_hrs_col, value=row.get('bonus_hours'))
-            ws.cell(row=row_idx, column=bonus_amt_col, value=row.get('bonus_amount'))
-
-    tot_row = len(payroll_rows) + 2
-    ws.cell(row=tot_row, column=1, value='Total').font = Font(bold=True)
-    for col_idx in range(2, base_date_col):
-        ws.cell(row=tot_row, column=col_idx, value='')
-    col_totals = [0.0] * len(sorted_dates)
+    # Write-only sheets take column widths only before the first row
+    ws.column_dimensions['A'].width = 12
+    ws.column_dimensions['B'].width = 20
+    if include_punch_columns:
+        ws.column_dimensions['I'].width = 10
+        ws.column_dimensions['J'].width = 10
+    for col_idx in range(base_date_col, total_col):
+        ws.column_dimensions[get_column_letter(col_idx)].width = 12
+    if include_bonus_columns:
+        ws.column_dimensions[get_column_letter(bonus_hrs_col)].width = 12
+        ws.column_dimensions[get_column_letter(bonus_amt_col)].width = 12
+
+    ws.append([_styled(ws, h, HEADER_STYLE) for h in headers])
+
+    n_dates = len(sorted_dates)
+    col_totals = [0.0] * n_dates
     grand_total = 0.0
     advance_total = 0.0
     penalty_total = 0.0
     bonus_total = 0.0
     for row in payroll_rows:
-        for i, v in enumerate(row.get('_day_totals', [])):
-            if i < len(col_totals):
-                col_totals[i] += v
+        values = [
+            row.get('emp_code'), row.get('name'), row.get('pla'), row.get('status'),
+            row.get('under_work'), row.get('department'), row.get('sala'), row.get('du'),
+        ]
+        if include_punch_columns:
+            values.extend([row.get('punch_in', ''), row.get('punch_out', '')])
+        day_totals = list(row.get('_day_totals', []))[:n_dates]
+        for i, v in enumerate(day_totals):
+            col_totals[i] += v
+        values.extend(day_totals + [None] * (n_dates - len(day_totals)))
+        values.extend([row.get('total'), row.get('advance'), row.get('penalty')])
+        if include_bonus_columns:
+            values.extend([row.get('bonus_hours'), row.get('bonus_amount')])
+        ws.append(values)
         grand_total += row.get('total') or 0
         advance_total += row.get('advance') or 0
         penalty_total += row.get('penalty') or 0
         bonus_total += row.get('bonus_amount') or 0
-    for col_idx, tot in enumerate(col_totals, base_date_col):
-        ws.cell(row=tot_row, column=col_idx, value=round(tot, 2)).font = Font(bold=True)
-    ws.cell(row=tot_row, column=total_col, value=round(grand_total, 2)).font = Font(bold=True)
-    ws.cell(row=tot_row, column=advance_col, value=round(advance_total, 2)).font = Font(bold=True)
-    ws.cell(row=tot_row, column=penalty_col, value=round(penalty_total, 2)).font = Font(bold=True)
-    if include_bonus_columns:
-        ws.cell(row=tot_row, column=bonus_hrs_col, value='').font = Font(bold=True)
-        ws.cell(row=tot_row, column=bonus_amt_col, value=round(bonus_total, 2)).font = Font(bold=True)
 
-    ws.column_dimensions['A'].width = 12
-    ws.column_dimensions['B'].width = 20
-    if include_punch_columns:
-        ws.column_dimensions['I'].width = 10
-        ws.column_dimensions['J'].width = 10
-    for col_idx in range(base_date_col, total_col):
-        ws.column_dimensions[get_column_letter(col_idx)].width = 12
+    totals = [_styled(ws, 'Total', TOTAL_STYLE)] + [''] * (base_date_col - 2)
+    totals += [_styled(ws, round(tot, 2), TOTAL_STYLE) for tot in col_totals]
+    totals += [_styled(ws, round(v, 2), TOTAL_STYLE) for v in (grand_total, advance_total, penalty_total)]
     if include_bonus_columns:
-        ws.column_dimensions[get_column_letter(bonus_hrs_col)].width = 12
-        ws.column_dimensions[get_column_letter(bonus_amt_col)].width = 12
+        totals += [_styled(ws, '', TOTAL_STYLE), _styled(ws, round(bonus_total, 2), TOTAL_STYLE)]
+    ws.append(totals)
 
 
 def build_plant_report_rows(payroll_rows, sorted_dates, attendance_queryset, month_total_per_dept=None, month_bonus_per_dept=None):
@@ -332,31 +384,47 @@ def build_plant_report_rows(payroll_rows, sorted_dates, attendance_queryset, mon
     If month_total_per_dept is provided (dept -> total), use it for Total Salary column; else use sum of date cols.
     If month_bonus_per_dept is provided (dept -> (bonus_hrs, bonus_amount)), use it for bonus columns; else aggregate from payroll_rows.
     """
-    att_list = list(attendance_queryset.values('emp_code', 'date', 'total_working_hours', 'status'))
+    att_list = _attendance_list(attendance_queryset, 'emp_code', 'date', 'total_working_hours', 'status')
     emp_to_dept = {r['emp_code']: (r.get('department') or '') for r in payroll_rows}
     date_to_idx = {d: i for i, d in enumerate(sorted_dates)}
-
-    # (dept, date) -> total_man_hrs, salary (from payroll), present_count, absent_count
-    from collections import defaultdict
-    dept_date_man_hrs = defaultdict(float)
-    dept_date_salary = defaultdict(float)
-    dept_date_present = defaultdict(int)
-    dept_date_absent = defaultdict(int)
-
-    for r in att_list:
-        dept = emp_to_dept.get(r['emp_code'], '')
-        dt = r['date']
-        dept_date_man_hrs[(dept, dt)] += float(r.get('total_working_hours') or 0)
-        if (r.get('status') or 'Present') == 'Present':
-            dept_date_present[(dept, dt)] += 1
-        else:
-            dept_date_absent[(dept, dt)] += 1
-
-    for row in payroll_rows:
-        dept = row.get('department') or ''
-        for i, d in enumerate(row.get('_dates', [])):
-            amt = row.get('_day_totals', [])[i] if i < len(row.get('_day_totals', [])) else 0
-            dept_date_salary[(dept, d)] += amt
+    depts = sorted(set(emp_to_dept.values()))
+    dept_to_idx = {d: i for i, d in enumerate(depts)}
+    if '' not in dept_to_idx:
+        dept_to_idx[''] = len(dept_to_idx)  # attendance of emp codes without a payroll row
+    n_depts, n_dates = len(dept_to_idx), len(sorted_dates)
+
+    # dept x date: man hours (added in attendance order), present / absent counts
+    att_idx = [
+        (dept_to_idx[emp_to_dept.get(r['emp_code'], '')], date_to_idx[r['date']],
+         float(r.get('total_working_hours') or 0), (r.get('status') or 'Present') == 'Present')
+        for r in att_list if r['date'] in date_to_idx
+    ]
+    man_hrs = np.zeros((n_depts, n_dates))
+    present = np.zeros(n_depts * n_dates, dtype=np.int64)
+    absent = np.zeros(n_depts * n_dates, dtype=np.int64)
+    if att_idx:
+        d_i, t_i, hrs, is_present = (np.array(col) for col in zip(*att_idx))
+        np.add.at(man_hrs, (d_i, t_i), hrs)
+        flat = d_i * n_dates + t_i
+        present = np.bincount(flat[is_present], minlength=n_depts * n_dates)
+        absent = np.bincount(flat[~is_present], minlength=n_depts * n_dates)
+    present = present.reshape(n_depts, n_dates)
+    absent = absent.reshape(n_depts, n_dates)
+
+    # employees x date salary from the payroll rows, summed per dept in row order
+    def aligned(row):
+        day_totals = row.get('_day_totals', [])
+        row_dates = row.get('_dates', [])
+        if row_dates is sorted_dates or row_dates == sorted_dates:
+            return day_totals
+        by_date = {d: (day_totals[i] if i < len(day_totals) else 0) for i, d in enumerate(row_dates)}
+        return [by_date.get(d, 0) for d in sorted_dates]
+
+    salary_matrix = np.array([aligned(r) for r in payroll_rows], dtype=float).reshape(len(payroll_rows), n_dates)
+    row_dept = np.array([dept_to_idx[r.get('department') or ''] for r in payroll_rows], dtype=np.int64)
+    dept_salary = np.zeros((n_depts, n_dates))
+    for dept_i in range(n_depts):
+        dept_salary[dept_i] = _seq_sum(salary_matrix[row_dept == dept_i], axis=0)
 
     # Aggregate bonus by department (from payroll_rows unless month_bonus_per_dept provided e.g. Single day MTD)
     dept_bonus_hrs = defaultdict(float)
@@ -376,26 +444,21 @@ def build_plant_report_rows(payroll_rows, sorted_dates, attendance_queryset, mon
         dept = row.get('department') or ''
         dept_total_from_rows[dept] += float(row.get('total') or 0)
 
-    depts = sorted(set(emp_to_dept.values()))
     dept_list = [d for d in depts if d]
     if '' in depts:
         dept_list.append('')
+    man_hrs_totals = _seq_sum(man_hrs, axis=1)
+    salary_totals = _seq_sum(dept_salary, axis=1)
+    day_totals_by_dept = _round2(dept_salary)
 
     plant_rows = []
     for sr, dept in enumerate(dept_list, 1):
-        total_man_hrs = 0.0
-        day_totals = []
-        total_salary = 0.0
-        total_present = 0
-        total_absent = 0
-        for d in sorted_dates:
-            man_hrs = dept_date_man_hrs.get((dept, d), 0)
-            sal = dept_date_salary.get((dept, d), 0)
-            total_man_hrs += man_hrs
-            day_totals.append(round(sal, 2))
-            total_salary += sal
-            total_present += dept_date_present.get((dept, d), 0)
-            total_absent += dept_date_absent.get((dept, d), 0)
+        dept_i = dept_to_idx[dept]
+        total_man_hrs = float(man_hrs_totals[dept_i])
+        day_totals = day_totals_by_dept[dept_i].tolist()
+        total_salary = float(salary_totals[dept_i])
+        total_present = int(present[dept_i].sum())
+        total_absent = int(absent[dept_i].sum())
 
         avg_salary = round(total_salary / total_present, 2) if total_present else 0
         avg_salary_hr = round(total_salary / total_man_hrs, 2) if total_man_hrs else 0
@@ -426,72 +489,57 @@ def build_plant_report_rows(payroll_rows, sorted_dates, attendance_queryset, mon
 
 
 def write_plant_report_sheet(ws, sorted_dates, plant_rows):
-    """Write Plant Report: one row per department with Total Man Hrs, date cols, Present, Absent, Avg Salary, etc."""
-    header_fill = PatternFill(start_color='366092', end_color='366092', fill_type='solid')
-    header_font = Font(bold=True, color='FFFFFF')
+    """Write Plant Report: one row per department with Total Man Hrs, date cols, Present, Absent, Avg Salary, etc. ws: write-only worksheet."""
     headers = ['Sr No', 'PLANT', 'Total Man Hrs']
     for d in sorted_dates:
         headers.append(d.strftime('%d-%m-%y') if hasattr(d, 'strftime') else str(d))
     headers.extend(['Total Worker Present', 'Total Worker Absent', 'Average Salary', 'Average Salary/hr', 'Absenteeism %', 'Total Salary', 'Total Bonus (hrs)', 'Total Bonus (Rs)'])
-
-    for col_idx, h in enumerate(headers, 1):
-        c = ws.cell(row=1, column=col_idx, value=h)
-        c.fill = header_fill
-        c.font = header_font
-
-    for row_idx, row in enumerate(plant_rows, 2):
-        ws.cell(row=row_idx, column=1, value=row['sr'])
-        ws.cell(row=row_idx, column=2, value=row['plant'])
-        ws.cell(row=row_idx, column=3, value=row['total_man_hrs'])
-        for col_idx, v in enumerate(row['_day_totals'], 4):
-            ws.cell(row=row_idx, column=col_idx, value=v)
-        off = 4 + len(sorted_dates)
-        ws.cell(row=row_idx, column=off, value=row['total_present'])
-        ws.cell(row=row_idx, column=off + 1, value=row['total_absent'])
-        ws.cell(row=row_idx, column=off + 2, value=row['avg_salary'])
-        ws.cell(row=row_idx, column=off + 3, value=row['avg_salary_hr'])
-        ws.cell(row=row_idx, column=off + 4, value=row['absenteeism'])
-        ws.cell(row=row_idx, column=off + 5, value=row['total_salary'])
-        ws.cell(row=row_idx, column=off + 6, value=row.get('total_bonus_hours', 0))
-        ws.cell(row=row_idx, column=off + 7, value=row.get('total_bonus_amount', 0))
-
-    # Total row
-    tot_row = len(plant_rows) + 2
-    ws.cell(row=tot_row, column=1, value='TOTAL SALARY').font = Font(bold=True)
-    ws.cell(row=tot_row, column=2, value='')
-    tot_man_hrs = sum(r['total_man_hrs'] for r in plant_rows)
-    ws.cell(row=tot_row, column=3, value=round(tot_man_hrs, 2)).font = Font(bold=True)
-    for col_idx in range(4, 4 + len(sorted_dates)):
-        col_tot = sum(r['_day_totals'][col_idx - 4] for r in plant_rows)
-        ws.cell(row=tot_row, column=col_idx, value=round(col_tot, 2)).font = Font(bold=True)
     off = 4 + len(sorted_dates)
-    ws.cell(row=tot_row, column=off, value=sum(r['total_present'] for r in plant_rows)).font = Font(bold=True)
-    ws.cell(row=tot_row, column=off + 1, value=sum(r['total_absent'] for r in plant_rows)).font = Font(bold=True)
-    avg_overall = round(sum(r['total_salary'] for r in plant_rows) / sum(r['total_present'] for r in plant_rows), 2) if sum(r['total_present'] for r in plant_rows) else 0
-    ws.cell(row=tot_row, column=off + 2, value=avg_overall).font = Font(bold=True)
-    tot_sal = sum(r['total_salary'] for r in plant_rows)
-    tot_bonus_hrs = sum(r.get('total_bonus_hours', 0) for r in plant_rows)
-    tot_bonus_amt = sum(r.get('total_bonus_amount', 0) for r in plant_rows)
-    ws.cell(row=tot_row, column=off + 3, value=round(tot_sal / tot_man_hrs, 2) if tot_man_hrs else 0).font = Font(bold=True)
-    ws.cell(row=tot_row, column=off + 4, value='').font = Font(bold=True)
-    # Total Salary (final) = salary + Total Bonus (Rs), so one combined figure in the total row
-    ws.cell(row=tot_row, column=off + 5, value=round(tot_sal + tot_bonus_amt, 2)).font = Font(bold=True)
-    ws.cell(row=tot_row, column=off + 6, value=round(tot_bonus_hrs, 2)).font = Font(bold=True)
-    ws.cell(row=tot_row, column=off + 7, value=round(tot_bonus_amt, 2)).font = Font(bold=True)
 
     ws.column_dimensions['A'].width = 8
     ws.column_dimensions['B'].width = 28
     ws.column_dimensions['C'].width = 14
-    for col_idx in range(4, 4 + len(sorted_dates)):
+    for col_idx in range(4, off):
         ws.column_dimensions[get_column_letter(col_idx)].width = 12
     for col_idx in range(off, off + 8):
         ws.column_dimensions[get_column_letter(col_idx)].width = 14
 
+    ws.append([_styled(ws, h, HEADER_STYLE) for h in headers])
+    for row in plant_rows:
+        ws.append(
+            [row['sr'], row['plant'], row['total_man_hrs']] + list(row['_day_totals'])
+            + [
+                row['total_present'], row['total_absent'], row['avg_salary'], row['avg_salary_hr'],
+                row['absenteeism'], row['total_salary'],
+                row.get('total_bonus_hours', 0), row.get('total_bonus_amount', 0),
+            ]
+        )
 
-def _month_to_date_bonus_per_dept(date_from, date_to, employees, allowed_emp_codes=None, emp_code_filter=None):
+    # Total row
+    tot_man_hrs = sum(r['total_man_hrs'] for r in plant_rows)
+    tot_present = sum(r['total_present'] for r in plant_rows)
+    tot_sal = sum(r['total_salary'] for r in plant_rows)
+    tot_bonus_hrs = sum(r.get('total_bonus_hours', 0) for r in plant_rows)
+    tot_bonus_amt = sum(r.get('total_bonus_amount', 0) for r in plant_rows)
+    day_tots = [sum(r['_day_totals'][i] for r in plant_rows) for i in range(len(sorted_dates))]
+    bold = [
+        round(tot_man_hrs, 2), *(round(t, 2) for t in day_tots),
+        tot_present, sum(r['total_absent'] for r in plant_rows),
+        round(tot_sal / tot_present, 2) if tot_present else 0,
+        round(tot_sal / tot_man_hrs, 2) if tot_man_hrs else 0,
+        '',
+        # Total Salary (final) = salary + Total Bonus (Rs), so one combined figure in the total row
+        round(tot_sal + tot_bonus_amt, 2),
+        round(tot_bonus_hrs, 2), round(tot_bonus_amt, 2),
+    ]
+    ws.append([_styled(ws, 'TOTAL SALARY', TOTAL_STYLE), ''] + [_styled(ws, v, TOTAL_STYLE) for v in bold])
+
+
+def _month_to_date_bonus_per_dept(date_from, date_to, employees, allowed_emp_codes=None, emp_code_filter=None, dataset=None):
     """
     Bonus from date_from to date_to (e.g. start of month till selected day), aggregated by department.
     Uses ShiftOvertimeBonus in range; converts hours to Rs using Employee base_salary/salary_type.
+    dataset: ReportDataset covering [date_from, date_to] to read from instead of querying.
     Returns dict: dept -> (bonus_hrs, bonus_amount).
     """
     from collections import defaultdict
@@ -508,10 +556,13 @@ def _month_to_date_bonus_per_dept(date_from, date_to, employees, allowed_emp_cod
         return {}
 
     # Sum ShiftOvertimeBonus in range per emp_code
-    qs = ShiftOvertimeBonus.objects.filter(
-        date__gte=date_from, date__lte=date_to, emp_code__in=emp_codes
-    ).values('emp_code').annotate(total_hrs=Sum('bonus_hours'))
-    emp_bonus_hrs = {r['emp_code']: float(r['total_hrs'] or 0) for r in qs}
+    if dataset is not None:
+        emp_bonus_hrs = dataset.ot_bonus_hours_by_emp(date_from, date_to)
+    else:
+        qs = ShiftOvertimeBonus.objects.filter(
+            date__gte=date_from, date__lte=date_to, emp_code__in=emp_codes
+        ).values('emp_code').annotate(total_hrs=Sum('bonus_hours'))
+        emp_bonus_hrs = {r['emp_code']: float(r['total_hrs'] or 0) for r in qs}
 
     # Department per emp (Employee has dept_name)
     emp_to_dept = {}
@@ -520,14 +571,14 @@ def _month_to_date_bonus_per_dept(date_from, date_to, employees, allowed_emp_cod
         if ec and ec in emp_codes:
             dept = getattr(e, 'dept_name', '') or (e.get('department', '') if isinstance(e, dict) else '')
             emp_to_dept[ec] = dept or ''
-    salary_type_by_emp = {
-        e['emp_code']: (e.get('salary_type') or 'Monthly').strip() or 'Monthly'
-        for e in Employee.objects.filter(emp_code__in=emp_codes).values('emp_code', 'salary_type')
-    }
-    base_by_emp = {
-        e['emp_code']: float(e.get('base_salary') or 0)
-        for e in Employee.objects.filter(emp_code__in=emp_codes).values('emp_code', 'base_salary')
-    }
+    salary_type_by_emp = _salary_type_by_emp(emp_codes, dataset)
+    if dataset is not None:
+        base_by_emp = {ec: float(dataset.emp_by_code[ec].base_salary or 0) for ec in emp_codes if ec in dataset.emp_by_code}
+    else:
+        base_by_emp = {
+            e['emp_code']: float(e.get('base_salary') or 0)
+            for e in Employee.objects.filter(emp_code__in=emp_codes).values('emp_code', 'base_salary')
+        }
 
     dept_hrs = defaultdict(float)
     dept_amt = defaultdict(float)
@@ -549,40 +600,35 @@ def _month_to_date_bonus_per_dept(date_from, date_to, employees, allowed_emp_cod
     return {dept: (round(dept_hrs[dept], 2), round(dept_amt[dept], 2)) for dept in dept_hrs}
 
 
-def generate_payroll_excel_previous_day(allowed_emp_codes=None):
+def generate_payroll_excel_previous_day(allowed_emp_codes=None, dataset=None):
     """
     Report for previous day only: all daily data (date col, man hrs, present, absent, avg salary, avg/hr, absenteeism)
     for yesterday. Total Salary column = current month (1st through yesterday) for each employee/department.
     allowed_emp_codes: if set, only these employees (dept admin filter).
+    dataset: ReportDataset covering the 1st of yesterday's month through yesterday (loaded here if None).
     """
+    from .export_jobs import report_progress
+    from .report_dataset import ReportDataset
     today = timezone.localdate()
     yesterday = today - timedelta(days=1)
     month_start = yesterday.replace(day=1)
-    att_yesterday = _get_date_filter_queryset(single_date=yesterday)
-    att_month = Attendance.objects.filter(date__gte=month_start, date__lte=yesterday)
-    if allowed_emp_codes is not None:
-        att_yesterday = att_yesterday.filter(emp_code__in=allowed_emp_codes)
-        att_month = att_month.filter(emp_code__in=allowed_emp_codes)
-
-    emp_qs = Employee.objects.all().order_by('dept_name', 'emp_code')
-    if allowed_emp_codes is not None:
-        emp_qs = emp_qs.filter(emp_code__in=allowed_emp_codes) if allowed_emp_codes else emp_qs.none()
-    employees = list(emp_qs)
-    advance_by_emp = _get_advance_by_emp(
-        month=yesterday.month, year=yesterday.year,
-        allowed_emp_codes=allowed_emp_codes
-    )
-    penalty_by_emp = _get_penalty_by_emp(
-        month=yesterday.month, year=yesterday.year,
-        allowed_emp_codes=allowed_emp_codes
-    )
+    report_progress(0.05, 'loading data')
+    if dataset is None:
+        dataset = ReportDataset(allowed_emp_codes=allowed_emp_codes, date_from=month_start, date_to=yesterday)
+    report_progress(0.3, 'building rows')
+    att_yesterday = dataset.attendance(yesterday, yesterday)
+    att_month = dataset.attendance(month_start, yesterday)
+
+    employees = dataset.employees
+    advance_by_emp = dataset.advance_by_emp([(yesterday.month, yesterday.year)])
+    penalty_by_emp = dataset.penalty_by_emp([(yesterday.month, yesterday.year)])
     sorted_dates, payroll_rows = build_payroll_rows(
         employees, att_yesterday, advance_by_emp=advance_by_emp, penalty_by_emp=penalty_by_emp
     )
     _, payroll_month = build_payroll_rows(
         employees, att_month, advance_by_emp=advance_by_emp, penalty_by_emp=penalty_by_emp
     )
-    _add_bonus_to_payroll_rows(payroll_month, yesterday.month, yesterday.year)
+    _add_bonus_to_payroll_rows(payroll_month, yesterday.month, yesterday.year, dataset=dataset)
     emp_to_month_total = {r['emp_code']: r['total'] for r in payroll_month}
     emp_to_bonus_hours = {r['emp_code']: r.get('bonus_hours', 0) for r in payroll_month}
     emp_to_bonus_amount = {r['emp_code']: r.get('bonus_amount', 0) for r in payroll_month}
@@ -594,7 +640,7 @@ def generate_payroll_excel_previous_day(allowed_emp_codes=None):
 
     # For previous day only: add punch in/out per employee (single day data)
     punch_map = {}
-    for a in att_yesterday.values('emp_code', 'date', 'punch_in', 'punch_out'):
+    for a in att_yesterday:
         key = (a['emp_code'], a['date'])
         pi = a.get('punch_in')
         po = a.get('punch_out')
@@ -623,88 +669,73 @@ def generate_payroll_excel_previous_day(allowed_emp_codes=None):
 
 
 def _write_payroll_workbook(sorted_dates, payroll_rows, plant_rows, include_punch_columns=False, include_bonus_columns=False):
-    """Build workbook with Plant Report, Payroll, and per-dept sheets. include_punch_columns: add Punch In/Out (e.g. previous day). include_bonus_columns: add Bonus (hrs) and Bonus (Rs)."""
-    wb = Workbook()
-    ws_plant = wb.active
-    ws_plant.title = 'Plant Report'
-    write_plant_report_sheet(ws_plant, sorted_dates, plant_rows)
-    ws = wb.create_sheet(title='Payroll')
-    write_payroll_sheet(ws, sorted_dates, payroll_rows, include_punch_columns=include_punch_columns, include_bonus_columns=include_bonus_columns)
-    depts = sorted(set(r.get('department') or '' for r in payroll_rows))
-    dept_list = [d for d in depts if d]
-    if '' in depts:
+    """
+    Build workbook with Plant Report, Payroll, and per-dept sheets. include_punch_columns: add Punch In/Out (e.g. previous day). include_bonus_columns: add Bonus (hrs) and Bonus (Rs).
+    Streamed: write-only sheets serialize rows as they are appended, and the file goes to a temp file
+    (kept in memory below SPOOL_MAX_BYTES). Returns the file at position 0; send it with FileResponse, which closes it.
+    """
+    from .export_jobs import report_progress
+    report_progress(0.6, 'writing workbook')
+    wb = _new_workbook()
+    write_plant_report_sheet(wb.create_sheet(title='Plant Report'), sorted_dates, plant_rows)
+    write_payroll_sheet(wb.create_sheet(title='Payroll'), sorted_dates, payroll_rows, include_punch_columns=include_punch_columns, include_bonus_columns=include_bonus_columns)
+    by_dept = defaultdict(list)
+    for r in payroll_rows:
+        by_dept[r.get('department') or ''].append(r)
+    dept_list = sorted(d for d in by_dept if d)
+    if '' in by_dept:
         dept_list.append('')
-    for dept in dept_list:
-        subset = [r for r in payroll_rows if (r.get('department') or '') == dept]
-        if not subset:
-            continue
+    for i, dept in enumerate(dept_list):
+        report_progress(0.6 + 0.35 * i / len(dept_list), 'writing workbook')
         title = (dept if dept else 'No_Dept')[:31]
         title = ''.join(c for c in title if c not in r'\/:*?[]')
-        ws_dept = wb.create_sheet(title=title)
-        write_payroll_sheet(ws_dept, sorted_dates, subset, include_punch_columns=include_punch_columns, include_bonus_columns=include_bonus_columns)
-    buf = BytesIO()
-    wb.save(buf)
-    buf.seek(0)
-    return buf
+        write_payroll_sheet(wb.create_sheet(title=title), sorted_dates, by_dept[dept], include_punch_columns=include_punch_columns, include_bonus_columns=include_bonus_columns)
+    out = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    wb.save(out)
+    out.seek(0)
+    return out
 
 
 def generate_payroll_excel(date_from=None, date_to=None, single_date=None, month=None, year=None, allowed_emp_codes=None, emp_code=None):
     """
-    Generate payroll Excel workbook. Returns BytesIO.
+    Generate payroll Excel workbook. Returns a temp file (see _write_payroll_workbook).
     Filter: single_date (one day), or month+year, or date_from/date_to (range), or all if none set.
     allowed_emp_codes: if set, only these employees (dept admin filter).
     emp_code: if set, only this single employee (overrides to one-emp export).
+    All data comes from one ReportDataset (for single_date it also covers month-to-date).
     """
-    att_qs = _get_date_filter_queryset(
-        date_from=date_from, date_to=date_to,
-        single_date=single_date, month=month, year=year
-    )
-    if allowed_emp_codes is not None:
-        att_qs = att_qs.filter(emp_code__in=allowed_emp_codes) if allowed_emp_codes else att_qs.none()
-    if emp_code:
-        att_qs = att_qs.filter(emp_code=emp_code)
-    emp_qs = Employee.objects.all().order_by('dept_name', 'emp_code')
-    if emp_code:
-        emp_qs = emp_qs.filter(emp_code=emp_code)
-    elif allowed_emp_codes is not None:
-        emp_qs = emp_qs.filter(emp_code__in=allowed_emp_codes) if allowed_emp_codes else emp_qs.none()
-    employees = list(emp_qs)
+    from calendar import monthrange
+    from .report_dataset import ReportDataset, months_in_range
     if single_date:
-        advance_by_emp = _get_advance_by_emp(
-            month=single_date.month, year=single_date.year,
-            allowed_emp_codes=allowed_emp_codes
-        )
-        penalty_by_emp = _get_penalty_by_emp(
-            month=single_date.month, year=single_date.year,
-            allowed_emp_codes=allowed_emp_codes
-        )
+        window = (single_date.replace(day=1), single_date)
+        att_window = (single_date, single_date)
+        periods = [(single_date.month, single_date.year)]
     elif month is not None and year is not None:
-        advance_by_emp = _get_advance_by_emp(
-            month=month, year=year,
-            allowed_emp_codes=allowed_emp_codes
-        )
-        penalty_by_emp = _get_penalty_by_emp(
-            month=month, year=year,
-            allowed_emp_codes=allowed_emp_codes
-        )
+        window = (date(year, month, 1), date(year, month, monthrange(year, month)[1]))
+        att_window = window
+        periods = [(month, year)]
     else:
-        advance_by_emp = _get_advance_by_emp(
-            date_from=date_from, date_to=date_to,
-            allowed_emp_codes=allowed_emp_codes
-        )
-        penalty_by_emp = _get_penalty_by_emp(
-            date_from=date_from, date_to=date_to,
-            allowed_emp_codes=allowed_emp_codes
-        )
+        window = (date_from, date_to)
+        att_window = window
+        # Same as _get_advance_by_emp: no advance / penalty when no dates given at all
+        periods = months_in_range(date_from, date_to) if (date_from or date_to) else []
+    from .export_jobs import report_progress
+    report_progress(0.05, 'loading data')
+    dataset = ReportDataset(allowed_emp_codes=allowed_emp_codes, date_from=window[0], date_to=window[1], emp_code=emp_code)
+    att_qs = dataset.attendance(*att_window)
+    report_progress(0.3, 'building rows')
+    employees = dataset.employees
+    advance_by_emp = dataset.advance_by_emp(periods)
+    penalty_by_emp = dataset.penalty_by_emp(periods)
     sorted_dates, payroll_rows = build_payroll_rows(
         employees, att_qs, advance_by_emp=advance_by_emp, penalty_by_emp=penalty_by_emp
     )
     if month is not None and year is not None:
-        _add_bonus_to_payroll_rows(payroll_rows, month, year)
+        _add_bonus_to_payroll_rows(payroll_rows, month, year, dataset=dataset)
     elif single_date:
-        _add_bonus_to_payroll_rows(payroll_rows, single_date.month, single_date.year)
+        _add_bonus_to_payroll_rows(payroll_rows, single_date.month, single_date.year, dataset=dataset)
     else:
-        _set_bonus_columns_for_date_range(payroll_rows, sorted_dates)
+        _set_bonus_columns_for_date_range(payroll_rows, sorted_dates, dataset=dataset)
 
     # Total Salary in Plant Report: All dates = sum of all cols; Month&year = whole month (sum of cols);
     # Single day = month-to-date (1st of month till selected date); From–to = sum of range cols.
@@ -713,15 +744,11 @@ def generate_payroll_excel(date_from=None, date_to=None, single_date=None, month
     month_bonus_per_dept = None
     if single_date:
         month_start = single_date.replace(day=1)
-        att_mtd = _get_date_filter_queryset(date_from=month_start, date_to=single_date)
-        if allowed_emp_codes is not None:
-            att_mtd = att_mtd.filter(emp_code__in=allowed_emp_codes) if allowed_emp_codes else att_mtd.none()
-        if emp_code:
-            att_mtd = att_mtd.filter(emp_code=emp_code)
+        att_mtd = dataset.attendance(month_start, single_date)
         _, payroll_mtd = build_payroll_rows(
             employees, att_mtd, advance_by_emp=advance_by_emp, penalty_by_emp=penalty_by_emp
         )
-        _add_bonus_to_payroll_rows(payroll_mtd, single_date.month, single_date.year)
+        _add_bonus_to_payroll_rows(payroll_mtd, single_date.month, single_date.year, dataset=dataset)
         month_total_per_dept = {}
         for row in payroll_mtd:
             dept = row.get('department') or ''
@@ -730,7 +757,8 @@ def generate_payroll_excel(date_from=None, date_to=None, single_date=None, month
             month_total_per_dept[dept] = round(month_total_per_dept[dept], 2)
         # Bonus from start of month till selected date: use ShiftOvertimeBonus in range + prorate Salary.bonus
         month_bonus_per_dept = _month_to_date_bonus_per_dept(
-            month_start, single_date, employees, allowed_emp_codes=allowed_emp_codes, emp_code_filter=emp_code
+            month_start, single_date, employees, allowed_emp_codes=allowed_emp_codes, emp_code_filter=emp_code,
+            dataset=dataset,
         )
 
     plant_rows = build_plant_report_rows(
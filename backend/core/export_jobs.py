@@ -0,0 +1,233 @@
+"""
+Background export jobs for ranges too large for one request (gateway timeout).
+A job runs one of the export endpoints (KINDS) with the same query parameters, as the admin who
+asked, on a small worker pool (EXPORT_JOB_WORKERS); the response body is saved under
+EXPORT_JOBS_DIR and downloadable by the job token until EXPORT_JOB_TTL_HOURS. Exporters report
+progress through report_progress(), a no-op outside a job.
+Identical requests (same scope, kind, parameters and data version) share one active job;
+a new data version starts a new one. cleanup() (scheduler) deletes expired files and fails jobs
+whose worker died.
+"""
+import json
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import IntegrityError, connection
+from django.utils import timezone
+
+from .models import ExportJob
+
+logger = logging.getLogger(__name__)
+
+KINDS = {
+    'payroll': 'ExportPayrollExcelView',
+    'export': 'ExportView',
+    'salary_history': 'ExportEmployeeSalaryHistoryView',
+}
+STALE_JOB_SECONDS = 2 * 3600  # queued / running longer than this: worker gone (restart), mark failed
+PROGRESS_INTERVAL_SECONDS = 1.0
+
+_lock = threading.Lock()
+_pool = None
+_local = threading.local()
+
+
+def _get_pool():
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=max(1, getattr(settings, 'EXPORT_JOB_WORKERS', 2)),
+                thread_name_prefix='export-job',
+            )
+        return _pool
+
+
+def _jobs_dir():
+    path = Path(getattr(settings, 'EXPORT_JOBS_DIR', Path(settings.BASE_DIR) / 'export_jobs'))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+# ---------- Progress (called by exporters) ----------
+def report_progress(fraction, phase=''):
+    """Record progress (0..1) of the job running on this thread; throttled unless the phase changes, never raises."""
+    job_id = getattr(_local, 'job_id', None)
+    if job_id is None:
+        return
+    now = time.monotonic()
+    if phase == getattr(_local, 'last_phase', '') and now - getattr(_local, 'last_report', 0) < PROGRESS_INTERVAL_SECONDS:
+        return
+    _local.last_report = now
+    _local.last_phase = phase
+    fields = {'progress': max(0, min(99, int(fraction * 100)))}
+    if phase:
+        fields['phase'] = phase[:100]
+    try:
+        ExportJob.objects.filter(pk=job_id).update(**fields)
+    except Exception:
+        logger.warning('Export job progress update failed (job %s)', job_id, exc_info=True)
+
+
+# ---------- Submit ----------
+def submit(kind, params, admin, allowed_emp_codes):
+    """
+    Start (or join) the job for this export. params: the endpoint's query parameters.
+    Returns (job, joined).
+    """
+    from . import export_cache
+    if kind not in KINDS:
+        raise ValueError(f"kind must be one of: {', '.join(KINDS)}")
+    params = {str(k): str(v) for k, v in (params or {}).items() if v not in (None, '')}
+    company_id = getattr(admin, 'company_id', None) if admin else None
+    key = export_cache.make_key(f'job:{kind}', params, company_id=company_id, allowed_emp_codes=allowed_emp_codes)
+    now = timezone.now()
+    ExportJob.objects.filter(dedupe_key=key, active=True, expires_at__lte=now).update(active=False)
+    existing = ExportJob.objects.filter(dedupe_key=key, active=True).first()
+    if existing is not None:
+        return existing, True
+    try:
+        job = ExportJob.objects.create(
+            token=secrets.token_urlsafe(32), admin=admin, company_id=company_id,
+            kind=kind, params=params, dedupe_key=key,
+        )
+    except IntegrityError:  # same export requested concurrently
+        existing = ExportJob.objects.filter(dedupe_key=key, active=True).first()
+        if existing is None:
+            raise
+        return existing, True
+    _get_pool().submit(_run, job.pk)
+    return job, False
+
+
+# ---------- Worker ----------
+def _request_for(job):
+    """A GET request to the export endpoint as the job's admin, with the job's query parameters."""
+    from django.http import HttpRequest, QueryDict
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = f'/api/export-jobs/{job.kind}/'
+    request.GET = QueryDict(mutable=True)
+    request.GET.update(job.params or {})
+    request.jwt_admin_id = job.admin_id
+    request.jwt_employee_emp_code = None
+    request.META['REMOTE_ADDR'] = '127.0.0.1'
+    return request
+
+
+def _filename(response, job):
+    disposition = response.get('Content-Disposition', '')
+    m = re.search(r'filename="([^"]+)"', disposition)
+    if m:
+        return m.group(1)
+    return f'{job.kind}_export'
+
+
+def _error_message(response):
+    try:
+        body = json.loads(response.content)
+        return body.get('error') or body.get('message') or f'HTTP {response.status_code}'
+    except (ValueError, AttributeError):
+        return f'HTTP {response.status_code}'
+
+
+def _run(job_id):
+    from . import views
+    _local.job_id = job_id
+    _local.last_report = 0
+    _local.last_phase = ''
+    tmp_path = None
+    try:
+        job = ExportJob.objects.select_related('admin').get(pk=job_id)
+        ExportJob.objects.filter(pk=job_id).update(status=ExportJob.STATUS_RUNNING, started_at=timezone.now(), phase='generating')
+        response = getattr(views, KINDS[job.kind]).as_view()(_request_for(job))
+        if hasattr(response, 'render') and callable(response.render):
+            response.render()  # DRF Response (errors)
+        if response.status_code >= 400:
+            raise RuntimeError(_error_message(response))
+        ExportJob.objects.filter(pk=job_id).update(phase='saving')
+        path = _jobs_dir() / f'{job.token}.bin'
+        tmp_path = path.with_suffix('.tmp')
+        size = 0
+        with open(tmp_path, 'wb') as out:
+            chunks = response.streaming_content if response.streaming else [response.content]
+            for chunk in chunks:
+                out.write(chunk)
+                size += len(chunk)
+        response.close()
+        os.replace(tmp_path, path)
+        tmp_path = None
+        now = timezone.now()
+        ttl = timedelta(hours=int(getattr(settings, 'EXPORT_JOB_TTL_HOURS', 24)))
+        ExportJob.objects.filter(pk=job_id).update(
+            status=ExportJob.STATUS_DONE, phase='', progress=100, finished_at=now, expires_at=now + ttl,
+            file_path=str(path), filename=_filename(response, job)[:255],
+            content_type=(response.get('Content-Type') or 'application/octet-stream')[:100], size=size,
+        )
+    except Exception as e:
+        logger.exception('Export job %s failed', job_id)
+        ExportJob.objects.filter(pk=job_id).update(
+            status=ExportJob.STATUS_FAILED, active=False, phase='', finished_at=timezone.now(), message=str(e)[:2000],
+        )
+        if tmp_path is not None:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+    finally:
+        _local.job_id = None
+        connection.close()  # worker threads outlive the request cycle
+
+
+# ---------- Status / cleanup ----------
+def is_expired(job):
+    return job.expires_at is not None and job.expires_at <= timezone.now()
+
+
+def job_status(job):
+    """API shape of a job (download_url while done and not expired)."""
+    expired = is_expired(job)
+    done = job.status == ExportJob.STATUS_DONE and not expired
+    return {
+        'token': job.token,
+        'kind': job.kind,
+        'params': job.params,
+        'status': 'expired' if expired else job.status,
+        'phase': job.phase,
+        'progress': job.progress,
+        'message': job.message,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'expires_at': job.expires_at.isoformat() if job.expires_at else None,
+        'filename': job.filename if done else '',
+        'size': job.size if done else 0,
+        'download_url': f'/api/export/jobs/{job.token}/download/' if done else None,
+    }
+
+
+def cleanup():
+    """Delete expired artifacts (and their rows) and fail jobs stuck queued / running. Returns counts."""
+    now = timezone.now()
+    expired = 0
+    for job in ExportJob.objects.filter(expires_at__lte=now):
+        if job.file_path:
+            try:
+                os.unlink(job.file_path)
+            except OSError:
+                pass
+        job.delete()
+        expired += 1
+    stale = ExportJob.objects.filter(
+        status__in=[ExportJob.STATUS_QUEUED, ExportJob.STATUS_RUNNING],
+        created_at__lt=now - timedelta(seconds=STALE_JOB_SECONDS),
+    ).update(status=ExportJob.STATUS_FAILED, active=False, finished_at=now, message='Export worker stopped before finishing')
+    ExportJob.objects.filter(status=ExportJob.STATUS_FAILED, finished_at__lt=now - timedelta(days=1)).delete()
+    return {'expired': expired, 'stale': stale}
@@ -0,0 +1,228 @@
+"""
+In-process stand-in for the Google Sheets v4 client used by google_sheets_sync, for benchmarks and
+local runs without credentials. Implements the calls the sync makes:
+    service.spreadsheets().get(spreadsheetId, fields)
+    service.spreadsheets().batchUpdate(spreadsheetId, body)
+    service.spreadsheets().values().batchUpdate(spreadsheetId, body)
+Keeps tabs, sheet ids, conditional format counts and written values in memory, rejects requests the
+real API would reject (unknown sheetId / tab, duplicate addSheet) with an HttpError-like exception,
+and records every call with its payload size and simulated latency.
+Use with google_sheets_sync.use_service(FakeSheetsService(...)).
+"""
+import json
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+
+class FakeHttpError(Exception):
+    """Shaped like googleapiclient.errors.HttpError: .resp.status, message in str()."""
+
+    def __init__(self, status, message):
+        super().__init__(f'<HttpError {status}: {message}>')
+        self.resp = SimpleNamespace(status=status)
+
+
+_RANGE_RE = re.compile(r"^'((?:[^']|'')*)'!([A-Z]+)(\d+)$")
+
+
+def _parse_range(a1):
+    """"'Tab name'!B2" -> (title, row0, col0)."""
+    m = _RANGE_RE.match(a1)
+    if not m:
+        raise FakeHttpError(400, f'Unable to parse range: {a1}')
+    title, letters, row = m.group(1).replace("''", "'"), m.group(2), int(m.group(3))
+    col = 0
+    for ch in letters:
+        col = col * 26 + (ord(ch) - 64)
+    return title, row - 1, col - 1
+
+
+class _Request:
+    def __init__(self, service, method, spreadsheet_id, body, apply):
+        self._service = service
+        self._method = method
+        self._spreadsheet_id = spreadsheet_id
+        self._body = body
+        self._apply = apply
+
+    def execute(self, num_retries=0):
+        return self._service._execute(self._method, self._spreadsheet_id, self._body, self._apply)
+
+
+class _Values:
+    def __init__(self, service):
+        self._service = service
+
+    def batchUpdate(self, spreadsheetId, body):
+        return _Request(self._service, 'values.batchUpdate', spreadsheetId, body, self._service._apply_values)
+
+
+class _Spreadsheets:
+    def __init__(self, service):
+        self._service = service
+
+    def get(self, spreadsheetId, fields=None):
+        return _Request(self._service, 'get', spreadsheetId, None, self._service._apply_get)
+
+    def batchUpdate(self, spreadsheetId, body):
+        return _Request(self._service, 'batchUpdate', spreadsheetId, body, self._service._apply_batch)
+
+    def values(self):
+        return _Values(self._service)
+
+
+class FakeSheetsService:
+    """
+    latency: seconds added to every call; per_kb: extra seconds per KB of request body.
+    quota_per_minute: answer 429 once more calls than this were made in the last 60 s (None = unlimited).
+    Spreadsheets are created on first use with one empty 'Sheet1' tab, like a new Google Sheet.
+    """
+
+    def __init__(self, latency=0.0, per_kb=0.0, quota_per_minute=None):
+        self.latency = latency
+        self.per_kb = per_kb
+        self.quota_per_minute = quota_per_minute
+        self.calls = []  # {'method', 'spreadsheet_id', 'bytes', 'requests', 'seconds', 'error'}
+        self._books = {}  # spreadsheet_id -> {title: {'sheetId', 'conditional_formats', 'cells': {(r, c): v}}}
+        self._lock = threading.Lock()
+
+    # ---------- client interface ----------
+    def spreadsheets(self):
+        return _Spreadsheets(self)
+
+    # ---------- inspection ----------
+    def sheet_titles(self, spreadsheet_id):
+        with self._lock:
+            return list(self._book(spreadsheet_id))
+
+    def sheet_values(self, spreadsheet_id, title):
+        """Written values of a tab as a 2D list from A1 (empty cells = '')."""
+        with self._lock:
+            cells = self._book(spreadsheet_id)[title]['cells']
+            if not cells:
+                return []
+            rows = max(r for r, _ in cells) + 1
+            cols = max(c for _, c in cells) + 1
+            return [[cells.get((r, c), '') for c in range(cols)] for r in range(rows)]
+
+    def summary(self):
+        """{'calls', 'bytes', 'seconds', 'errors', 'by_method': {method: {'calls', 'bytes', 'requests'}}}"""
+        with self._lock:
+            calls = list(self.calls)
+        by_method = {}
+        for c in calls:
+            m = by_method.setdefault(c['method'], {'calls': 0, 'bytes': 0, 'requests': 0})
+            m['calls'] += 1
+            m['bytes'] += c['bytes']
+            m['requests'] += c['requests']
+        return {
+            'calls': len(calls),
+            'bytes': sum(c['bytes'] for c in calls),
+            'seconds': round(sum(c['seconds'] for c in calls), 3),
+            'errors': sum(1 for c in calls if c['error']),
+            'by_method': by_method,
+        }
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls = []
+
+    # ---------- internals ----------
+    def _book(self, spreadsheet_id):
+        if spreadsheet_id not in self._books:
+            self._books[spreadsheet_id] = {'Sheet1': {'sheetId': 0, 'conditional_formats': 0, 'cells': {}}}
+        return self._books[spreadsheet_id]
+
+    def _execute(self, method, spreadsheet_id, body, apply):
+        size = len(json.dumps(body, separators=(',', ':'), ensure_ascii=False).encode('utf-8')) if body is not None else 0
+        n_requests = len(body.get('requests') or body.get('data') or []) if body else 0
+        delay = self.latency + self.per_kb * size / 1024.0
+        if delay:
+            time.sleep(delay)
+        record = {'method': method, 'spreadsheet_id': spreadsheet_id, 'bytes': size, 'requests': n_requests, 'seconds': delay, 'error': ''}
+        with self._lock:
+            try:
+                if self.quota_per_minute is not None:
+                    now = time.monotonic()
+                    recent = sum(1 for c in self.calls if now - c.get('_at', 0) < 60)
+                    if recent >= self.quota_per_minute:
+                        raise FakeHttpError(429, 'Quota exceeded for quota metric Write requests (RATE_LIMIT_EXCEEDED)')
+                record['_at'] = time.monotonic()
+                return apply(self._book(spreadsheet_id), body)
+            except FakeHttpError as e:
+                record['error'] = str(e)
+                raise
+            finally:
+                self.calls.append(record)
+
+    def _apply_get(self, book, body):
+        return {'sheets': [
+            {
+                'properties': {'sheetId': tab['sheetId'], 'title': title},
+                'conditionalFormats': [{'ranges': [{'sheetId': tab['sheetId']}]}] * tab['conditional_formats'],
+            }
+            for title, tab in book.items()
+        ]}
+
+    def _apply_batch(self, book, body):
+        # Validate the whole batch first: the real API applies all requests or none
+        by_id = {tab['sheetId']: title for title, tab in book.items()}
+        added = []
+        for req in body.get('requests', []):
+            (kind, spec), = req.items()
+            if kind == 'addSheet':
+                props = spec.get('properties', {})
+                if props.get('title') in book or props.get('title') in [t for _, t in added]:
+                    raise FakeHttpError(400, f"A sheet with the name \"{props.get('title')}\" already exists.")
+                if props.get('sheetId') in by_id:
+                    raise FakeHttpError(400, f"Sheet id {props.get('sheetId')} is already in use.")
+                by_id[props.get('sheetId')] = props.get('title')
+                added.append((props.get('sheetId'), props.get('title')))
+                continue
+            sheet_id = self._target_sheet_id(spec)
+            if sheet_id is not None and sheet_id not in by_id:
+                raise FakeHttpError(400, f'No grid with id: {sheet_id}')
+        for sheet_id, title in added:
+            book[title] = {'sheetId': sheet_id, 'conditional_formats': 0, 'cells': {}}
+        for req in body.get('requests', []):
+            (kind, spec), = req.items()
+            if kind == 'addSheet':
+                continue
+            sheet_id = self._target_sheet_id(spec)
+            tab = book[by_id[sheet_id]] if sheet_id is not None else None
+            if kind == 'updateCells' and 'userEnteredValue' in spec.get('fields', '') and tab is not None:
+                tab['cells'] = {}
+            elif kind == 'addConditionalFormatRule' and tab is not None:
+                tab['conditional_formats'] += 1
+            elif kind == 'deleteConditionalFormatRule' and tab is not None:
+                tab['conditional_formats'] = max(0, tab['conditional_formats'] - 1)
+        return {'spreadsheetId': None, 'replies': [{} for _ in body.get('requests', [])]}
+
+    @staticmethod
+    def _target_sheet_id(spec):
+        for key in ('range', 'rule'):
+            part = spec.get(key)
+            if isinstance(part, dict):
+                if 'sheetId' in part:
+                    return part['sheetId']
+                ranges = part.get('ranges')
+                if ranges:
+                    return ranges[0].get('sheetId')
+        return spec.get('sheetId')
+
+    def _apply_values(self, book, body):
+        writes = []
+        for vr in body.get('data', []):
+            title, row0, col0 = _parse_range(vr['range'])
+            if title not in book:
+                raise FakeHttpError(400, f"Unable to parse range: {vr['range']}")
+            writes.append((book[title], row0, col0, vr.get('values', [])))
+        cells_written = 0
+        for tab, row0, col0, values in writes:
+            for r, row in enumerate(values):
+                for c, v in enumerate(row):
+                    tab['cells'][(row0 + r, col0 + c)] = v
+                    cells_written += 1
+        return {'totalUpdatedCells': cells_written, 'totalUpdatedSheets': len({id(w[0]) for w in writes})}
@@ -3,8 +3,13 @@ Live sync of reports to a Google Sheet. Credentials from .env; sheet ID from DB
 Sheets: 1=All dates by month, 2=Current year, 3=Plant Report (Previous day), 4=Employees, 5+=one tab per department (Payroll - DeptName).
 """
 import os
+import hashlib
+import json
 import logging
-from calendar import monthrange
+import threading
+import time
+import zlib
+from contextlib import contextmanager
 from collections import defaultdict
 from datetime import date, timedelta
 from decimal import Decimal
@@ -13,18 +18,17 @@ from django.conf import settings as django_settings
 from django.db.models import Sum
 from django.utils import timezone
 
-from .models import Employee, Attendance, Salary, SalaryAdvance, Penalty, SystemSetting, ShiftOvertimeBonus
+from .models import Employee, SalaryAdvance, Penalty, SystemSetting, ShiftOvertimeBonus
 from .settings_utils import get_company_setting
 from .export_excel import (
-    _get_date_filter_queryset,
-    _get_advance_by_emp,
-    _get_penalty_by_emp,
     build_payroll_rows,
     _add_bonus_to_payroll_rows,
     build_plant_report_rows,
     _shift_hours,
     _month_to_date_bonus_per_dept,
 )
+from .report_dataset import ReportDataset, months_in_range
+from .dept_rollup import refresh_rollups, load_rollup
 
 logger = logging.getLogger(__name__)
 
@@ -78,115 +82,189 @@ def get_sheet_id(company_id=None):
     return (os.environ.get('GOOGLE_SHEET_ID') or '').strip()
 
 
-def _sheets_service():
-    """Build Sheets API v4 service."""
-    from googleapiclient.discovery import build
-    creds = _get_credentials()
-    return build('sheets', 'v4', credentials=creds)
+# ---------- Sheets client, metadata cache and per-sync call accounting ----------
+# One client per thread: the discovery client's httplib2 connection is not thread-safe, but it is
+# reused across syncs (token refresh is handled by the credentials).
+_local = threading.local()
+_meta_lock = threading.Lock()
+_meta_cache = {}  # spreadsheet_id -> {title: {'sheetId': int, 'conditional_formats': int}}
 
 
-def _ensure_sheets_exist(service, spreadsheet_id, sheet_names=None):
-    """Ensure spreadsheet has tabs with the given names. Create any that are missing. If sheet_names is None, use FIXED_SHEET_NAMES."""
-    names = sheet_names if sheet_names is not None else FIXED_SHEET_NAMES
-    if not names:
-        return
-    try:
-        meta = service.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
-    except Exception as e:
-        logger.warning('Could not get spreadsheet metadata: %s', e)
-        return
-    existing = {s['properties']['title'] for s in meta.get('sheets', [])}
-    missing = [t for t in names if t not in existing]
-    if not missing:
-        return
-    requests = []
-    for title in missing:
-        requests.append({'addSheet': {'properties': {'title': title}}})
-    body = {'requests': requests}
+_service_override = None  # set by use_service() (fake_sheets for benchmarks / offline runs)
+
+
+@contextmanager
+def use_service(service):
+    """
+    with use_service(FakeSheetsService()): sync_all(...)
+    Every thread's syncs use this client instead of the real API; sheet metadata cache is reset around it.
+    """
+    global _service_override
+    with _meta_lock:
+        _meta_cache.clear()
+    _service_override = service
     try:
-        service.spreadsheets().batchUpdate(spreadsheetId=spreadsheet_id, body=body).execute()
-        logger.info('Created missing sheets: %s', missing)
-    except Exception as e:
-        logger.warning('Could not add sheets: %s', e)
+        yield service
+    finally:
+        _service_override = None
+        with _meta_lock:
+            _meta_cache.clear()
+
+
+def _sheets_service():
+    """Sheets API v4 service, built once per thread. Socket timeout = GOOGLE_SHEETS_SYNC_TIMEOUT so a hung call cannot hold a worker."""
+    if _service_override is not None:
+        return _service_override
+    service = getattr(_local, 'service', None)
+    if service is None:
+        import httplib2
+        from google_auth_httplib2 import AuthorizedHttp
+        from googleapiclient.discovery import build
+        creds = _get_credentials()
+        http = AuthorizedHttp(creds, http=httplib2.Http(timeout=getattr(django_settings, 'GOOGLE_SHEETS_SYNC_TIMEOUT', 90)))
+        service = build('sheets', 'v4', http=http, cache_discovery=False)
+        _local.service = service
+    return service
+
+
+class SyncDeadlineExceeded(TimeoutError):
+    """A sync ran past its time budget (checked before each API call and after building the data)."""
+
+
+class _RateLimiter:
+    """Token bucket shared by every sync thread in the process: at most per_minute Sheets API calls a minute."""
+
+    def __init__(self, per_minute):
+        self.rate = max(1, per_minute) / 60.0
+        self.capacity = max(1.0, min(10.0, self.rate * 10))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, deadline=None):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise SyncDeadlineExceeded('Sync time limit reached waiting for Sheets API quota')
+            time.sleep(wait)
+
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def _get_rate_limiter():
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = _RateLimiter(getattr(django_settings, 'GOOGLE_SHEETS_REQUESTS_PER_MINUTE', 60))
+        return _rate_limiter
+
+
+def is_quota_error(exc):
+    """True for Sheets API rate limit / quota errors (HTTP 429, or 403 rateLimitExceeded)."""
+    status = getattr(getattr(exc, 'resp', None), 'status', None)
+    if status == 429:
+        return True
+    text = str(exc).lower()
+    return status == 403 and ('ratelimit' in text or 'quota' in text)
+
+
+class _ApiStats:
+    """
+    Sheets API calls, request payload bytes and time spent waiting on Google during one sync.
+    Every call goes through the process-wide rate limiter and is refused once the deadline (monotonic) passed.
+    """
+
+    def __init__(self, deadline=None):
+        self.calls = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.deadline = deadline
+
+    def check_deadline(self):
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise SyncDeadlineExceeded('Sync time limit reached')
+
+    def execute(self, request, body=None):
+        self.check_deadline()
+        _get_rate_limiter().acquire(self.deadline)
+        self.calls += 1
+        if body is not None:
+            self.bytes += len(json.dumps(body, separators=(',', ':'), ensure_ascii=False).encode('utf-8'))
+        started = time.monotonic()
+        try:
+            return request.execute()
+        finally:
+            self.seconds += time.monotonic() - started
+
+    def as_dict(self):
+        return {'calls': self.calls, 'bytes': self.bytes, 'seconds': round(self.seconds, 3)}
+
+
+def _sheet_meta(service, spreadsheet_id, stats, refresh=False):
+    """
+    {title: {'sheetId', 'conditional_formats'}} for the spreadsheet. Fetched once per process and
+    kept up to date by our own batchUpdates; refresh=True re-reads it (tabs edited by hand).
+    """
+    with _meta_lock:
+        meta = None if refresh else _meta_cache.get(spreadsheet_id)
+    if meta is not None:
+        return meta
+    resp = stats.execute(service.spreadsheets().get(
+        spreadsheetId=spreadsheet_id,
+        fields='sheets(properties(sheetId,title),conditionalFormats(ranges(sheetId)))',
+    ))
+    meta = {}
+    for s in resp.get('sheets', []):
+        props = s.get('properties', {})
+        meta[props.get('title')] = {
+            'sheetId': props.get('sheetId'),
+            'conditional_formats': len(s.get('conditionalFormats', [])),
+        }
+    with _meta_lock:
+        _meta_cache[spreadsheet_id] = meta
+    return meta
+
+
+def _new_sheet_id(title, used_ids):
+    """Stable sheetId for a tab we add ourselves, so formatting in the same batchUpdate can target it."""
+    sid = zlib.crc32(title.encode('utf-8')) & 0x7FFFFFFF
+    while sid in used_ids or sid == 0:
+        sid = (sid + 1) & 0x7FFFFFFF
+    return sid
 
 
 # ---------- Sheet 1: All dates by year-month, Total Salary = all-time ----------
-def _build_sheet1_data(allowed_emp_codes=None):
-    """Rows for Sheet 1: columns = Sr No, PLANT, Total Man Hrs, [year-month cols], Present, Absent, Avg Salary, Avg/hr, Absenteeism %, Total Salary (all-time), Bonus hrs, Bonus Rs."""
-    att_qs = Attendance.objects.all()
-    if allowed_emp_codes is not None:
-        att_qs = att_qs.filter(emp_code__in=allowed_emp_codes)
-    att_dates = att_qs.values_list('date', flat=True).distinct()
-    if not att_dates:
+def _build_sheet1_data(rollup, employees):
+    """Rows for Sheet 1: columns = Sr No, PLANT, Total Man Hrs, [year-month cols], Present, Absent, Avg Salary, Avg/hr, Absenteeism %, Total Salary (all-time), Bonus hrs, Bonus Rs.
+    rollup: dept_rollup.load_rollup() for the sheet's scope; employees: that scope's employees (departments, Fixed salaries)."""
+    attendance_months = sorted({(y, m) for (_, y, m), v in rollup.items() if v['present'] or v['absent']})
+    if not attendance_months:
         return [['Sr No', 'PLANT', 'Total Man Hrs', 'Total Worker Present', 'Total Worker Absent',
                   'Average Salary', 'Average Salary/hr', 'Absenteeism %',
                   'Total Salary', 'Total Salary + Bonus (payout)', 'Total Bonus (hrs)', 'Total Bonus (Rs)']]
 
-    min_date = min(att_dates)
-    max_date = max(att_dates)
     # Include all months from attendance; also any month with bonus in Salary (oldest to newest)
-    year_months_set = set()
-    d = min_date.replace(day=1)
-    while d <= max_date:
-        year_months_set.add((d.year, d.month))
-        _, last = monthrange(d.year, d.month)
-        d = date(d.year, d.month, last) + timedelta(days=1)
-    sal_ym = Salary.objects.filter(bonus__gt=0)
-    if allowed_emp_codes is not None:
-        sal_ym = sal_ym.filter(emp_code__in=allowed_emp_codes)
-    for (y, m) in sal_ym.values_list('year', 'month').distinct():
-        year_months_set.add((int(y), int(m)))
+    (min_y, min_m), (max_y, max_m) = attendance_months[0], attendance_months[-1]
+    year_months_set = {(y, m) for m, y in months_in_range(date(min_y, min_m, 1), date(max_y, max_m, 1))}
+    year_months_set |= {(y, m) for (_, y, m), v in rollup.items() if v['bonus_hours'] > 0}
     year_months = sorted(year_months_set)
 
-    emp_qs = Employee.objects.all()
-    if allowed_emp_codes is not None:
-        emp_qs = emp_qs.filter(emp_code__in=allowed_emp_codes)
-    att_all = Attendance.objects.all()
-    if allowed_emp_codes is not None:
-        att_all = att_all.filter(emp_code__in=allowed_emp_codes)
-    employees = list(emp_qs.order_by('dept_name', 'emp_code'))
-    advance_all = _get_advance_by_emp(date_from=min_date, date_to=max_date, allowed_emp_codes=allowed_emp_codes)
-    penalty_all = _get_penalty_by_emp(date_from=min_date, date_to=max_date, allowed_emp_codes=allowed_emp_codes)
-    att_qs = _get_date_filter_queryset(date_from=min_date, date_to=max_date)
-    if allowed_emp_codes is not None:
-        att_qs = att_qs.filter(emp_code__in=allowed_emp_codes)
-    sorted_dates = sorted(set(att_qs.values_list('date', flat=True)))
-    _, payroll_rows = build_payroll_rows(employees, att_qs, advance_by_emp=advance_all, penalty_by_emp=penalty_all)
-    _set_bonus_columns_for_sheet1(payroll_rows, year_months)
-
-    # Aggregate by (dept, year, month): man_hrs, salary, present, absent
-    att_list = list(att_qs.values('emp_code', 'date', 'total_working_hours', 'status'))
-    emp_to_dept = {r['emp_code']: (r.get('department') or '') for r in payroll_rows}
-    dept_ym_man_hrs = defaultdict(float)
-    dept_ym_salary = defaultdict(float)
-    dept_ym_present = defaultdict(int)
-    dept_ym_absent = defaultdict(int)
-    dept_all_bonus_hrs = defaultdict(float)
-    dept_all_bonus_amt = defaultdict(float)
-    dept_all_total = defaultdict(float)
-
-    for r in att_list:
-        dept = emp_to_dept.get(r['emp_code'], '')
-        dt = r['date']
-        ym = (dt.year, dt.month)
-        dept_ym_man_hrs[(dept, ym)] += float(r.get('total_working_hours') or 0)
-        if (r.get('status') or 'Present') == 'Present':
-            dept_ym_present[(dept, ym)] += 1
-        else:
-            dept_ym_absent[(dept, ym)] += 1
+    # Fixed salary employees count their base once in the all-time total (as in build_payroll_rows)
+    dept_fixed_total = defaultdict(float)
+    for emp in employees:
+        if ((emp.salary_type or 'Monthly').strip() or 'Monthly') == 'Fixed':
+            dept_fixed_total[emp.dept_name or ''] += float(emp.base_salary or 0)
 
-    for row in payroll_rows:
-        dept = row.get('department') or ''
-        total_with_bonus = float(row.get('total') or 0)
-        bonus_amt_emp = float(row.get('bonus_amount') or 0)
-        dept_all_bonus_hrs[dept] += float(row.get('bonus_hours') or 0)
-        dept_all_bonus_amt[dept] += bonus_amt_emp
-        dept_all_total[dept] += total_with_bonus
-        for i, d in enumerate(row.get('_dates', [])):
-            amt = row.get('_day_totals', [])[i] if i < len(row.get('_day_totals', [])) else 0
-            dept_ym_salary[(dept, (d.year, d.month))] += amt
-
-    depts = sorted(set(emp_to_dept.values()))
+    depts = sorted({emp.dept_name or '' for emp in employees})
     dept_list = [d for d in depts if d]
     if '' in depts:
         dept_list.append('')
@@ -201,6 +279,7 @@ def _build_sheet1_data(allowed_emp_codes=None):
     ])
     rows = [headers]
     n_cols = len(year_months)
+    empty = {'man_hours': 0.0, 'present': 0, 'absent': 0, 'salary': 0.0, 'bonus_hours': 0.0, 'bonus_amount': 0.0}
 
     for sr, dept in enumerate(dept_list, 1):
         total_man_hrs = 0.0
@@ -208,29 +287,28 @@ def _build_sheet1_data(allowed_emp_codes=None):
         total_present = 0
         total_absent = 0
         total_salary_by_day = 0.0
+        bonus_hrs = 0.0
+        bonus_amt = 0.0
         for y, m in year_months:
-            man_hrs = dept_ym_man_hrs.get((dept, (y, m)), 0)
-            sal = dept_ym_salary.get((dept, (y, m)), 0)
-            total_man_hrs += man_hrs
-            month_totals.append(round(sal, 2))
-            total_salary_by_day += sal
-            total_present += dept_ym_present.get((dept, (y, m)), 0)
-            total_absent += dept_ym_absent.get((dept, (y, m)), 0)
+            v = rollup.get((dept, y, m), empty)
+            total_man_hrs += v['man_hours']
+            month_totals.append(round(v['salary'], 2))
+            total_salary_by_day += v['salary']
+            total_present += v['present']
+            total_absent += v['absent']
+            bonus_hrs += v['bonus_hours']
+            bonus_amt += v['bonus_amount']
 
         total_worker = total_present + total_absent
         avg_salary = round(total_salary_by_day / total_present, 2) if total_present else 0
         avg_salary_hr = round(total_salary_by_day / total_man_hrs, 2) if total_man_hrs else 0
         absenteeism = round(100.0 * total_absent / total_worker, 2) if total_worker else 0
-        all_time_salary_with_bonus = float(dept_all_total.get(dept, 0) or 0)
-        all_time_bonus_amt = float(dept_all_bonus_amt.get(dept, 0) or 0)
-        all_time_salary_no_bonus = round(all_time_salary_with_bonus - all_time_bonus_amt, 2)
-        all_time_salary = round(all_time_salary_with_bonus, 2)
-        bonus_hrs = round(dept_all_bonus_hrs.get(dept, 0), 2)
-        bonus_amt = round(dept_all_bonus_amt.get(dept, 0), 2)
+        all_time_salary_no_bonus = round(total_salary_by_day + dept_fixed_total.get(dept, 0), 2)
+        all_time_salary = round(all_time_salary_no_bonus + bonus_amt, 2)
 
         row = [sr, dept if dept else 'No Dept', round(total_man_hrs, 2)] + month_totals + [
             total_present, total_absent, avg_salary, avg_salary_hr, absenteeism,
-            all_time_salary_no_bonus, all_time_salary, bonus_hrs, bonus_amt,
+            all_time_salary_no_bonus, all_time_salary, round(bonus_hrs, 2), round(bonus_amt, 2),
         ]
         rows.append(row)
 
@@ -267,119 +345,34 @@ def _build_sheet1_data(allowed_emp_codes=None):
     return rows
 
 
-def _set_bonus_columns_for_sheet1(payroll_rows, year_months):
-    """Add bonus_hours and bonus_amount for full date range (all year-months). year_months = list of (year, month)."""
-    if not payroll_rows or not year_months:
-        return
-    emp_codes = [r['emp_code'] for r in payroll_rows]
-    salary_type_by_emp = {
-        e['emp_code']: (e.get('salary_type') or 'Monthly').strip() or 'Monthly'
-        for e in Employee.objects.filter(emp_code__in=emp_codes).values('emp_code', 'salary_type')
-    }
-    bonus_data = {}
-    for (y, m) in year_months:
-        for s in Salary.objects.filter(emp_code__in=emp_codes, month=m, year=y).values('emp_code', 'bonus', 'base_salary'):
-            key = (s['emp_code'], m, y)
-            bonus_data[key] = (float(s.get('bonus') or 0), float(s.get('base_salary') or 0))
-    for row in payroll_rows:
-        ec = row['emp_code']
-        st = salary_type_by_emp.get(ec, 'Monthly')
-        total_hrs = 0.0
-        total_amt = 0.0
-        for (y, m) in year_months:
-            bonus_hrs, base = bonus_data.get((ec, m, y), (0.0, 0.0))
-            if bonus_hrs <= 0:
-                continue
-            if st == 'Hourly':
-                hourly_rate = base
-            elif st == 'Fixed':
-                hourly_rate = base / 208.0 if base else 0.0
-            else:
-                hourly_rate = base / 208.0 if base else 0.0
-            total_hrs += bonus_hrs
-            total_amt += bonus_hrs * hourly_rate
-        row['bonus_hours'] = round(total_hrs, 2)
-        row['bonus_amount'] = round(total_amt, 2)
-        if total_amt > 0:
-            row['total'] = round((row.get('total') or 0) + total_amt, 2)
-
-
 # ---------- Sheet 2: Current year, Jan–Dec columns, no Absenteeism ----------
-def _build_sheet2_data(allowed_emp_codes=None):
+def _build_sheet2_data(rollup, employees):
     """Current year: one row per plant, cols = Sr No, PLANT, Jan..Dec (salary per month), Average Salary,
-    Average Salary/hr, Total Salary, Total Salary + Bonus (payout), Total Bonus (hrs), Total Bonus (Rs)."""
+    Average Salary/hr, Total Salary, Total Salary + Bonus (payout), Total Bonus (hrs), Total Bonus (Rs).
+    rollup / employees: as for _build_sheet1_data; months after the current one are ignored."""
     today = timezone.localdate()
     year = today.year
-    month_start = date(year, 1, 1)
-    month_end = today  # only months that have passed or current
-
-    emp_qs = Employee.objects.all()
-    if allowed_emp_codes is not None:
-        emp_qs = emp_qs.filter(emp_code__in=allowed_emp_codes)
-    employees = list(emp_qs.order_by('dept_name', 'emp_code'))
-    advance_by_emp = _get_advance_by_emp(month=None, year=None, date_from=month_start, date_to=month_end, allowed_emp_codes=allowed_emp_codes)
-    penalty_by_emp = _get_penalty_by_emp(month=None, year=None, date_from=month_start, date_to=month_end, allowed_emp_codes=allowed_emp_codes)
-    att_qs = _get_date_filter_queryset(date_from=month_start, date_to=month_end)
-    if allowed_emp_codes is not None:
-        att_qs = att_qs.filter(emp_code__in=allowed_emp_codes)
-    sorted_dates = sorted(set(att_qs.values_list('date', flat=True)))
-    _, payroll_rows = build_payroll_rows(employees, att_qs, advance_by_emp=advance_by_emp, penalty_by_emp=penalty_by_emp)
-    from .export_excel import _set_bonus_columns_for_date_range
-    _set_bonus_columns_for_date_range(payroll_rows, sorted_dates, add_bonus_to_total=True)
 
     month_names = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-    att_list = list(att_qs.values('emp_code', 'date', 'total_working_hours', 'status'))
-    emp_to_dept = {r['emp_code']: (r.get('department') or '') for r in payroll_rows}
     dept_month_salary = defaultdict(lambda: defaultdict(float))
     dept_month_man_hrs = defaultdict(lambda: defaultdict(float))
     dept_month_present = defaultdict(lambda: defaultdict(int))
     dept_bonus_hrs = defaultdict(float)
     dept_bonus_amt = defaultdict(float)
-
-    for r in att_list:
-        dept = emp_to_dept.get(r['emp_code'], '')
-        dt = r['date']
-        m = dt.month
-        dept_month_man_hrs[dept][m] += float(r.get('total_working_hours') or 0)
-        if (r.get('status') or 'Present') == 'Present':
-            dept_month_present[dept][m] += 1
-
-    for row in payroll_rows:
-        dept = row.get('department') or ''
-        dept_bonus_hrs[dept] += float(row.get('bonus_hours') or 0)
-        dept_bonus_amt[dept] += float(row.get('bonus_amount') or 0)
-        for i, d in enumerate(row.get('_dates', [])):
-            amt = row.get('_day_totals', [])[i] if i < len(row.get('_day_totals', [])) else 0
-            dept_month_salary[dept][d.month] += amt
-
     # Bonus (rs) per department per month (from Salary.bonus hours × rate) for total row
-    sal_year = Salary.objects.filter(year=year)
-    if allowed_emp_codes is not None:
-        sal_year = sal_year.filter(emp_code__in=allowed_emp_codes)
-    emp_codes_with_bonus = set(sal_year.values_list('emp_code', flat=True))
-    all_emp_codes = set(emp_to_dept.keys()) | emp_codes_with_bonus
-    emp_filter_qs = Employee.objects.filter(emp_code__in=all_emp_codes)
-    if allowed_emp_codes is not None:
-        emp_filter_qs = emp_filter_qs.filter(emp_code__in=allowed_emp_codes)
-    salary_type_by_emp = {
-        e['emp_code']: (e.get('salary_type') or 'Monthly').strip() or 'Monthly'
-        for e in emp_filter_qs.values('emp_code', 'salary_type')
-    }
     dept_month_bonus_amt = defaultdict(lambda: defaultdict(float))
-    for m in range(1, 13):
-        sal_m = Salary.objects.filter(year=year, month=m, bonus__gt=0)
-        if allowed_emp_codes is not None:
-            sal_m = sal_m.filter(emp_code__in=allowed_emp_codes)
-        for s in sal_m.values('emp_code', 'bonus', 'base_salary'):
-            ec = s['emp_code']
-            dept = emp_to_dept.get(ec, '')
-            bonus_hrs = float(s.get('bonus') or 0)
-            base = float(s.get('base_salary') or 0)
-            st = salary_type_by_emp.get(ec, 'Monthly')
-            rate = base if st == 'Hourly' else (base / 208.0 if base else 0.0)
-            dept_month_bonus_amt[dept][m] += round(bonus_hrs * rate, 2)
-
-    depts = sorted(set(emp_to_dept.values()))
+
+    for (dept, y, m), v in rollup.items():
+        if y != year or m > today.month:
+            continue
+        dept_month_salary[dept][m] += v['salary']
+        dept_month_man_hrs[dept][m] += v['man_hours']
+        dept_month_present[dept][m] += v['present']
+        dept_bonus_hrs[dept] += v['bonus_hours']
+        dept_bonus_amt[dept] += v['bonus_amount']
+        dept_month_bonus_amt[dept][m] += v['bonus_amount']
+
+    depts = sorted({emp.dept_name or '' for emp in employees})
     dept_list = [d for d in depts if d]
     if '' in depts:
         dept_list.append('')
@@ -485,35 +478,33 @@ def _day_bonus_per_dept(single_date, allowed_emp_codes=None):
 
 
 # ---------- Sheet 3: Plant Report (Previous day) ----------
-def _build_sheet3_data(allowed_emp_codes=None):
-    """Plant Report for previous day: Average Salary and Average Salary/hr are for that day only; OT bonus (hrs)/(rs) are from start of month till previous day."""
+def _build_sheet3_data(allowed_emp_codes=None, dataset=None):
+    """Plant Report for previous day: Average Salary and Average Salary/hr are for that day only; OT bonus (hrs)/(rs) are from start of month till previous day.
+    dataset: ReportDataset covering the 1st of yesterday's month .. yesterday; loaded here if None."""
     today = timezone.localdate()
     yesterday = today - timedelta(days=1)
     month_start = yesterday.replace(day=1)
-    att_yesterday = _get_date_filter_queryset(single_date=yesterday)
-    if allowed_emp_codes is not None:
-        att_yesterday = att_yesterday.filter(emp_code__in=allowed_emp_codes)
-    att_month = Attendance.objects.filter(date__gte=month_start, date__lte=yesterday)
-    if allowed_emp_codes is not None:
-        att_month = att_month.filter(emp_code__in=allowed_emp_codes)
-    emp_qs = Employee.objects.all()
-    if allowed_emp_codes is not None:
-        emp_qs = emp_qs.filter(emp_code__in=allowed_emp_codes)
-    employees = list(emp_qs.order_by('dept_name', 'emp_code'))
-    advance_by_emp = _get_advance_by_emp(month=yesterday.month, year=yesterday.year, allowed_emp_codes=allowed_emp_codes)
-    penalty_by_emp = _get_penalty_by_emp(month=yesterday.month, year=yesterday.year, allowed_emp_codes=allowed_emp_codes)
+    if dataset is None:
+        dataset = ReportDataset(allowed_emp_codes=allowed_emp_codes, date_from=month_start, date_to=yesterday)
+    att_yesterday = dataset.attendance(yesterday, yesterday)
+    att_month = dataset.attendance(month_start, yesterday)
+    employees = dataset.employees
+    advance_by_emp = dataset.advance_by_emp([(yesterday.month, yesterday.year)])
+    penalty_by_emp = dataset.penalty_by_emp([(yesterday.month, yesterday.year)])
     sorted_dates, payroll_rows = build_payroll_rows(
         employees, att_yesterday, advance_by_emp=advance_by_emp, penalty_by_emp=penalty_by_emp
     )
     _, payroll_month = build_payroll_rows(
         employees, att_month, advance_by_emp=advance_by_emp, penalty_by_emp=penalty_by_emp
     )
-    _add_bonus_to_payroll_rows(payroll_month, yesterday.month, yesterday.year)
+    _add_bonus_to_payroll_rows(payroll_month, yesterday.month, yesterday.year, dataset=dataset)
     emp_to_month_total = {r['emp_code']: r['total'] for r in payroll_month}
     for row in payroll_rows:
         row['total'] = emp_to_month_total.get(row['emp_code'], 0)
     # OT bonus (hrs) and (rs) = from start of month till previous day (month-to-date for report date)
-    month_to_date_bonus_per_dept = _month_to_date_bonus_per_dept(month_start, yesterday, employees, allowed_emp_codes=allowed_emp_codes)
+    month_to_date_bonus_per_dept = _month_to_date_bonus_per_dept(
+        month_start, yesterday, employees, allowed_emp_codes=allowed_emp_codes, dataset=dataset,
+    )
     month_total_per_dept = {}
     for row in payroll_rows:
         dept = row.get('department') or ''
@@ -587,15 +578,19 @@ def _build_sheet3_data(allowed_emp_codes=None):
 
 
 # ---------- Sheet 4: All employee data ----------
-def _build_sheet4_data(allowed_emp_codes=None):
+def _build_sheet4_data(allowed_emp_codes=None, dataset=None):
     """All columns from Employee model."""
     cols = ['emp_code', 'name', 'mobile', 'email', 'gender', 'dept_name', 'designation', 'status',
             'employment_type', 'salary_type', 'base_salary', 'shift', 'shift_from', 'shift_to', 'created_at', 'updated_at']
     rows = [cols]
-    emp_qs = Employee.objects.all()
-    if allowed_emp_codes is not None:
-        emp_qs = emp_qs.filter(emp_code__in=allowed_emp_codes)
-    for emp in emp_qs.order_by('emp_code'):
+    if dataset is not None:
+        employees = sorted(dataset.employees, key=lambda e: e.emp_code)
+    else:
+        emp_qs = Employee.objects.all()
+        if allowed_emp_codes is not None:
+            emp_qs = emp_qs.filter(emp_code__in=allowed_emp_codes)
+        employees = emp_qs.order_by('emp_code')
+    for emp in employees:
         row = []
         for c in cols:
             v = getattr(emp, c, None)
@@ -626,24 +621,21 @@ def _sheet_range(sheet_name, start_cell='A1'):
 
 
 # ---------- Sheet 5: One tab per department (from–to, current month), advance, bonus, penalty ----------
-def _build_sheet5_sheets_data(allowed_emp_codes=None):
-    """One sheet per department. Each sheet: From–To, employee rows with Salary, Bonus (hrs), Bonus (Rs), Penalty, Advance, and a total row."""
+def _build_sheet5_sheets_data(allowed_emp_codes=None, dataset=None):
+    """One sheet per department. Each sheet: From–To, employee rows with Salary, Bonus (hrs), Bonus (Rs), Penalty, Advance, and a total row.
+    dataset: ReportDataset covering the current month; loaded here if None."""
     today = timezone.localdate()
     month_start = today.replace(day=1)
     month_end = today
-    emp_qs = Employee.objects.all()
-    if allowed_emp_codes is not None:
-        emp_qs = emp_qs.filter(emp_code__in=allowed_emp_codes)
-    employees = list(emp_qs.order_by('dept_name', 'emp_code'))
-    advance_by_emp = _get_advance_by_emp(month=today.month, year=today.year, allowed_emp_codes=allowed_emp_codes)
-    penalty_by_emp = _get_penalty_by_emp(month=today.month, year=today.year, allowed_emp_codes=allowed_emp_codes)
-    att_qs = _get_date_filter_queryset(date_from=month_start, date_to=month_end)
-    if allowed_emp_codes is not None:
-        att_qs = att_qs.filter(emp_code__in=allowed_emp_codes)
+    if dataset is None:
+        dataset = ReportDataset(allowed_emp_codes=allowed_emp_codes, date_from=month_start, date_to=month_end)
+    employees = dataset.employees
+    advance_by_emp = dataset.advance_by_emp([(today.month, today.year)])
+    penalty_by_emp = dataset.penalty_by_emp([(today.month, today.year)])
     _, payroll_rows = build_payroll_rows(
-        employees, att_qs, advance_by_emp=advance_by_emp, penalty_by_emp=penalty_by_emp
+        employees, dataset.attendance(month_start, month_end), advance_by_emp=advance_by_emp, penalty_by_emp=penalty_by_emp
     )
-    _add_bonus_to_payroll_rows(payroll_rows, today.month, today.year)
+    _add_bonus_to_payroll_rows(payroll_rows, today.month, today.year, dataset=dataset)
 
     from_to_label = f'{month_start.strftime("%d-%m-%Y")} to {month_end.strftime("%d-%m-%Y")}'
     headers = ['From – To', 'Emp Code', 'Name', 'Salary (this period)', 'Total Bonus (hrs)', 'Total Bonus (Rs)', 'Penalty', 'Advance']
@@ -706,146 +698,83 @@ def _values_to_sheet_format(rows):
     return out
 
 
-def _get_sheet_id_by_title(service, spreadsheet_id, title):
-    """Return sheetId for the sheet with the given title, or None."""
-    try:
-        meta = service.spreadsheets().get(
-            spreadsheetId=spreadsheet_id,
-            fields='sheets(properties(sheetId,title))',
-        ).execute()
-        for s in meta.get('sheets', []):
-            if s.get('properties', {}).get('title') == title:
-                return s['properties']['sheetId']
-    except Exception as e:
-        logger.warning('Could not get sheet id for %s: %s', title, e)
-    return None
-
-
-def _clear_sheet(service, spreadsheet_id, sheet_name):
-    """Clear all values in the sheet (range A1:ZZ1000)."""
-    range_name = _sheet_range(sheet_name, 'A1:ZZ1000')
-    try:
-        service.spreadsheets().values().clear(
-            spreadsheetId=spreadsheet_id,
-            range=range_name,
-        ).execute()
-        logger.debug('Cleared sheet "%s"', sheet_name)
-    except Exception as e:
-        logger.warning('Could not clear sheet "%s": %s', sheet_name, e)
+def _clear_values_request(sheet_id):
+    """Clear every value on the sheet, keep formatting (replaces values().clear on A1:ZZ1000)."""
+    return {'updateCells': {'range': {'sheetId': sheet_id}, 'fields': 'userEnteredValue'}}
 
 
 # Sheets that get full reset (unmerge + no borders) before pushing data
 _RESET_FORMAT_SHEET_NAMES = ('All dates by month', 'Current year', 'Plant Report (Previous day)')
 
 
-def _reset_sheet_formatting(service, spreadsheet_id, sheet_names):
-    """
-    For each given sheet: unmerge all cells and remove all borders in A1:ZZ1000.
-    Uses one batchUpdate so merges are cleared and borders set to NONE before we push data.
-    """
-    requests = []
+def _reset_format_requests(sheet_id):
+    """Unmerge all cells and remove all borders in A1:ZZ1000 so merges/borders from the last push do not linger."""
     no_border = {'style': 'NONE'}
     borders = {'top': no_border, 'bottom': no_border, 'left': no_border, 'right': no_border}
-    for name in sheet_names:
-        sid = _get_sheet_id_by_title(service, spreadsheet_id, name)
-        if sid is None:
-            continue
+    full_range = {
+        'sheetId': sheet_id,
+        'startRowIndex': 0,
+        'endRowIndex': 1000,
+        'startColumnIndex': 0,
+        'endColumnIndex': 100,
+    }
+    return [
         # Unmerge entire used range
-        requests.append({
-            'unmergeCells': {
-                'range': {
-                    'sheetId': sid,
-                    'startRowIndex': 0,
-                    'endRowIndex': 1000,
-                    'startColumnIndex': 0,
-                    'endColumnIndex': 100,
-                }
-            }
-        })
+        {'unmergeCells': {'range': full_range}},
         # No borders on same range
-        requests.append({
+        {
             'repeatCell': {
-                'range': {
-                    'sheetId': sid,
-                    'startRowIndex': 0,
-                    'endRowIndex': 1000,
-                    'startColumnIndex': 0,
-                    'endColumnIndex': 100,
-                },
+                'range': full_range,
                 'cell': {'userEnteredFormat': {'borders': borders}},
                 'fields': 'userEnteredFormat.borders',
             }
-        })
-    if not requests:
-        return
-    try:
-        service.spreadsheets().batchUpdate(
-            spreadsheetId=spreadsheet_id,
-            body={'requests': requests},
-        ).execute()
-        logger.debug('Reset formatting (unmerge + no borders) for %s sheet(s)', len(sheet_names))
-    except Exception as e:
-        logger.warning('Could not reset sheet formatting: %s', e)
+        },
+    ]
 
 
-def _merge_total_salary_cell(service, spreadsheet_id, sheet_id, data_start_row_1based, num_data_rows, start_col_0based=1):
+def _merge_total_salary_requests(sheet_id, data_start_row_1based, num_data_rows, start_col_0based=1):
     """
     Merge the TOTAL SALARY cell with the cell to its right and left-align the text.
     Data is written starting at row data_start_row_1based (1-based); total row is the last row of data.
     start_col_0based: 1 = column B (first data column).
     """
-    if sheet_id is None or num_data_rows < 1:
-        return
+    if num_data_rows < 1:
+        return []
     total_row_0based = data_start_row_1based - 1 + num_data_rows - 1
-    requests = [
-        {
-            'mergeCells': {
-                'range': {
-                    'sheetId': sheet_id,
-                    'startRowIndex': total_row_0based,
-                    'endRowIndex': total_row_0based + 1,
-                    'startColumnIndex': start_col_0based,
-                    'endColumnIndex': start_col_0based + 2,
-                },
-                'mergeType': 'MERGE_ALL',
-            }
-        },
+    total_range = {
+        'sheetId': sheet_id,
+        'startRowIndex': total_row_0based,
+        'endRowIndex': total_row_0based + 1,
+        'startColumnIndex': start_col_0based,
+        'endColumnIndex': start_col_0based + 2,
+    }
+    return [
+        {'mergeCells': {'range': total_range, 'mergeType': 'MERGE_ALL'}},
         # Left-align TOTAL SALARY text in the merged cell
         {
             'repeatCell': {
-                'range': {
-                    'sheetId': sheet_id,
-                    'startRowIndex': total_row_0based,
-                    'endRowIndex': total_row_0based + 1,
-                    'startColumnIndex': start_col_0based,
-                    'endColumnIndex': start_col_0based + 2,
-                },
+                'range': total_range,
                 'cell': {'userEnteredFormat': {'horizontalAlignment': 'LEFT'}},
                 'fields': 'userEnteredFormat.horizontalAlignment',
             }
         },
     ]
-    try:
-        service.spreadsheets().batchUpdate(spreadsheetId=spreadsheet_id, body={'requests': requests}).execute()
-        logger.debug('Merged TOTAL SALARY cell and set left alignment')
-    except Exception as e:
-        logger.warning('Could not merge TOTAL SALARY cell: %s', e)
 
 
-def _apply_plant_report_sheet_format(service, spreadsheet_id, sheet_id, num_rows, num_cols):
+def _plant_report_format_requests(sheet_id, num_rows, num_cols):
     """
-    Apply color schema (same as other sheet): header orange, total red, in-between blue.
-    Also add borders to the whole data section. Data from B2: row 1 = header, last = total.
+    Color schema (same as other sheet): header orange, total red, in-between blue.
+    Also borders on the whole data section. Data from B2: row 1 = header, last = total.
     """
-    if not num_rows or not num_cols or sheet_id is None:
-        return
+    if not num_rows or not num_cols:
+        return []
     header_orange = {'red': 1.0, 'green': 0.82, 'blue': 0.6}
     total_red = {'red': 1.0, 'green': 0.82, 'blue': 0.82}
     data_blue = {'red': 0.82, 'green': 0.92, 'blue': 1.0}
     end_col = 1 + num_cols
     border_style = {'style': 'SOLID', 'color': {'red': 0.2, 'green': 0.2, 'blue': 0.2}}
     borders = {'top': border_style, 'bottom': border_style, 'left': border_style, 'right': border_style}
-    requests = [
+    return [
         {
             'repeatCell': {
                 'range': {'sheetId': sheet_id, 'startRowIndex': 1, 'endRowIndex': 2, 'startColumnIndex': 1, 'endColumnIndex': end_col},
@@ -876,46 +805,31 @@ def _apply_plant_report_sheet_format(service, spreadsheet_id, sheet_id, num_rows
             }
         },
     ]
-    try:
-        service.spreadsheets().batchUpdate(spreadsheetId=spreadsheet_id, body={'requests': requests}).execute()
-        logger.info('Applied Plant Report (Previous day) color schema and data borders')
-    except Exception as e:
-        logger.warning('Could not apply Plant Report formatting: %s', e)
 
 
-def _apply_plant_report_title_row(service, spreadsheet_id, sheet_id, num_cols):
+def _plant_report_title_requests(sheet_id, num_cols):
     """
-    Merge top row (B1 to last data column) on Plant Report sheet, set 'PLANT REPORT' styling:
+    Merge top row (B1 to last data column) on report sheets, 'PLANT REPORT' styling:
     center alignment (horizontal + vertical), light gray background, full border.
     """
-    if sheet_id is None or num_cols < 1:
-        return
+    if num_cols < 1:
+        return []
     end_col = 1 + num_cols
     light_gray = {'red': 0.9, 'green': 0.9, 'blue': 0.9}
     border_style = {'style': 'SOLID', 'color': {'red': 0.2, 'green': 0.2, 'blue': 0.2}}
     borders = {'top': border_style, 'bottom': border_style, 'left': border_style, 'right': border_style}
-    requests = [
-        {
-            'mergeCells': {
-                'range': {
-                    'sheetId': sheet_id,
-                    'startRowIndex': 0,
-                    'endRowIndex': 1,
-                    'startColumnIndex': 1,
-                    'endColumnIndex': end_col,
-                },
-                'mergeType': 'MERGE_ALL',
-            }
-        },
+    title_range = {
+        'sheetId': sheet_id,
+        'startRowIndex': 0,
+        'endRowIndex': 1,
+        'startColumnIndex': 1,
+        'endColumnIndex': end_col,
+    }
+    return [
+        {'mergeCells': {'range': title_range, 'mergeType': 'MERGE_ALL'}},
         {
             'repeatCell': {
-                'range': {
-                    'sheetId': sheet_id,
-                    'startRowIndex': 0,
-                    'endRowIndex': 1,
-                    'startColumnIndex': 1,
-                    'endColumnIndex': end_col,
-                },
+                'range': title_range,
                 'cell': {
                     'userEnteredFormat': {
                         'backgroundColor': light_gray,
@@ -928,35 +842,17 @@ def _apply_plant_report_title_row(service, spreadsheet_id, sheet_id, num_cols):
             }
         },
     ]
-    try:
-        service.spreadsheets().batchUpdate(spreadsheetId=spreadsheet_id, body={'requests': requests}).execute()
-        logger.debug('Applied Plant Report title row (merge, center, light gray)')
-    except Exception as e:
-        logger.warning('Could not apply Plant Report title row: %s', e)
 
 
-def _get_sheet_conditional_format_count(service, spreadsheet_id, sheet_name):
-    """Return number of conditional format rules on the sheet, or 0."""
-    try:
-        meta = service.spreadsheets().get(
-            spreadsheetId=spreadsheet_id,
-            fields='sheets(properties(title,sheetId),conditionalFormats)',
-        ).execute()
-        for s in meta.get('sheets', []):
-            if s.get('properties', {}).get('title') == sheet_name:
-                return len(s.get('conditionalFormats', []))
-    except Exception as e:
-        logger.warning('Could not get conditional format count for %s: %s', sheet_name, e)
-    return 0
+# Current year gradients, 0-based columns: D3:O29, P3:R29, S3:U29 (each range scaled on its own values)
+_CURRENT_YEAR_SCALE_COLUMNS = [(3, 15), (15, 18), (18, 21)]
 
 
-def _apply_current_year_color_scale(service, spreadsheet_id, sheet_id, num_rows, num_cols):
+def _current_year_color_scale_requests(sheet_id, existing_rules):
     """
-    Apply separate Green -> Yellow -> Red gradient to each range on Current year sheet:
-    D3:O29, P3:Q29, R3:T29 — each range has its own min/mid/max based on its values only.
+    Replace the conditional format rules on Current year with a separate Green -> Yellow -> Red
+    gradient per range; existing_rules = number of rules currently on the sheet.
     """
-    if sheet_id is None:
-        return
     gradient_rule = {
         'minpoint': {
             'color': {'red': 0.34, 'green': 0.73, 'blue': 0.54},
@@ -972,71 +868,372 @@ def _apply_current_year_color_scale(service, spreadsheet_id, sheet_id, num_rows,
             'type': 'MAX',
         },
     }
-    # 0-based: row 3 = 2, endRowIndex 29; D=3, O=15, P=15, Q=17, R=17, S=18, T=20
-    separate_ranges = [
-        {'sheetId': sheet_id, 'startRowIndex': 2, 'endRowIndex': 29, 'startColumnIndex': 3, 'endColumnIndex': 15},   # D3:O29
-        {'sheetId': sheet_id, 'startRowIndex': 2, 'endRowIndex': 29, 'startColumnIndex': 15, 'endColumnIndex': 18},  # P3:R29
-        {'sheetId': sheet_id, 'startRowIndex': 2, 'endRowIndex': 29, 'startColumnIndex': 18, 'endColumnIndex': 21},  # S3:U29
-    ]
-    requests = []
-    n_rules = _get_sheet_conditional_format_count(service, spreadsheet_id, 'Current year')
-    for _ in range(n_rules):
-        requests.append({'deleteConditionalFormatRule': {'sheetId': sheet_id, 'index': 0}})
-    for i, r in enumerate(separate_ranges):
+    requests = [{'deleteConditionalFormatRule': {'sheetId': sheet_id, 'index': 0}} for _ in range(existing_rules)]
+    for i, (start_col, end_col) in enumerate(_CURRENT_YEAR_SCALE_COLUMNS):
         requests.append({
             'addConditionalFormatRule': {
                 'rule': {
-                    'ranges': [r],
+                    'ranges': [{'sheetId': sheet_id, 'startRowIndex': 2, 'endRowIndex': 29, 'startColumnIndex': start_col, 'endColumnIndex': end_col}],
                     'gradientRule': gradient_rule,
                 },
                 'index': i,
             }
         })
-    try:
-        service.spreadsheets().batchUpdate(
-            spreadsheetId=spreadsheet_id,
-            body={'requests': requests},
-        ).execute()
-        logger.info('Applied separate green-yellow-red color scale to Current year (D3:O29, P3:Q29, R3:T29)')
-    except Exception as e:
-        logger.warning('Could not apply Current year color scale: %s', e)
+    return requests
 
 
-def _add_data_borders(service, spreadsheet_id, sheet_id, num_rows, num_cols, start_row_0=0, start_col_0=0):
-    """Add SOLID borders to the data range. Used for Employees and department sheets (A1)."""
-    if not num_rows or not num_cols or sheet_id is None:
-        return
+def _data_border_requests(sheet_id, num_rows, num_cols, start_row_0=0, start_col_0=0):
+    """SOLID borders on the data range. Used for All dates by month (B2), Employees and department sheets (A1)."""
+    if not num_rows or not num_cols:
+        return []
     border_style = {'style': 'SOLID', 'color': {'red': 0.2, 'green': 0.2, 'blue': 0.2}}
     borders = {'top': border_style, 'bottom': border_style, 'left': border_style, 'right': border_style}
-    try:
-        service.spreadsheets().batchUpdate(
-            spreadsheetId=spreadsheet_id,
-            body={
-                'requests': [{
-                    'repeatCell': {
-                        'range': {
-                            'sheetId': sheet_id,
-                            'startRowIndex': start_row_0,
-                            'endRowIndex': start_row_0 + num_rows,
-                            'startColumnIndex': start_col_0,
-                            'endColumnIndex': start_col_0 + num_cols,
-                        },
-                        'cell': {'userEnteredFormat': {'borders': borders}},
-                        'fields': 'userEnteredFormat.borders',
-                    }
-                }]
+    return [{
+        'repeatCell': {
+            'range': {
+                'sheetId': sheet_id,
+                'startRowIndex': start_row_0,
+                'endRowIndex': start_row_0 + num_rows,
+                'startColumnIndex': start_col_0,
+                'endColumnIndex': start_col_0 + num_cols,
             },
-        ).execute()
-        logger.debug('Applied data borders to sheet')
-    except Exception as e:
-        logger.warning('Could not apply data borders: %s', e)
+            'cell': {'userEnteredFormat': {'borders': borders}},
+            'fields': 'userEnteredFormat.borders',
+        }
+    }]
+
+
+# ---------- Differential sync: remember what was pushed, send only what changed ----------
+BLOCK_ROWS = 25  # rows per hashed block; a changed block is rewritten as one range
+_REPORT_SHEET_NAMES = _RESET_FORMAT_SHEET_NAMES  # report sheets are anchored at B2 (title on row 1)
+
+
+def _hash_rows(rows):
+    """Stable hash of sheet values (already passed through _values_to_sheet_format)."""
+    return hashlib.sha1(json.dumps(rows, separators=(',', ':'), ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def _block_hashes(rows):
+    return [_hash_rows(rows[i:i + BLOCK_ROWS]) for i in range(0, len(rows), BLOCK_ROWS)]
+
+
+def _col_letter(idx0):
+    """0-based column index -> A1 column letters (0 -> A, 26 -> AA)."""
+    letters = ''
+    n = idx0 + 1
+    while n:
+        n, rem = divmod(n - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def _sheet_origin(sheet_name):
+    """(row0, col0) where a sheet's data starts: report sheets at B2, others at A1."""
+    return (1, 1) if sheet_name in _REPORT_SHEET_NAMES else (0, 0)
+
+
+def _load_sync_state(company_id, spreadsheet_id):
+    from .models import GoogleSheetSyncState
+    return {s.sheet_title: s for s in GoogleSheetSyncState.objects.filter(company_id=company_id, spreadsheet_id=spreadsheet_id)}
+
+
+def _save_sync_state(company_id, spreadsheet_id, sheet_name, data):
+    from .models import GoogleSheetSyncState
+    GoogleSheetSyncState.objects.update_or_create(
+        company_id=company_id, spreadsheet_id=spreadsheet_id, sheet_title=sheet_name,
+        defaults={
+            'content_hash': _hash_rows(data),
+            'block_hashes': _block_hashes(data),
+            'num_rows': len(data),
+            'num_cols': max((len(r) for r in data), default=0),
+        },
+    )
+
+
+def _plan_sheet(data, state, force_full=False):
+    """
+    'skip' (same values as last push), 'blocks' (same shape, some row blocks changed: formatting
+    still valid, rewrite only those blocks) or 'full' (new sheet / shape changed / forced).
+    Returns (mode, changed block indexes).
+    """
+    if force_full or state is None:
+        return 'full', None
+    if state.content_hash == _hash_rows(data):
+        return 'skip', []
+    num_cols = max((len(r) for r in data), default=0)
+    if state.num_rows != len(data) or state.num_cols != num_cols:
+        return 'full', None
+    old = state.block_hashes or []
+    new = _block_hashes(data)
+    return 'blocks', [i for i, h in enumerate(new) if i >= len(old) or old[i] != h]
+
+
+def _full_value_ranges(sheet_name, data):
+    """values.batchUpdate ranges for a full rewrite: the data and, on report sheets, the B1 title."""
+    row0, col0 = _sheet_origin(sheet_name)
+    ranges = [{'range': _sheet_range(sheet_name, f'{_col_letter(col0)}{row0 + 1}'), 'values': data}]
+    if sheet_name in _REPORT_SHEET_NAMES:
+        ranges.append({'range': _sheet_range(sheet_name, 'B1'), 'values': [['PLANT REPORT']]})
+    return ranges
+
+
+def _block_value_ranges(sheet_name, data, blocks):
+    """Ranges for the changed row blocks; rows padded to sheet width so shorter rows clear old cells."""
+    row0, col0 = _sheet_origin(sheet_name)
+    width = max((len(r) for r in data), default=0)
+    ranges = []
+    for b in blocks:
+        chunk = [list(r) + [''] * (width - len(r)) for r in data[b * BLOCK_ROWS:(b + 1) * BLOCK_ROWS]]
+        if chunk:
+            start_row = row0 + b * BLOCK_ROWS + 1
+            ranges.append({'range': _sheet_range(sheet_name, f'{_col_letter(col0)}{start_row}'), 'values': chunk})
+    return ranges
+
+
+def _full_sheet_requests(sheet_name, sheet_meta, data):
+    """Clear, reset and format requests for a sheet that is rewritten in full (values go in afterwards)."""
+    sid = sheet_meta['sheetId']
+    requests = [_clear_values_request(sid)]
+    if sheet_name in _RESET_FORMAT_SHEET_NAMES:
+        # Unmerge all cells and remove all borders, then re-merge TOTAL SALARY for the new row count
+        requests += _reset_format_requests(sid)
+    if not (len(data) > 0 and len(data[0]) > 0):
+        return requests
+    num_rows, num_cols = len(data), len(data[0])
+    if sheet_name in ('Plant Report (Previous day)', 'Current year'):
+        requests += _plant_report_format_requests(sid, num_rows, num_cols)
+    if sheet_name in _REPORT_SHEET_NAMES:
+        requests += _plant_report_title_requests(sid, num_cols)
+    if sheet_name == 'Current year' and num_rows >= 3:
+        requests += _current_year_color_scale_requests(sid, sheet_meta.get('conditional_formats', 0))
+    if sheet_name in _REPORT_SHEET_NAMES and num_rows > 1:
+        requests += _merge_total_salary_requests(sid, data_start_row_1based=2, num_data_rows=num_rows, start_col_0based=1)
+    # Borders on data section: "All dates by month" (B2) gets borders only; report sheets already in _plant_report_format_requests
+    if sheet_name == 'All dates by month':
+        requests += _data_border_requests(sid, num_rows, num_cols, start_row_0=1, start_col_0=1)
+    elif sheet_name not in _REPORT_SHEET_NAMES:
+        # Employees and department payroll tabs (A1)
+        requests += _data_border_requests(sid, num_rows, num_cols, start_row_0=0, start_col_0=0)
+    return requests
+
+
+def _apply_structure(service, spreadsheet_id, full_sheets, emptied, stats):
+    """
+    One spreadsheets.batchUpdate for the whole sync: add missing tabs, clear emptied tabs, and
+    clear / reset / format every tab that is rewritten in full. Merging before the values are
+    written is fine: the cell right of TOTAL SALARY is always empty.
+    If the cached metadata is stale (tab renamed or deleted by hand) the batch is rebuilt once from fresh metadata.
+    """
+    for attempt in (0, 1):
+        meta = dict(_sheet_meta(service, spreadsheet_id, stats, refresh=attempt > 0))
+        used_ids = {m['sheetId'] for m in meta.values()}
+        requests = []
+        for name, _ in full_sheets:
+            if name not in meta:
+                sid = _new_sheet_id(name, used_ids)
+                used_ids.add(sid)
+                requests.append({'addSheet': {'properties': {'sheetId': sid, 'title': name}}})
+                meta[name] = {'sheetId': sid, 'conditional_formats': 0}
+        for name in emptied:
+            if name in meta:
+                requests.append(_clear_values_request(meta[name]['sheetId']))
+        for name, data in full_sheets:
+            requests += _full_sheet_requests(name, meta[name], data)
+            if name == 'Current year' and len(data) >= 3 and len(data[0]) > 0:
+                meta[name] = dict(meta[name], conditional_formats=len(_CURRENT_YEAR_SCALE_COLUMNS))
+        if not requests:
+            return
+        body = {'requests': requests}
+        try:
+            stats.execute(service.spreadsheets().batchUpdate(spreadsheetId=spreadsheet_id, body=body), body)
+        except Exception as e:
+            if attempt:
+                raise
+            logger.warning('Sheets batchUpdate failed (%s); reloading sheet metadata and retrying', e)
+            continue
+        with _meta_lock:
+            _meta_cache[spreadsheet_id] = meta
+        return
 
 
-def sync_all(force_full=False, company_id=None):
+def _build_all_sheets(company_id, allowed_emp_codes, build_times, on_step=None):
+    """
+    [(sheet_name, rows)] for every tab. Sheets 1–2 read the department x month rollup; the rest share one
+    dataset from the 1st of yesterday's month (Sheet 3) through today (Sheet 5, current month).
+    build_times is filled with seconds per step ('rollup', 'dataset', sheet names, 'Department payroll');
+    on_step(key) is called after each step.
+    """
+    def timed(key, func, *args, **kwargs):
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        build_times[key] = round(time.perf_counter() - started, 4)
+        if on_step:
+            on_step(key)
+        return result
+
+    def fresh_rollup():
+        refresh_rollups(company_id)
+        return load_rollup(company_id)
+
+    rollup = timed('rollup', fresh_rollup)
+    today = timezone.localdate()
+    dataset = timed(
+        'dataset', ReportDataset, allowed_emp_codes=allowed_emp_codes,
+        date_from=(today - timedelta(days=1)).replace(day=1), date_to=today,
+    )
+    builders = [
+        lambda: _build_sheet1_data(rollup, dataset.employees),
+        lambda: _build_sheet2_data(rollup, dataset.employees),
+        lambda: _build_sheet3_data(dataset=dataset),
+        lambda: _build_sheet4_data(dataset=dataset),
+    ]
+    sheets = [(name, timed(name, build)) for name, build in zip(FIXED_SHEET_NAMES, builders)]
+    sheets += timed('Department payroll', _build_sheet5_sheets_data, dataset=dataset)  # list of (sheet_name, data)
+    return sheets
+
+
+# ---------- Single flight per company ----------
+MAX_FOLLOWUP_RUNS = 2  # coalesced re-runs a sync performs for triggers that arrived while it ran
+
+
+def _sync_lock_name(company_id):
+    return f'sheet_sync:{company_id if company_id is not None else "global"}'
+
+
+def _status_qs(company_id):
+    from .models import GoogleSheetSyncStatus
+    if company_id is None:
+        return GoogleSheetSyncStatus.objects.filter(company__isnull=True)
+    return GoogleSheetSyncStatus.objects.filter(company_id=company_id)
+
+
+def _set_status(company_id, **fields):
+    """Update (or create) the company's GoogleSheetSyncStatus; progress reporting never fails a sync."""
+    from .models import GoogleSheetSyncStatus
+    try:
+        if not _status_qs(company_id).update(**fields):
+            GoogleSheetSyncStatus.objects.create(company_id=company_id, **fields)
+    except Exception:
+        logger.warning('Google Sheet sync status update failed (company %s)', company_id, exc_info=True)
+
+
+def _request_followup(company_id, force_full):
+    fields = {'followup_requested': True}
+    if force_full:
+        fields['followup_force_full'] = True  # a full rewrite request is never downgraded by a later plain one
+    _set_status(company_id, **fields)
+
+
+def _claim_followup(company_id):
+    """Take the pending follow-up request: None if there is none, else its force_full."""
+    from django.db import transaction
+    with transaction.atomic():
+        row = _status_qs(company_id).select_for_update().filter(followup_requested=True).first()
+        if row is None:
+            return None
+        force_full = row.followup_force_full
+        row.followup_requested = False
+        row.followup_force_full = False
+        row.save(update_fields=['followup_requested', 'followup_force_full'])
+    return force_full
+
+
+def get_sync_status(company_id=None, since=None):
+    """
+    {'running', 'phase', 'sheets', 'started_at', 'finished_at', 'elapsed_seconds', 'followup_requested',
+    'last_result'} for the company's sheet. With since (datetime a push was requested) also 'state':
+    queued / running until a sync that started after it has finished with no follow-up pending, then
+    done / failed (a run already under way at since may not have included the request).
+    """
+    from . import job_lock
+    row = _status_qs(company_id).first()
+    running = job_lock.is_locked(_sync_lock_name(company_id))
+    elapsed = None
+    if row and row.started_at:
+        end = timezone.now() if running or not row.finished_at else row.finished_at
+        elapsed = round(max(0.0, (end - row.started_at).total_seconds()), 1)
+    last_result = (row.last_result if row else {}) or {}
+    status = {
+        'running': running,
+        'phase': (row.phase if row and running else ''),
+        'sheets': (row.sheets if row and running else {}) or {},
+        'started_at': row.started_at.isoformat() if row and row.started_at else None,
+        'finished_at': row.finished_at.isoformat() if row and row.finished_at else None,
+        'elapsed_seconds': elapsed,
+        'followup_requested': bool(row and row.followup_requested),
+        'last_result': last_result,
+    }
+    if since is not None:
+        if running:
+            status['state'] = 'running'
+        elif (row and row.started_at and row.started_at >= since and row.finished_at
+              and not row.followup_requested):
+            status['state'] = 'done' if last_result.get('success') else 'failed'
+        else:
+            status['state'] = 'queued'
+    return status
+
+
+def _run_and_record(force_full, company_id, timeout):
+    import os
+    import socket
+    _set_status(
+        company_id, phase='starting', sheets={}, started_at=timezone.now(), finished_at=None,
+        host=f'{socket.gethostname()}:{os.getpid()}'[:255],
+    )
+    result = _sync_once(force_full, company_id, timeout)
+    _set_status(company_id, phase='', finished_at=timezone.now(), last_result=result)
+    return result
+
+
+def _run_with_followups(force_full, company_id, timeout):
+    result = _run_and_record(force_full, company_id, timeout)
+    for _ in range(MAX_FOLLOWUP_RUNS):
+        followup = _claim_followup(company_id)
+        if followup is None:
+            break
+        result = _run_and_record(followup, company_id, timeout)
+    return result
+
+
+def sync_all(force_full=False, company_id=None, timeout=None):
     """
     Push all 5 sheets to the configured Google Sheet for the given company (or global if company_id=None).
-    Returns dict with success, message, last_sync.
+    Only sheets whose values changed since the last push are sent (whole sheet when its shape changed,
+    else just the changed row blocks); force_full=True rewrites everything.
+    A sync costs at most one spreadsheets.batchUpdate (structure + formatting) and one values.batchUpdate.
+    timeout: seconds; past it no further API call is made and the sync fails with timed_out=True.
+    Single flight per company across processes (advisory lock 'sheet_sync:<company>'): a call while a
+    sync runs queues one coalesced follow-up, which the running sync performs before it lets go, and
+    returns already_running=True with the current progress.
+    Returns dict with success, message, last_sync, api (calls / bytes / seconds); failures also carry
+    quota_exceeded / timed_out for the auto-sync backoff.
     """
+    from . import job_lock
+    lock_name = _sync_lock_name(company_id)
+    with job_lock.single_flight(lock_name) as acquired:
+        if acquired:
+            return _run_with_followups(force_full, company_id, timeout)
+    _request_followup(company_id, force_full)
+    # The running sync may have finished between our lock attempt and the request: then it is ours to run
+    with job_lock.single_flight(lock_name) as acquired:
+        if acquired:
+            followup = _claim_followup(company_id)
+            if followup is None:  # already picked up as a follow-up by the previous holder
+                last = get_sync_status(company_id)['last_result']
+                return dict(last, coalesced=True) if last else {'success': True, 'message': 'Synced by a concurrent run.'}
+            return _run_with_followups(followup, company_id, timeout)
+    status = get_sync_status(company_id)
+    phase = f" ({status['phase']})" if status['phase'] else ''
+    return {
+        'success': False, 'already_running': True, 'queued': True,
+        'message': f'A sync is already running{phase}; your request will run right after it.',
+        'last_sync': get_company_setting('google_sheet_last_sync', company_id=company_id, default='') or None,
+        'progress': status,
+    }
+
+
+def _sync_once(force_full, company_id, timeout):
     spreadsheet_id = get_sheet_id(company_id=company_id)
     if not spreadsheet_id:
         return {'success': False, 'message': 'Google Sheet ID not set. Set it in Settings or GOOGLE_SHEET_ID in .env.'}
@@ -1047,116 +1244,74 @@ def sync_all(force_full=False, company_id=None):
         if not allowed_emp_codes:
             return {'success': False, 'message': 'No employees in this company.', 'last_sync': None}
 
+    from . import data_version
+    synced_point = data_version.sync_point(company_id)
+    stats = _ApiStats(deadline=time.monotonic() + timeout if timeout else None)
     try:
-        service = _sheets_service()
-        # Build fixed sheets (1–4) and department payroll (one sheet per dept)
-        sheets_data_1_4 = [
-            _build_sheet1_data(allowed_emp_codes=allowed_emp_codes),
-            _build_sheet2_data(allowed_emp_codes=allowed_emp_codes),
-            _build_sheet3_data(allowed_emp_codes=allowed_emp_codes),
-            _build_sheet4_data(allowed_emp_codes=allowed_emp_codes),
-        ]
-        sheet5_list = _build_sheet5_sheets_data(allowed_emp_codes=allowed_emp_codes)  # list of (sheet_name, data)
-        all_sheet_names = FIXED_SHEET_NAMES + [name for name, _ in sheet5_list]
-        _ensure_sheets_exist(service, spreadsheet_id, all_sheet_names)
-
-        # Clear all sheets before pushing new data
-        for name in all_sheet_names:
-            _clear_sheet(service, spreadsheet_id, name)
-
-        # For the 3 report sheets: unmerge all cells and remove all borders, then we push data and re-merge TOTAL SALARY
-        _reset_sheet_formatting(service, spreadsheet_id, _RESET_FORMAT_SHEET_NAMES)
-
-        for sheet_name, data in zip(FIXED_SHEET_NAMES, sheets_data_1_4):
-            if not data:
-                continue
-            data = _values_to_sheet_format(data)
-            start = 'B2' if sheet_name in ('All dates by month', 'Current year', 'Plant Report (Previous day)') else 'A1'
-            range_name = _sheet_range(sheet_name, start)
-            body = {'values': data}
-            try:
-                service.spreadsheets().values().update(
-                    spreadsheetId=spreadsheet_id,
-                    range=range_name,
-                    valueInputOption='USER_ENTERED',
-                    body=body,
-                ).execute()
-                logger.info('Updated sheet "%s" with %s rows', sheet_name, len(data))
-            except Exception as sheet_err:
-                logger.warning('Update failed for "%s": %s; ensuring sheets and retrying', sheet_name, sheet_err)
-                _ensure_sheets_exist(service, spreadsheet_id, all_sheet_names)
-                service.spreadsheets().values().update(
-                    spreadsheetId=spreadsheet_id,
-                    range=range_name,
-                    valueInputOption='USER_ENTERED',
-                    body=body,
-                ).execute()
-                logger.info('Updated sheet "%s" with %s rows (after retry)', sheet_name, len(data))
-            if sheet_name in ('Plant Report (Previous day)', 'Current year') and len(data) > 0 and len(data[0]) > 0:
-                sheet_id = _get_sheet_id_by_title(service, spreadsheet_id, sheet_name)
-                _apply_plant_report_sheet_format(
-                    service, spreadsheet_id, sheet_id,
-                    num_rows=len(data),
-                    num_cols=len(data[0]),
-                )
-            if sheet_name in ('All dates by month', 'Current year', 'Plant Report (Previous day)') and len(data) > 0 and len(data[0]) > 0:
+        build_times = {}
+        progress = {}
+
+        def built(step):
+            progress[step] = 'built'
+            _set_status(company_id, phase=f'building sheets ({len(progress)} step(s) done)', sheets=progress)
+
+        _set_status(company_id, phase='building sheets')
+        sheets = _build_all_sheets(company_id, allowed_emp_codes, build_times, on_step=built)
+        # Sheets that had data last time but are empty now still need one clear
+        state = _load_sync_state(company_id, spreadsheet_id)
+        emptied = [name for name, data in sheets if not data and name in state]
+        sheets = [(name, _values_to_sheet_format(data)) for name, data in sheets if data]
+        stats.check_deadline()
+
+        plans = []
+        for name, data in sheets:
+            mode, blocks = _plan_sheet(data, state.get(name), force_full=force_full)
+            if mode != 'skip':
+                plans.append((name, data, mode, blocks))
+
+        progress = {name: 'unchanged' for name, _ in sheets}
+        progress.update({name: 'pushing' for name, _, _, _ in plans})
+        progress.update({name: 'pushing' for name in emptied})
+        if plans or emptied:
+            _set_status(company_id, phase=f'pushing {len(plans) + len(emptied)} sheet(s)', sheets=progress)
+            service = _sheets_service()
+            full_sheets = [(name, data) for name, data, mode, _ in plans if mode == 'full']
+            if full_sheets or emptied:
+                _apply_structure(service, spreadsheet_id, full_sheets, emptied, stats)
+            value_ranges = []
+            for name, data, mode, blocks in plans:
+                if mode == 'full':
+                    value_ranges += _full_value_ranges(name, data)
+                else:
+                    value_ranges += _block_value_ranges(name, data, blocks)
+            if value_ranges:
+                body = {'valueInputOption': 'USER_ENTERED', 'data': value_ranges}
                 try:
-                    service.spreadsheets().values().update(
-                        spreadsheetId=spreadsheet_id,
-                        range=_sheet_range(sheet_name, 'B1'),
-                        valueInputOption='USER_ENTERED',
-                        body={'values': [['PLANT REPORT']]},
-                    ).execute()
-                except Exception as e:
-                    logger.warning('Could not write PLANT REPORT title on %s: %s', sheet_name, e)
-                sid = _get_sheet_id_by_title(service, spreadsheet_id, sheet_name)
-                _apply_plant_report_title_row(service, spreadsheet_id, sid, len(data[0]))
-            if sheet_name == 'Current year' and len(data) >= 3 and len(data[0]) > 0:
-                sid = _get_sheet_id_by_title(service, spreadsheet_id, sheet_name)
-                _apply_current_year_color_scale(service, spreadsheet_id, sid, len(data), len(data[0]))
-            if sheet_name in ('All dates by month', 'Current year', 'Plant Report (Previous day)') and len(data) > 1:
-                sid = _get_sheet_id_by_title(service, spreadsheet_id, sheet_name)
-                _merge_total_salary_cell(
-                    service, spreadsheet_id, sid,
-                    data_start_row_1based=2,
-                    num_data_rows=len(data),
-                    start_col_0based=1,
-                )
-            # Borders on data section: "All dates by month" (B2) gets borders only; others already in _apply_plant_report_sheet_format
-            if sheet_name == 'All dates by month' and len(data) > 0 and len(data[0]) > 0:
-                sid = _get_sheet_id_by_title(service, spreadsheet_id, sheet_name)
-                _add_data_borders(service, spreadsheet_id, sid, len(data), len(data[0]), start_row_0=1, start_col_0=1)
-            if sheet_name == 'Employees' and len(data) > 0 and len(data[0]) > 0:
-                sid = _get_sheet_id_by_title(service, spreadsheet_id, sheet_name)
-                _add_data_borders(service, spreadsheet_id, sid, len(data), len(data[0]), start_row_0=0, start_col_0=0)
-
-        for sheet_name, data in sheet5_list:
-            if not data:
-                continue
-            data = _values_to_sheet_format(data)
-            range_name = _sheet_range(sheet_name)
-            body = {'values': data}
-            try:
-                service.spreadsheets().values().update(
-                    spreadsheetId=spreadsheet_id,
-                    range=range_name,
-                    valueInputOption='USER_ENTERED',
-                    body=body,
-                ).execute()
-                logger.info('Updated sheet "%s" with %s rows', sheet_name, len(data))
-            except Exception as sheet_err:
-                logger.warning('Update failed for "%s": %s; ensuring sheets and retrying', sheet_name, sheet_err)
-                _ensure_sheets_exist(service, spreadsheet_id, all_sheet_names)
-                service.spreadsheets().values().update(
-                    spreadsheetId=spreadsheet_id,
-                    range=range_name,
-                    valueInputOption='USER_ENTERED',
-                    body=body,
-                ).execute()
-                logger.info('Updated sheet "%s" with %s rows (after retry)', sheet_name, len(data))
-            if len(data) > 0 and len(data[0]) > 0:
-                sid = _get_sheet_id_by_title(service, spreadsheet_id, sheet_name)
-                _add_data_borders(service, spreadsheet_id, sid, len(data), len(data[0]), start_row_0=0, start_col_0=0)
+                    stats.execute(service.spreadsheets().values().batchUpdate(spreadsheetId=spreadsheet_id, body=body), body)
+                except Exception:
+                    # Tab gone or edited by hand: forget what we pushed so the next sync rewrites in full
+                    from .models import GoogleSheetSyncState
+                    GoogleSheetSyncState.objects.filter(
+                        company_id=company_id, spreadsheet_id=spreadsheet_id,
+                        sheet_title__in=[name for name, _, _, _ in plans],
+                    ).delete()
+                    with _meta_lock:
+                        _meta_cache.pop(spreadsheet_id, None)
+                    raise
+            for name, data, _, _ in plans:
+                _save_sync_state(company_id, spreadsheet_id, name, data)
+            for name in emptied:
+                state[name].delete()
+            progress.update({name: 'pushed' for name in progress if progress[name] == 'pushing'})
+            _set_status(company_id, phase='finishing', sheets=progress)
+        skipped = len(sheets) - len(plans)
+        logger.info(
+            'Google Sheet sync (company %s): %s sheet(s) pushed, %s unchanged; %s API call(s), %s bytes, %.2fs',
+            company_id, len(plans), skipped, stats.calls, stats.bytes, stats.seconds,
+        )
+        message = 'All sheets updated.' if plans else 'No changes since last sync.'
+        if plans and skipped:
+            message = f'{len(plans)} sheet(s) updated, {skipped} unchanged.'
 
         # Store last_sync per company (or global)
         try:
@@ -1165,8 +1320,15 @@ def sync_all(force_full=False, company_id=None):
             set_company_setting('google_sheet_last_sync', last_sync, company_id, description='Last Google Sheet sync time')
         except Exception:
             pass
+        data_version.mark_synced(company_id, synced_point)
 
-        return {'success': True, 'message': 'All sheets updated.', 'last_sync': timezone.now().isoformat()}
+        return {
+            'success': True, 'message': message, 'last_sync': timezone.now().isoformat(), 'api': stats.as_dict(),
+            'build_seconds': build_times,
+        }
     except Exception as e:
-        logger.exception('Google Sheet sync failed')
-        return {'success': False, 'message': str(e), 'last_sync': None}
+        logger.exception('Google Sheet sync failed (%s API call(s) made)', stats.calls)
+        return {
+            'success': False, 'message': str(e), 'last_sync': None, 'api': stats.as_dict(),
+            'quota_exceeded': is_quota_error(e), 'timed_out': isinstance(e, TimeoutError),  # deadline or socket timeout
+        }
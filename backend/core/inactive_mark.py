@@ -44,6 +44,8 @@ def mark_inactive_no_punch_6_days():
 
     if to_inactive:
         updated = Employee.objects.filter(emp_code__in=to_inactive).update(status=Employee.STATUS_INACTIVE)
+        from .data_version import bump
+        bump(emp_codes=to_inactive)
         logger.info('Marked %s employee(s) Inactive (no punch in > %s days): %s', updated, INACTIVE_NO_PUNCH_DAYS, to_inactive)
     else:
         updated = 0
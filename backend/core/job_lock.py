@@ -0,0 +1,65 @@
+"""
+Single-flight locks for background jobs using PostgreSQL session advisory locks.
+Works across processes and servers sharing the database; the lock is released when the
+block exits or the connection dies. On other database backends the lock always succeeds.
+"""
+import hashlib
+import logging
+from contextlib import contextmanager
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+def lock_key(name):
+    """Stable signed 64-bit key for a lock name (e.g. 'reward_engine', 'sheet_sync:3')."""
+    digest = hashlib.sha1(name.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big', signed=True)
+
+
+def try_acquire(name):
+    """Try to take the lock without waiting. Returns True if held by this connection now."""
+    if connection.vendor != 'postgresql':
+        return True
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_lock(%s)', [lock_key(name)])
+        return bool(cursor.fetchone()[0])
+
+
+def release(name):
+    if connection.vendor != 'postgresql':
+        return
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_unlock(%s)', [lock_key(name)])
+    except Exception:
+        logger.warning('Advisory unlock failed for %s', name, exc_info=True)
+
+
+def is_locked(name):
+    """True if some session currently holds the lock (does not take it)."""
+    if connection.vendor != 'postgresql':
+        return False
+    key = lock_key(name)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM pg_locks WHERE locktype = 'advisory' AND granted "
+            "AND objsubid = 1 AND ((classid::bigint << 32) | objid::bigint) = %s)",
+            [key],
+        )
+        return bool(cursor.fetchone()[0])
+
+
+@contextmanager
+def single_flight(name):
+    """
+    with single_flight('reward_engine') as acquired:
+        if not acquired: return  # another process is running it
+    """
+    acquired = try_acquire(name)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            release(name)
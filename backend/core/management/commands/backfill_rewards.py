@@ -0,0 +1,36 @@
+"""
+Rebuild streak / overtime rewards and absentee red flags for past dates.
+Run: python manage.py backfill_rewards --from 2025-01-01 --to 2025-03-31
+      python manage.py backfill_rewards --from 2025-01-01 --to 2025-03-31 --company 2 --workers 4
+"""
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Run the reward engine over a date range (per company and month, in parallel). Safe to re-run.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', type=str, required=True, help='YYYY-MM-DD')
+        parser.add_argument('--to', dest='date_to', type=str, help='YYYY-MM-DD (default: yesterday)')
+        parser.add_argument('--company', type=int, help='Company id (default: all companies and employees without one)')
+        parser.add_argument('--workers', type=int, help='Process count (default: CPU count, max 8; 1 = inline)')
+
+    def handle(self, *args, **options):
+        from datetime import date, timedelta
+        from django.utils import timezone
+        from core.reward_backfill import backfill_rewards
+
+        try:
+            start = date.fromisoformat(options['date_from'])
+            end = date.fromisoformat(options['date_to']) if options.get('date_to') else timezone.localdate() - timedelta(days=1)
+        except ValueError:
+            self.stderr.write(self.style.ERROR('Dates must be YYYY-MM-DD'))
+            return
+        self.stdout.write(f'Backfilling rewards {start}..{end}...')
+        result = backfill_rewards(start, end, company_id=options.get('company'), workers=options.get('workers'))
+        for err in result['errors']:
+            self.stderr.write(self.style.ERROR(f"company={err['company_id']} {err['month']}: {err['error']}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {result['chunks']} chunks, streak={result['streak']}, "
+            f"overtime={result['overtime']}, absentee={result['absentee']}"
+        ))
@@ -0,0 +1,147 @@
+"""
+Benchmark Google Sheet sync offline: synthetic companies of increasing size synced into the in-process
+fake Sheets service (core.fake_sheets). Reports build time per sheet, API calls and bytes pushed for a
+first (full) sync, an unchanged re-sync and a sync after one attendance edit.
+All data is created in one transaction and rolled back at the end unless --keep.
+Run: python manage.py benchmark_sheet_sync
+      python manage.py benchmark_sheet_sync --sizes 100,500,2000 --days 120 --latency 0.2
+"""
+import random
+from datetime import time, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Time sync_all against synthetic companies using a fake Google Sheets service (no credentials needed).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=str, default='50,200,1000', help='Employees per company, comma separated')
+        parser.add_argument('--days', type=int, default=90, help='Days of attendance per employee (ending today)')
+        parser.add_argument('--depts', type=int, default=8, help='Departments per company')
+        parser.add_argument('--latency', type=float, default=0.0, help='Simulated seconds per API call')
+        parser.add_argument('--per-kb', type=float, default=0.0, help='Simulated extra seconds per KB sent')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--keep', action='store_true', help='Keep the synthetic companies (default: roll back)')
+
+    def handle(self, *args, **options):
+        from core import google_sheets_sync
+        from core.fake_sheets import FakeSheetsService
+
+        try:
+            sizes = [int(s) for s in options['sizes'].split(',') if s.strip()]
+        except ValueError:
+            self.stderr.write(self.style.ERROR('--sizes must be comma separated integers'))
+            return
+        rng = random.Random(options['seed'])
+        fake = FakeSheetsService(latency=options['latency'], per_kb=options['per_kb'])
+        # Measure the sync, not the production quota: lift the shared rate limiter for the run
+        saved_limiter = google_sheets_sync._rate_limiter
+        google_sheets_sync._rate_limiter = google_sheets_sync._RateLimiter(10 ** 9)
+        try:
+            with google_sheets_sync.use_service(fake), transaction.atomic():
+                for size in sizes:
+                    self._run_size(size, options, rng, fake)
+                if not options['keep']:
+                    raise _Rollback()
+        except _Rollback:
+            self.stdout.write('Synthetic data rolled back.')
+        finally:
+            google_sheets_sync._rate_limiter = saved_limiter
+
+    def _run_size(self, size, options, rng, fake):
+        from django.utils import timezone
+        from core.google_sheets_sync import sync_all
+        from core.models import Attendance
+
+        started = timezone.now()
+        company = self._make_company(size, options['days'], options['depts'], rng)
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'\n{size} employees x {options["days"]} days (company {company.id}, '
+            f'data created in {(timezone.now() - started).total_seconds():.1f}s)'
+        ))
+
+        runs = [('first sync (full)', lambda: None, True), ('unchanged', lambda: None, False)]
+
+        def edit_one():
+            att = Attendance.objects.filter(emp_code__startswith=company.code, date=timezone.localdate()).first()
+            if att:
+                Attendance.objects.filter(pk=att.pk).update(total_working_hours=(att.total_working_hours or 0) + Decimal('1'))
+        runs.append(('after one attendance edit', edit_one, False))
+
+        for label, prepare, force_full in runs:
+            prepare()
+            fake.reset_calls()
+            t0 = timezone.now()
+            result = sync_all(force_full=force_full, company_id=company.id)
+            wall = (timezone.now() - t0).total_seconds()
+            summary = fake.summary()
+            status = self.style.SUCCESS('ok') if result.get('success') else self.style.ERROR(result.get('message', 'failed'))
+            self.stdout.write(
+                f'  {label:<28} {wall:7.2f}s  {status}  {summary["calls"]} call(s), '
+                f'{summary["bytes"]:,} bytes, {summary["seconds"]:.2f}s simulated API  - {result.get("message", "")}'
+            )
+            for method, m in sorted(summary['by_method'].items()):
+                self.stdout.write(f'      {method:<20} {m["calls"]} call(s), {m["requests"]} request(s), {m["bytes"]:,} bytes')
+            if label.startswith('first'):
+                for step, seconds in (result.get('build_seconds') or {}).items():
+                    self.stdout.write(f'      build {step:<32} {seconds:8.3f}s')
+
+    def _make_company(self, size, days, depts, rng):
+        from django.utils import timezone
+        from core.models import Attendance, Company, CompanySetting, Employee, Salary, SalaryAdvance
+
+        suffix = rng.randrange(10 ** 6)
+        company = Company.objects.create(name=f'Benchmark {size}', code=f'BENCH{size}-{suffix}')
+        CompanySetting.objects.create(company=company, key='google_sheet_id', value=f'bench-{company.code}')
+
+        employees = []
+        for i in range(size):
+            salary_type = rng.choices(['Monthly', 'Hourly', 'Fixed'], weights=[6, 3, 1])[0]
+            base = Decimal(rng.randrange(60, 250)) if salary_type == 'Hourly' else Decimal(rng.randrange(12000, 45000))
+            employees.append(Employee(
+                emp_code=f'{company.code}-{i:05d}', name=f'Bench Employee {i}', dept_name=f'Dept {i % depts + 1}',
+                salary_type=salary_type, base_salary=base, shift='General Shift',
+                shift_from=time(9, 0), shift_to=time(18, 0), company=company,
+            ))
+        Employee.objects.bulk_create(employees, batch_size=1000)
+
+        today = timezone.localdate()
+        rows = []
+        for emp in employees:
+            for d in range(days):
+                day = today - timedelta(days=d)
+                if rng.random() < 0.1:
+                    rows.append(Attendance(emp_code=emp.emp_code, name=emp.name, date=day, status='Absent'))
+                    continue
+                hours = Decimal(str(round(rng.uniform(6, 12), 2)))
+                rows.append(Attendance(
+                    emp_code=emp.emp_code, name=emp.name, date=day, status='Present',
+                    shift=emp.shift, shift_from=emp.shift_from, shift_to=emp.shift_to,
+                    punch_in=time(9, rng.randrange(0, 30)), punch_out=time(17 + min(int(hours) - 6, 5), rng.randrange(0, 60)),
+                    total_working_hours=hours, over_time=max(Decimal('0'), hours - Decimal('9')),
+                ))
+            if len(rows) >= 20000:
+                Attendance.objects.bulk_create(rows, batch_size=5000)
+                rows = []
+        Attendance.objects.bulk_create(rows, batch_size=5000)
+
+        months = sorted({((today - timedelta(days=d)).year, (today - timedelta(days=d)).month) for d in range(days)})
+        salaries, advances = [], []
+        for emp in employees:
+            for y, m in months:
+                salaries.append(Salary(
+                    emp_code=emp.emp_code, salary_type=emp.salary_type, base_salary=emp.base_salary,
+                    bonus=Decimal(rng.choice([0, 0, 0, 2, 4, 8])), month=m, year=y,
+                ))
+                if rng.random() < 0.05:
+                    advances.append(SalaryAdvance(emp_code=emp.emp_code, amount=Decimal(rng.randrange(500, 5000)), month=m, year=y))
+        Salary.objects.bulk_create(salaries, batch_size=5000)
+        SalaryAdvance.objects.bulk_create(advances, batch_size=5000)
+        return company
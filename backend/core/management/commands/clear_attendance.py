@@ -1,5 +1,10 @@
-"""Clear all attendance records. Use before re-uploading a fresh sheet."""
+"""
+Clear all attendance records. Use before re-uploading a fresh sheet.
+One data version bump for all deleted rows; the dept rollup months they covered are marked stale.
+"""
 from django.core.management.base import BaseCommand
+from core import data_version
+from core.dept_rollup import safe_mark_months_stale
 from core.models import Attendance
 
 
@@ -19,5 +24,9 @@ class Command(BaseCommand):
             if confirm.lower() != 'y':
                 self.stdout.write('Aborted.')
                 return
-        deleted, _ = Attendance.objects.all().delete()
+        emp_months = {(emp_code, d.year, d.month) for emp_code, d in Attendance.objects.values_list('emp_code', 'date').distinct()}
+        with data_version.deferred():
+            deleted, _ = Attendance.objects.all().delete()
+            data_version.bump(emp_codes={emp_code for emp_code, _, _ in emp_months})
+        safe_mark_months_stale(emp_months)
         self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} attendance record(s). You can now re-upload Excel.'))
@@ -2,6 +2,7 @@
 Recalc OT and salary for a month using the hourly rule: normal = 12h, over that = OT; bonus = floor(OT/2).
 For each attendance in the month where employee is Hourly: over_time = max(0, total_working_hours - 12).
 Then refreshes Salary rows for that month (overtime_hours, total_working_hours, bonus).
+Bumps the data version and marks the dept rollup stale for the changed rows (queryset updates send no signals).
 Usage: python manage.py recalc_monthly_ot 2 2026   # February 2026
 """
 from calendar import monthrange
@@ -10,6 +11,8 @@ from decimal import Decimal
 
 from django.core.management.base import BaseCommand
 
+from core import data_version
+from core.dept_rollup import safe_mark_dates_stale
 from core.models import Attendance, Employee
 from core.salary_logic import ensure_monthly_salaries
 from core.excel_upload import HOURLY_NORMAL_WORK_HOURS, _calc_overtime_for_employee
@@ -35,9 +38,9 @@ class Command(BaseCommand):
         hourly_emp_codes = set(
             Employee.objects.filter(salary_type='Hourly').values_list('emp_code', flat=True)
         )
-        updated = 0
+        changed = []  # (emp_code, date)
         for att in Attendance.objects.filter(date__gte=first, date__lte=last).only(
-            'id', 'emp_code', 'total_working_hours', 'over_time'
+            'id', 'emp_code', 'date', 'total_working_hours', 'over_time'
         ):
             if att.emp_code not in hourly_emp_codes:
                 continue
@@ -47,7 +50,11 @@ class Command(BaseCommand):
             )
             if new_ot != (att.over_time or Decimal('0')):
                 Attendance.objects.filter(id=att.id).update(over_time=new_ot)
-                updated += 1
+                changed.append((att.emp_code, att.date))
+        updated = len(changed)
+        if changed:
+            data_version.bump(emp_codes={emp_code for emp_code, _ in changed})
+            safe_mark_dates_stale(changed)
 
         self.stdout.write(
             self.style.SUCCESS(
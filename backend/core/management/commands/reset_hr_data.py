@@ -2,13 +2,17 @@
 Reset all HR data for a clean test: employees, attendance, advances, penalties,
 bonus logs, adjustments, salaries, performance rewards. Optionally clear audit log.
 Keeps: admins, system_settings, email_smtp_config, holidays.
+Every company's data version is bumped once and the dept rollup months that had data are marked stale.
 """
 from django.core.management.base import BaseCommand
 from django.db import transaction
 
+from core import data_version
+from core.dept_rollup import safe_mark_month_stale
 from core.models import (
     Adjustment,
     Attendance,
+    Company,
     Employee,
     Penalty,
     PerformanceReward,
@@ -80,7 +84,9 @@ class Command(BaseCommand):
                 self.stdout.write('Aborted.')
                 return
 
-        with transaction.atomic():
+        months = {(d.year, d.month) for d in Attendance.objects.dates('date', 'month')}
+        months |= set(Salary.objects.values_list('year', 'month').distinct())
+        with data_version.deferred(), transaction.atomic():
             deleted_adj, _ = Adjustment.objects.all().delete()
             deleted_att, _ = Attendance.objects.all().delete()
             deleted_pen, _ = Penalty.objects.all().delete()
@@ -95,6 +101,9 @@ class Command(BaseCommand):
                 deleted_audit, _ = AuditLog.objects.all().delete()
                 total_deleted += deleted_audit
                 self.stdout.write(self.style.SUCCESS(f'Cleared audit_log: {deleted_audit} record(s).'))
+            data_version.bump(company_ids=list(Company.objects.values_list('id', flat=True)) + [None])
+        for year, month in sorted(months):
+            safe_mark_month_stale(year, month)
 
         self.stdout.write(
             self.style.SUCCESS(
@@ -0,0 +1,32 @@
+"""
+Run the background scheduler in the foreground (e.g. as its own systemd service / container).
+Safe to run next to web processes that also start it: only one leader runs the jobs.
+Run: python manage.py run_scheduler
+      python manage.py run_scheduler --once   # run due jobs once (if leader) and exit
+"""
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Run the single-leader background scheduler (today sync, auto-absent, plant report, sheets, rewards, inactive)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run due jobs once and exit')
+
+    def handle(self, *args, **options):
+        from core import job_lock
+        from core.scheduler import LEADER_LOCK, run_due_jobs, run_forever
+
+        if options.get('once'):
+            with job_lock.single_flight(LEADER_LOCK) as acquired:
+                if not acquired:
+                    self.stdout.write(self.style.WARNING('Another process is the scheduler leader; nothing to do'))
+                    return
+                run_due_jobs()
+            self.stdout.write(self.style.SUCCESS('Due jobs run'))
+            return
+        self.stdout.write('Scheduler running (Ctrl+C to stop)...')
+        try:
+            run_forever()
+        except KeyboardInterrupt:
+            self.stdout.write('Stopped')
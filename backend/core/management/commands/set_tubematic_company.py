@@ -1,9 +1,12 @@
 """
 Set all existing data to company "Tubematic" and set every employee password to 123456789.
+Bumps the data version and marks the dept rollup stale for the old and new companies (queryset update sends no signals).
 
 Run: python manage.py set_tubematic_company
 """
 from django.core.management.base import BaseCommand
+from core import data_version
+from core.dept_rollup import safe_mark_employees_stale
 from core.models import Company, Employee, Admin
 
 
@@ -24,7 +27,12 @@ class Command(BaseCommand):
             self.stdout.write(f'Using existing company: {company.name} ({company.code})')
 
         emp_count = Employee.objects.count()
+        old_company_ids = set(Employee.objects.exclude(company=company).values_list('company_id', flat=True).distinct())
+        moved = list(Employee.objects.exclude(company=company).values_list('emp_code', flat=True))
         Employee.objects.all().update(company=company, password='123456789')
+        if moved:
+            data_version.bump(company_ids=old_company_ids | {company.id})
+            safe_mark_employees_stale(moved, company_ids=old_company_ids)
         self.stdout.write(self.style.SUCCESS(f'Updated {emp_count} employee(s): company=Tubematic, password=123456789'))
 
         # Assign admins to Tubematic except super admin (id=1) so they keep full access
@@ -1,17 +1,11 @@
 """
-Auto-sync: every few minutes, mark today's punch-in records as Present.
-After 11:50 AM (configurable): mark today's no-punch-in records as Absent; create Absent rows for active employees with no row.
 JWT: set request.jwt_admin_id from Authorization Bearer token; return 401 if Bearer present but invalid/expired.
+Today's attendance sync (Present / auto-absent) runs in core.scheduler, never on the request path.
 """
-import time
 import json
 from django.http import HttpResponse
-from .attendance_sync import run_today_attendance_sync
 from .jwt_auth import decode_token
 
-_LAST_SYNC = 0.0
-_INTERVAL = 180  # 3 minutes
-
 
 class JWTAdminMiddleware:
     """
@@ -48,17 +42,3 @@ class JWTAdminMiddleware:
                     )
         return self.get_response(request)
 
-
-class TodayPunchInSyncMiddleware:
-    """Runs every ~3 min: if employee has punch_in for today, set status=Present. After cutoff (11:50), mark no-punch as Absent."""
-
-    def __init__(self, get_response):
-        self.get_response = get_response
-
-    def __call__(self, request):
-        global _LAST_SYNC
-        now = time.time()
-        if now - _LAST_SYNC >= _INTERVAL:
-            _LAST_SYNC = now
-            run_today_attendance_sync(force_absent=False)
-        return self.get_response(request)
@@ -0,0 +1,32 @@
+# Incremental present/absent streak state per employee for the reward engine
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_companysetting'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmployeeStreakState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('emp_code', models.CharField(max_length=50, unique=True)),
+                ('present_streak', models.PositiveIntegerField(default=0)),
+                ('absent_streak', models.PositiveIntegerField(default=0, help_text='Consecutive absent working days (holidays break it)')),
+                ('last_evaluated', models.DateField(blank=True, help_text='Last attendance date folded into the streaks', null=True)),
+                ('present_hit_date', models.DateField(blank=True, help_text='Last date present_streak was >= streak_days', null=True)),
+                ('absent_hit_date', models.DateField(blank=True, help_text='Last date absent_streak was >= absent_days', null=True)),
+                ('streak_days', models.PositiveSmallIntegerField(default=0, help_text='streak_days threshold used for present_hit_date')),
+                ('absent_days', models.PositiveSmallIntegerField(default=0, help_text='absent_streak_days threshold used for absent_hit_date')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'employee_streak_state',
+                'ordering': ['emp_code'],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Per-job last-run bookkeeping for the single-leader background scheduler
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0027_employeestreakstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduledJobRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('last_started_at', models.DateTimeField(blank=True, null=True)),
+                ('last_finished_at', models.DateTimeField(blank=True, null=True)),
+                ('last_success_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('last_result', models.CharField(blank=True, max_length=500)),
+                ('last_host', models.CharField(blank=True, help_text='host:pid of the leader that ran it', max_length=255)),
+                ('run_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'scheduled_job_runs',
+                'ordering': ['name'],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Last pushed content hashes per company / spreadsheet / tab for differential Google Sheet sync
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0028_scheduledjobrun'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GoogleSheetSyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('spreadsheet_id', models.CharField(max_length=255)),
+                ('sheet_title', models.CharField(max_length=255)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('block_hashes', models.JSONField(blank=True, default=list)),
+                ('num_rows', models.PositiveIntegerField(default=0)),
+                ('num_cols', models.PositiveIntegerField(default=0)),
+                ('pushed_at', models.DateTimeField(auto_now=True)),
+                ('company', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='sheet_sync_states', to='core.company')),
+            ],
+            options={
+                'db_table': 'google_sheet_sync_state',
+                'ordering': ['company_id', 'spreadsheet_id', 'sheet_title'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='googlesheetsyncstate',
+            constraint=models.UniqueConstraint(condition=models.Q(company__isnull=False), fields=('company', 'spreadsheet_id', 'sheet_title'), name='unique_sheet_sync_state_per_company'),
+        ),
+        migrations.AddConstraint(
+            model_name='googlesheetsyncstate',
+            constraint=models.UniqueConstraint(condition=models.Q(company__isnull=True), fields=('spreadsheet_id', 'sheet_title'), name='unique_sheet_sync_state_global'),
+        ),
+    ]
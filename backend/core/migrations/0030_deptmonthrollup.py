@@ -0,0 +1,67 @@
+# Department x month rollup for plant reports + stale-month markers for incremental rebuilds
+
+from decimal import Decimal
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0029_googlesheetsyncstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeptMonthRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dept_name', models.CharField(blank=True, max_length=255)),
+                ('year', models.PositiveIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('man_hours', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14)),
+                ('present_count', models.PositiveIntegerField(default=0)),
+                ('absent_count', models.PositiveIntegerField(default=0)),
+                ('salary', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=16)),
+                ('bonus_hours', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=12)),
+                ('bonus_amount', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=16)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('company', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='dept_month_rollups', to='core.company')),
+            ],
+            options={
+                'db_table': 'dept_month_rollup',
+                'ordering': ['company_id', 'year', 'month', 'dept_name'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='deptmonthrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(company__isnull=False), fields=('company', 'dept_name', 'year', 'month'), name='unique_dept_month_rollup_per_company'),
+        ),
+        migrations.AddConstraint(
+            model_name='deptmonthrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(company__isnull=True), fields=('dept_name', 'year', 'month'), name='unique_dept_month_rollup_global'),
+        ),
+        migrations.CreateModel(
+            name='DeptRollupStaleMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('marked_at', models.DateTimeField(auto_now_add=True)),
+                ('company', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='dept_rollup_stale_months', to='core.company')),
+            ],
+            options={
+                'db_table': 'dept_rollup_stale_month',
+                'ordering': ['company_id', 'year', 'month'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='deptrollupstalemonth',
+            constraint=models.UniqueConstraint(condition=models.Q(company__isnull=False), fields=('company', 'year', 'month'), name='unique_dept_rollup_stale_per_company'),
+        ),
+        migrations.AddConstraint(
+            model_name='deptrollupstalemonth',
+            constraint=models.UniqueConstraint(condition=models.Q(company__isnull=True), fields=('year', 'month'), name='unique_dept_rollup_stale_global'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Per-company data version for change-driven Google Sheet sync
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.functions.comparison
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0030_deptmonthrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompanyDataVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('changed_at', models.DateTimeField(blank=True, null=True)),
+                ('pending_since', models.DateTimeField(blank=True, help_text='First change not yet pushed to the sheet', null=True)),
+                ('synced_version', models.PositiveBigIntegerField(default=0)),
+                ('synced_at', models.DateTimeField(blank=True, null=True)),
+                ('company', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='data_versions', to='core.company')),
+            ],
+            options={
+                'db_table': 'company_data_versions',
+                'ordering': ['company_id'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='companydataversion',
+            constraint=models.UniqueConstraint(django.db.models.functions.comparison.Coalesce('company', models.Value(0)), name='unique_data_version_company'),
+        ),
+    ]
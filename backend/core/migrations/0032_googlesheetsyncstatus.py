@@ -0,0 +1,37 @@
+# Google Sheet sync progress + coalesced follow-up request per company (single-flight sync)
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.functions.comparison
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0031_companydataversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GoogleSheetSyncStatus',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phase', models.CharField(blank=True, max_length=100)),
+                ('host', models.CharField(blank=True, max_length=255)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('last_result', models.JSONField(blank=True, default=dict)),
+                ('followup_requested', models.BooleanField(default=False)),
+                ('followup_force_full', models.BooleanField(default=False)),
+                ('company', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='sheet_sync_statuses', to='core.company')),
+            ],
+            options={
+                'db_table': 'google_sheet_sync_status',
+                'ordering': ['company_id'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='googlesheetsyncstatus',
+            constraint=models.UniqueConstraint(django.db.models.functions.comparison.Coalesce('company', models.Value(0)), name='unique_sheet_sync_status_company'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Per-sheet progress of the running Google Sheet sync (polled by the settings page)
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0032_googlesheetsyncstatus'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='googlesheetsyncstatus',
+            name='sheets',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -3,6 +3,7 @@ HR Employee & Attendance Management System - Database Models.
 All tables linked by emp_code (unique employee identifier).
 """
 from django.db import models
+from django.db.models.functions import Coalesce
 from decimal import Decimal
 
 
@@ -312,6 +313,26 @@ class PerformanceReward(models.Model):
         return f"{self.emp_code} {self.entry_type} {self.trigger_reason}"
 
 
+class EmployeeStreakState(models.Model):
+    """Running present/absent streak per employee, folded in as attendance changes. Reward engine only scans employees whose streak hit a threshold recently."""
+    emp_code = models.CharField(max_length=50, unique=True)
+    present_streak = models.PositiveIntegerField(default=0)
+    absent_streak = models.PositiveIntegerField(default=0, help_text='Consecutive absent working days (holidays break it)')
+    last_evaluated = models.DateField(null=True, blank=True, help_text='Last attendance date folded into the streaks')
+    present_hit_date = models.DateField(null=True, blank=True, help_text='Last date present_streak was >= streak_days')
+    absent_hit_date = models.DateField(null=True, blank=True, help_text='Last date absent_streak was >= absent_days')
+    streak_days = models.PositiveSmallIntegerField(default=0, help_text='streak_days threshold used for present_hit_date')
+    absent_days = models.PositiveSmallIntegerField(default=0, help_text='absent_streak_days threshold used for absent_hit_date')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'employee_streak_state'
+        ordering = ['emp_code']
+
+    def __str__(self):
+        return f"{self.emp_code} P{self.present_streak} A{self.absent_streak} @ {self.last_evaluated}"
+
+
 class Holiday(models.Model):
     """Yearly public holidays - so absentee logic doesn't flag holidays."""
     date = models.DateField(unique=True)
@@ -429,6 +450,229 @@ class CompanySetting(models.Model):
         return f"{self.company_id or 'global'}:{self.key}={self.value}"
 
 
+class GoogleSheetSyncState(models.Model):
+    """Last values pushed to one Google Sheet tab (hash of whole sheet + per row block), so sync can skip unchanged sheets/rows."""
+    company = models.ForeignKey(Company, null=True, blank=True, on_delete=models.CASCADE, related_name='sheet_sync_states')
+    spreadsheet_id = models.CharField(max_length=255)
+    sheet_title = models.CharField(max_length=255)
+    content_hash = models.CharField(max_length=64)
+    block_hashes = models.JSONField(default=list, blank=True)
+    num_rows = models.PositiveIntegerField(default=0)
+    num_cols = models.PositiveIntegerField(default=0)
+    pushed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'google_sheet_sync_state'
+        ordering = ['company_id', 'spreadsheet_id', 'sheet_title']
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'spreadsheet_id', 'sheet_title'], condition=models.Q(company__isnull=False), name='unique_sheet_sync_state_per_company'),
+            models.UniqueConstraint(fields=['spreadsheet_id', 'sheet_title'], condition=models.Q(company__isnull=True), name='unique_sheet_sync_state_global'),
+        ]
+
+    def __str__(self):
+        return f"{self.company_id or 'global'}:{self.sheet_title} {self.content_hash[:8]}"
+
+
+class GoogleSheetSyncStatus(models.Model):
+    """
+    Progress of the Google Sheet sync per company (company null = global sheet). Whether a sync is running
+    is the advisory lock 'sheet_sync:<company>' (core.job_lock); this row carries its phase and a
+    coalesced follow-up request from triggers that arrived while it ran.
+    """
+    company = models.ForeignKey(Company, null=True, blank=True, on_delete=models.CASCADE, related_name='sheet_sync_statuses')
+    phase = models.CharField(max_length=100, blank=True)
+    sheets = models.JSONField(default=dict, blank=True)  # sheet / build step -> building, built, unchanged, pushing, pushed
+    host = models.CharField(max_length=255, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_result = models.JSONField(default=dict, blank=True)
+    followup_requested = models.BooleanField(default=False)
+    followup_force_full = models.BooleanField(default=False)
+
+    class Meta:
+        db_table = 'google_sheet_sync_status'
+        ordering = ['company_id']
+        constraints = [
+            models.UniqueConstraint(Coalesce('company', models.Value(0)), name='unique_sheet_sync_status_company'),
+        ]
+
+    def __str__(self):
+        return f"{self.company_id or 'global'}: {self.phase or 'idle'}"
+
+
+class CompanyDataVersion(models.Model):
+    """
+    Change counter per company for change-driven Google Sheet sync (core.data_version).
+    Bumped by writes to attendance, employees, salary, advances, penalties and OT bonus; company null =
+    employees without a company and unknown emp codes. synced_version = version last pushed to the sheet.
+    """
+    company = models.ForeignKey(Company, null=True, blank=True, on_delete=models.CASCADE, related_name='data_versions')
+    version = models.PositiveBigIntegerField(default=0)
+    changed_at = models.DateTimeField(null=True, blank=True)
+    pending_since = models.DateTimeField(null=True, blank=True, help_text='First change not yet pushed to the sheet')
+    synced_version = models.PositiveBigIntegerField(default=0)
+    synced_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'company_data_versions'
+        ordering = ['company_id']
+        constraints = [
+            # One row per company and one for company null
+            models.UniqueConstraint(Coalesce('company', models.Value(0)), name='unique_data_version_company'),
+        ]
+
+    def __str__(self):
+        return f"{self.company_id or 'global'} v{self.version} (synced v{self.synced_version})"
+
+
+class ExportJob(models.Model):
+    """
+    Background export (core.export_jobs): one of the export endpoints run in a worker, its file kept until
+    expires_at and downloaded by token. dedupe_key (scope + parameters + data version) is unique among
+    active jobs, so identical requests share one job.
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'), (STATUS_RUNNING, 'Running'), (STATUS_DONE, 'Done'), (STATUS_FAILED, 'Failed'),
+    ]
+
+    token = models.CharField(max_length=64, unique=True)
+    admin = models.ForeignKey(Admin, null=True, blank=True, on_delete=models.SET_NULL, related_name='export_jobs')
+    company = models.ForeignKey(Company, null=True, blank=True, on_delete=models.CASCADE, related_name='export_jobs')
+    kind = models.CharField(max_length=32)  # payroll, export, salary_history
+    params = models.JSONField(default=dict, blank=True)
+    dedupe_key = models.CharField(max_length=64, db_index=True)
+    active = models.BooleanField(default=True)  # False once failed or expired (then no longer deduplicated onto)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    phase = models.CharField(max_length=100, blank=True)
+    progress = models.PositiveSmallIntegerField(default=0)  # percent
+    message = models.TextField(blank=True)
+    file_path = models.CharField(max_length=500, blank=True)
+    filename = models.CharField(max_length=255, blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    size = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        db_table = 'export_job'
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['dedupe_key'], condition=models.Q(active=True), name='unique_active_export_job'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.status} {self.progress}% ({self.token[:8]})"
+
+
+class RewardBackfillJob(models.Model):
+    """
+    Reward engine backfill started from the API (core.reward_backfill): runs on a background thread,
+    polled by token. emp_codes is the requesting admin's scope (null = every employee of the company).
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'), (STATUS_RUNNING, 'Running'), (STATUS_DONE, 'Done'), (STATUS_FAILED, 'Failed'),
+    ]
+
+    token = models.CharField(max_length=64, unique=True)
+    admin = models.ForeignKey(Admin, null=True, blank=True, on_delete=models.SET_NULL, related_name='reward_backfill_jobs')
+    company = models.ForeignKey(Company, null=True, blank=True, on_delete=models.CASCADE, related_name='reward_backfill_jobs')
+    date_from = models.DateField()
+    date_to = models.DateField()
+    emp_codes = models.JSONField(null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    progress = models.PositiveSmallIntegerField(default=0)  # percent
+    result = models.JSONField(default=dict, blank=True)  # streak / overtime / absentee / chunks / errors
+    message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'reward_backfill_job'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.date_from}..{self.date_to} {self.status} {self.progress}% ({self.token[:8]})"
+
+
+class DeptMonthRollup(models.Model):
+    """
+    Per (company, department, year, month) totals for the plant reports: man hours, present/absent
+    counts, day-based salary (rate × hours, Fixed excluded) and Salary.bonus hours / Rs.
+    Department and rates are the employee's current ones. Rebuilt per month by core.dept_rollup.
+    """
+    company = models.ForeignKey(Company, null=True, blank=True, on_delete=models.CASCADE, related_name='dept_month_rollups')
+    dept_name = models.CharField(max_length=255, blank=True)
+    year = models.PositiveIntegerField()
+    month = models.PositiveSmallIntegerField()
+    man_hours = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0'))
+    present_count = models.PositiveIntegerField(default=0)
+    absent_count = models.PositiveIntegerField(default=0)
+    salary = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0'))
+    bonus_hours = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0'))
+    bonus_amount = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0'))
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'dept_month_rollup'
+        ordering = ['company_id', 'year', 'month', 'dept_name']
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'dept_name', 'year', 'month'], condition=models.Q(company__isnull=False), name='unique_dept_month_rollup_per_company'),
+            models.UniqueConstraint(fields=['dept_name', 'year', 'month'], condition=models.Q(company__isnull=True), name='unique_dept_month_rollup_global'),
+        ]
+
+    def __str__(self):
+        return f"{self.company_id or 'global'}:{self.dept_name or 'No Dept'} {self.year}-{self.month:02d}"
+
+
+class DeptRollupStaleMonth(models.Model):
+    """A (company, year, month) whose DeptMonthRollup rows must be rebuilt (attendance / bonus / employee changed)."""
+    company = models.ForeignKey(Company, null=True, blank=True, on_delete=models.CASCADE, related_name='dept_rollup_stale_months')
+    year = models.PositiveIntegerField()
+    month = models.PositiveSmallIntegerField()
+    marked_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'dept_rollup_stale_month'
+        ordering = ['company_id', 'year', 'month']
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'year', 'month'], condition=models.Q(company__isnull=False), name='unique_dept_rollup_stale_per_company'),
+            models.UniqueConstraint(fields=['year', 'month'], condition=models.Q(company__isnull=True), name='unique_dept_rollup_stale_global'),
+        ]
+
+    def __str__(self):
+        return f"{self.company_id or 'global'} {self.year}-{self.month:02d}"
+
+
+class ScheduledJobRun(models.Model):
+    """Last-run bookkeeping for background scheduler jobs (today sync, auto-absent, etc.). Shared by all processes."""
+    name = models.CharField(max_length=100, unique=True)
+    last_started_at = models.DateTimeField(null=True, blank=True)
+    last_finished_at = models.DateTimeField(null=True, blank=True)
+    last_success_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    last_result = models.CharField(max_length=500, blank=True)
+    last_host = models.CharField(max_length=255, blank=True, help_text='host:pid of the leader that ran it')
+    run_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'scheduled_job_runs'
+        ordering = ['name']
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_success_at}"
+
+
 class PlantReportRecipient(models.Model):
     """Recipients for daily Plant Report (Previous day) email."""
     """Email addresses to receive the daily Plant Report (Previous day) at the scheduled time."""
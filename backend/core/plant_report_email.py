@@ -2,9 +2,15 @@
 Daily Plant Report (Previous day) email: send Excel + image to recipients at configured time.
 Recipients and send time are stored in DB (PlantReportRecipient, SystemSetting).
 Attachment: Plant Report sheet (Excel) + PNG image for easy viewing on mobile.
+The report data is built once per scope and day (and data version) and kept in memory
+(previous_day_report); the rendered PNG / XLSX are stored in core.export_cache, so "send now",
+the daily email and the download endpoint reuse them (plant_report_file). Fonts are loaded once per process.
 """
 import logging
-from datetime import date
+import os
+import threading
+from datetime import date, timedelta
+from functools import lru_cache
 from io import BytesIO
 
 from django.core.mail import EmailMultiAlternatives, get_connection
@@ -17,13 +23,32 @@ from openpyxl.formatting.rule import ColorScaleRule
 
 from .email_smtp import get_active_smtp_configs
 from .google_sheets_sync import _build_sheet3_data
-from .models import PlantReportRecipient, SystemSetting
+from .models import Employee, PlantReportRecipient, SystemSetting
 
 logger = logging.getLogger(__name__)
 
 # Column indices for color scale (0-based): 7=Avg Salary/hr, 8=Absenteeism %, 10=OT bonus hrs, 11=OT bonus rs
 _COLOR_SCALE_COLS = (7, 8, 10, 11)
 
+# Image layout: consistent column widths so header names are visible
+CELL_H = 26
+HEADER_H = 32
+COL_WIDTHS = (40, 110, 88, 80, 80, 80, 88, 88, 88, 88, 88, 88, 88)  # wider for header names; more columns: 88
+FONT_PATHS = (
+    'arial.ttf',
+    os.path.join(os.environ.get('WINDIR', 'C:\\Windows'), 'Fonts', 'arial.ttf'),
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+)
+FORMATS = {
+    'xlsx': ('.xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'png': ('.png', 'image/png'),
+}
+
+_report_lock = threading.Lock()
+_reports = {}  # company_id -> (key, report); only the current day / data version is kept
+_fonts_lock = threading.Lock()
+_fonts = None
+
 
 def _value_to_float(val):
     """Convert cell value to float for color scale; return None if not numeric."""
@@ -51,69 +76,19 @@ def _color_scale_rgb(val, lo, hi):
         return (255, 245 - int(120 * u), 220 - int(150 * u))  # pale yellow to soft coral
 
 
-def build_plant_report_previous_day_image():
-    """
-    Build Plant Report (Previous day) as a PNG image – same data as Google Sheet.
-    Green->yellow->red color scale on Average Salary/hr, Absenteeism %, OT bonus (hrs), OT bonus (rs).
-    Returns BytesIO (PNG).
-    """
-    try:
-        from PIL import Image, ImageDraw, ImageFont
-    except ImportError:
-        logger.warning('Pillow not installed; cannot generate Plant Report image')
+# ---------- Report data (cached per scope / day / data version) ----------
+def _scope_emp_codes(company_id):
+    if company_id is None:
         return None
+    return list(Employee.objects.filter(company_id=company_id).values_list('emp_code', flat=True))
 
-    rows = _build_sheet3_data()
-    if not rows:
-        return None
 
-    # Layout: consistent column widths so header names are visible
-    cell_h = 26
-    header_h = 32
-    col_widths = [40, 110, 88, 80, 80, 80, 88, 88, 88, 88, 88, 88, 88]  # wider for header names
+def _summarize(rows):
+    """Numbers the renderers and the email share: per-column min/max for the color scale, our amount."""
     ncols = max(len(r) for r in rows) if rows else 0
-    while len(col_widths) < ncols:
-        col_widths.append(88)
-    col_widths = col_widths[:ncols]
-    total_w = sum(col_widths) + (ncols + 1) * 1
-    total_h = header_h + (len(rows) - 1) * cell_h + (len(rows) + 1) * 1
-
-    img = Image.new('RGB', (total_w, total_h), (255, 255, 255))
-    draw = ImageDraw.Draw(img)
-
-    import os
-    _font_paths = [
-        'arial.ttf',
-        os.path.join(os.environ.get('WINDIR', 'C:\\Windows'), 'Fonts', 'arial.ttf'),
-        '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
-    ]
-    font = font_bold = font_header = None
-    for path in _font_paths:
-        try:
-            font = ImageFont.truetype(path, 11)
-            font_bold = font
-            font_header = ImageFont.truetype(path, 9)  # smaller so column names fit
-            try:
-                font_bold = ImageFont.truetype(
-                    path.replace('arial.ttf', 'arialbd.ttf').replace('DejaVuSans.ttf', 'DejaVuSans-Bold.ttf'), 11
-                )
-                font_header = ImageFont.truetype(
-                    path.replace('arial.ttf', 'arialbd.ttf').replace('DejaVuSans.ttf', 'DejaVuSans-Bold.ttf'), 9
-                )
-            except (OSError, IOError):
-                pass
-            break
-        except (OSError, IOError):
-            continue
-    if font is None:
-        font = font_bold = font_header = ImageFont.load_default()
-
-    # Compute min/max per column for color scale (data rows only, numeric)
     col_mins = [None] * ncols
     col_maxs = [None] * ncols
-    for ri, row in enumerate(rows):
-        if ri == 0:
-            continue
+    for row in rows[1:]:
         for ci in _COLOR_SCALE_COLS:
             if ci < len(row):
                 v = _value_to_float(row[ci])
@@ -122,19 +97,108 @@ def build_plant_report_previous_day_image():
                         col_mins[ci] = v
                     if col_maxs[ci] is None or v > col_maxs[ci]:
                         col_maxs[ci] = v
+    # Our amount = Total Salary + OT bonus (rs) from the total row
+    our_amount = None
+    if len(rows) >= 2:
+        total_row = rows[-1]
+        n_dates = max(0, len(rows[0]) - 11)
+        total_salary = _value_to_float(total_row[3 + n_dates + 5])
+        ot_bonus_rs = _value_to_float(total_row[3 + n_dates + 7])
+        our_amount = (total_salary or 0) + (ot_bonus_rs or 0)
+    return {'ncols': ncols, 'col_mins': col_mins, 'col_maxs': col_maxs, 'our_amount': our_amount}
+
+
+def previous_day_report(company_id=None):
+    """
+    Plant Report (Previous day) data for a company (None = all companies, as the daily email):
+    {'date', 'version', 'rows' (same as the Google Sheet tab), 'ncols', 'col_mins', 'col_maxs', 'our_amount'}.
+    Built once per day and data version, then served from memory.
+    """
+    from .data_version import current_version
+    report_date = timezone.localdate() - timedelta(days=1)
+    key = (report_date, current_version(company_id))
+    with _report_lock:
+        cached = _reports.get(company_id)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    rows = _build_sheet3_data(allowed_emp_codes=_scope_emp_codes(company_id))
+    report = {'date': report_date, 'version': key[1], 'rows': rows, **_summarize(rows)}
+    with _report_lock:
+        _reports[company_id] = (key, report)
+    return report
+
+
+# ---------- Renderers ----------
+def _load_fonts():
+    """(font, font_bold, font_header), loaded once per process."""
+    global _fonts
+    with _fonts_lock:
+        if _fonts is not None:
+            return _fonts
+        from PIL import ImageFont
+        font = font_bold = font_header = None
+        for path in FONT_PATHS:
+            try:
+                font = ImageFont.truetype(path, 11)
+                font_bold = font
+                font_header = ImageFont.truetype(path, 9)  # smaller so column names fit
+                try:
+                    font_bold = ImageFont.truetype(
+                        path.replace('arial.ttf', 'arialbd.ttf').replace('DejaVuSans.ttf', 'DejaVuSans-Bold.ttf'), 11
+                    )
+                    font_header = ImageFont.truetype(
+                        path.replace('arial.ttf', 'arialbd.ttf').replace('DejaVuSans.ttf', 'DejaVuSans-Bold.ttf'), 9
+                    )
+                except (OSError, IOError):
+                    pass
+                break
+            except (OSError, IOError):
+                continue
+        if font is None:
+            font = font_bold = font_header = ImageFont.load_default()
+        _fonts = (font, font_bold, font_header)
+        return _fonts
 
-    def draw_cell(r, c, text, fill=(255, 255, 255), font_=font, bold=False, max_chars=14):
-        x0 = 1 + sum(col_widths[:c]) + c
-        y0 = 1 if r == 0 else (1 + header_h + 1 + (r - 1) * (cell_h + 1))
-        w = col_widths[c] if c < len(col_widths) else 88
-        h = header_h if r == 0 else cell_h
+
+@lru_cache(maxsize=4096)
+def _text_size(font, text):
+    """(width, height) of text in font; dept names and numbers repeat across cells and days."""
+    bbox = font.getbbox(text)
+    return bbox[2] - bbox[0], bbox[3] - bbox[1]
+
+
+def render_plant_report_image(report):
+    """PNG (BytesIO) of a previous_day_report(); None without Pillow or data."""
+    try:
+        from PIL import Image, ImageDraw
+    except ImportError:
+        logger.warning('Pillow not installed; cannot generate Plant Report image')
+        return None
+
+    rows = report['rows']
+    if not rows:
+        return None
+    font, font_bold, font_header = _load_fonts()
+    ncols = report['ncols']
+    col_widths = (list(COL_WIDTHS) + [88] * max(0, ncols - len(COL_WIDTHS)))[:ncols]
+    col_x = [1 + sum(col_widths[:c]) + c for c in range(ncols)]
+    total_w = sum(col_widths) + (ncols + 1) * 1
+    total_h = HEADER_H + (len(rows) - 1) * CELL_H + (len(rows) + 1) * 1
+    col_mins, col_maxs = report['col_mins'], report['col_maxs']
+
+    img = Image.new('RGB', (total_w, total_h), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+
+    def draw_cell(r, c, text, fill=(255, 255, 255), font_=font, max_chars=14):
+        x0 = col_x[c]
+        y0 = 1 if r == 0 else (1 + HEADER_H + 1 + (r - 1) * (CELL_H + 1))
+        w = col_widths[c]
+        h = HEADER_H if r == 0 else CELL_H
         draw.rectangle([x0, y0, x0 + w, y0 + h], fill=fill, outline=(180, 180, 180))
         tstr = str(text)
         s = tstr[:max_chars] + ('…' if len(tstr) > max_chars else '')
         # center text in cell (simple)
-        bbox = draw.textbbox((0, 0), s, font=font_)
-        tw = bbox[2] - bbox[0]
-        th = bbox[3] - bbox[1]
+        tw, th = _text_size(font_, s)
         tx = x0 + max(0, (w - tw) // 2)
         ty = y0 + max(0, (h - th) // 2)
         text_color = (255, 255, 255) if (fill[0] < 100 and fill[1] < 100) else (0, 0, 0)
@@ -176,6 +240,15 @@ def build_plant_report_previous_day_image():
     return buf
 
 
+def build_plant_report_previous_day_image(company_id=None):
+    """
+    Build Plant Report (Previous day) as a PNG image – same data as Google Sheet.
+    Green->yellow->red color scale on Average Salary/hr, Absenteeism %, OT bonus (hrs), OT bonus (rs).
+    Returns BytesIO (PNG), or None.
+    """
+    return render_plant_report_image(previous_day_report(company_id))
+
+
 def get_plant_report_send_time():
     """Return (hour, minute) 24h from SystemSetting plant_report_send_time (default 6:00)."""
     try:
@@ -227,14 +300,14 @@ def get_plant_report_maam_amount():
         return None
 
 
-def build_plant_report_previous_day_excel_only():
+def render_plant_report_excel(report):
     """
-    Build an Excel file with only the Plant Report (Previous day) sheet.
+    Excel file with only the Plant Report (Previous day) sheet of a previous_day_report().
     Same logic and columns as the Google Sheet tab. Starts at row 2, column 2 (B2).
     Color scale (green -> yellow -> red) on Average Salary/hr, Absenteeism %, OT bonus (hrs), OT bonus (rs).
     Returns BytesIO.
     """
-    rows = _build_sheet3_data()
+    rows = report['rows']
     wb = Workbook()
     ws = wb.active
     ws.title = 'Plant Report (Previous day)'
@@ -272,6 +345,33 @@ def build_plant_report_previous_day_excel_only():
     return buf
 
 
+def build_plant_report_previous_day_excel_only(company_id=None):
+    """Excel file (BytesIO) with only the Plant Report (Previous day) sheet; see render_plant_report_excel."""
+    return render_plant_report_excel(previous_day_report(company_id))
+
+
+def plant_report_file(fmt, company_id=None):
+    """
+    (file, hit) for the Plant Report (Previous day) as 'xlsx' or 'png', from core.export_cache when the
+    same day and data were rendered before (by the email, send now or a download); file is None when
+    the image cannot be made (no Pillow / no data). The caller closes the file.
+    """
+    from . import export_cache
+    suffix, _ = FORMATS[fmt]
+    report = previous_day_report(company_id)
+    key = export_cache.make_key(
+        'plant_report_previous_day', {'date': report['date'], 'format': fmt},
+        company_id=company_id, allowed_emp_codes=None,
+    )
+    cached = export_cache.get(key, suffix)
+    if cached is not None:
+        return cached, True
+    buf = render_plant_report_excel(report) if fmt == 'xlsx' else render_plant_report_image(report)
+    if buf is None:
+        return None, False
+    return export_cache.put(key, suffix, buf), False
+
+
 def send_plant_report_email():
     """
     Build Plant Report (Previous day) Excel (only that sheet, same as Google Sheet) and email to all active recipients.
@@ -288,26 +388,23 @@ def send_plant_report_email():
         return {'success': False, 'message': 'SMTP not configured. Add active config(s) in System Owner → Settings.', 'sent_count': 0}
 
     try:
-        buf = build_plant_report_previous_day_excel_only()
-        excel_bytes = buf.read()
+        report = previous_day_report()
+        buf, _ = plant_report_file('xlsx')
+        with buf:
+            excel_bytes = buf.read()
     except Exception as e:
         logger.exception('Failed to generate Plant Report Excel')
         return {'success': False, 'message': str(e), 'sent_count': 0}
 
-    from_date = (timezone.localdate() - timezone.timedelta(days=1)).strftime('%d-%m-%Y')
+    from_date = report['date'].strftime('%d-%m-%Y')
     subject = f'Plant Report (Previous day) - {from_date}'
 
     # Our amount = Total Salary + OT bonus (rs) from Plant Report total row (previous day). Difference = ma'am amount - our amount.
     diff_block_text = ''
     diff_block_html = ''
     try:
-        rows = _build_sheet3_data()
-        if rows and len(rows) >= 2:
-            total_row = rows[-1]
-            n_dates = max(0, len(rows[0]) - 11)
-            total_salary = _value_to_float(total_row[3 + n_dates + 5])
-            ot_bonus_rs = _value_to_float(total_row[3 + n_dates + 7])
-            our_amount = (total_salary or 0) + (ot_bonus_rs or 0)
+        our_amount = report['our_amount']
+        if our_amount is not None:
             maam = get_plant_report_maam_amount()
             if maam is not None:
                 diff = round(maam - our_amount, 2)
@@ -324,9 +421,14 @@ def send_plant_report_email():
 
     # Build PNG image for mobile-friendly view
     img_bytes = None
-    img_buf = build_plant_report_previous_day_image()
+    try:
+        img_buf, _ = plant_report_file('png')
+    except Exception:
+        logger.exception('Failed to generate Plant Report image')
+        img_buf = None
     if img_buf:
-        img_bytes = img_buf.read()
+        with img_buf:
+            img_bytes = img_buf.read()
 
     filename_xlsx = f'Plant_Report_{from_date.replace("-", "_")}.xlsx'
     text_body = (
@@ -0,0 +1,151 @@
+"""
+Shared in-memory dataset for payroll / plant report builders.
+One ReportDataset loads, for a set of employees and a date window, everything the Google Sheet
+tabs, the Excel export and the plant report need with one query per table: the employee table,
+attendance indexed by date x employee (hours, status, punches), Salary bonus/base per month,
+advance and penalty totals per month and shift OT bonus hours per date.
+Builders slice it in memory instead of querying per sheet / per month.
+"""
+from bisect import bisect_left, bisect_right
+from calendar import monthrange
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.db.models import Sum
+
+from .models import Employee, Attendance, Salary, SalaryAdvance, Penalty, ShiftOvertimeBonus
+
+
+def months_in_range(date_from, date_to):
+    """Sorted (month, year) pairs touched by [date_from, date_to]; open ends default to 2000-01-01 / 2100-12-31."""
+    start = date_from or date(2000, 1, 1)
+    end = date_to or date(2100, 12, 31)
+    months = []
+    d = start.replace(day=1)
+    while d <= end:
+        months.append((d.month, d.year))
+        _, last = monthrange(d.year, d.month)
+        d = d.replace(day=last) + timedelta(days=1)
+    return months
+
+
+def _month_q_bounds(date_from, date_to):
+    """(year*100+month) bounds for filtering month/year tables to the window, None = open."""
+    lo = date_from.year * 100 + date_from.month if date_from else None
+    hi = date_to.year * 100 + date_to.month if date_to else None
+    return lo, hi
+
+
+class ReportDataset:
+    """
+    allowed_emp_codes: None = all employees (attendance of unknown emp codes included, as before).
+    date_from / date_to: attendance and OT bonus window; month tables cover the months it touches.
+    emp_code: restrict to one employee (single-employee export).
+    """
+
+    def __init__(self, allowed_emp_codes=None, date_from=None, date_to=None, emp_code=None):
+        self.allowed_emp_codes = allowed_emp_codes
+        self.date_from = date_from
+        self.date_to = date_to
+
+        emp_qs = Employee.objects.all()
+        codes = None
+        if emp_code:
+            codes = [emp_code]
+        elif allowed_emp_codes is not None:
+            codes = list(allowed_emp_codes)
+        if codes is not None:
+            emp_qs = emp_qs.filter(emp_code__in=codes) if codes else emp_qs.none()
+        self.employees = list(emp_qs.order_by('dept_name', 'emp_code'))
+        self.emp_by_code = {e.emp_code: e for e in self.employees}
+
+        def scoped(qs):
+            if codes is not None:
+                return qs.filter(emp_code__in=codes) if codes else qs.none()
+            return qs
+
+        def dated(qs, field='date'):
+            if date_from:
+                qs = qs.filter(**{f'{field}__gte': date_from})
+            if date_to:
+                qs = qs.filter(**{f'{field}__lte': date_to})
+            return qs
+
+        def monthly(qs):
+            lo, hi = _month_q_bounds(date_from, date_to)
+            if lo is not None:
+                qs = qs.filter(year__gte=lo // 100).exclude(year=lo // 100, month__lt=lo % 100)
+            if hi is not None:
+                qs = qs.filter(year__lte=hi // 100).exclude(year=hi // 100, month__gt=hi % 100)
+            return qs
+
+        # Attendance indexed by date (sorted self.dates); each date holds that day's employee rows
+        self._att_by_date = defaultdict(list)
+        att = dated(scoped(Attendance.objects.all())).values_list(
+            'emp_code', 'date', 'total_working_hours', 'status', 'punch_in', 'punch_out',
+        )
+        for emp, d, hrs, status, pin, pout in att.iterator(chunk_size=5000):
+            self._att_by_date[d].append({
+                'emp_code': emp, 'date': d, 'total_working_hours': hrs, 'status': status,
+                'punch_in': pin, 'punch_out': pout,
+            })
+        self.dates = sorted(self._att_by_date)
+
+        # Salary: (emp_code, month, year) -> (bonus hrs, base salary); later rows win like the old per-month loops
+        self.salary = {}
+        for emp, m, y, bonus, base in monthly(scoped(Salary.objects.all())).values_list(
+            'emp_code', 'month', 'year', 'bonus', 'base_salary',
+        ):
+            self.salary[(emp, m, y)] = (float(bonus or 0), float(base or 0))
+
+        self._advance = {}
+        for r in monthly(scoped(SalaryAdvance.objects.all())).values('emp_code', 'month', 'year').annotate(total=Sum('amount')):
+            self._advance[(r['emp_code'], r['month'], r['year'])] = float(r['total'] or 0)
+        self._penalty = {}
+        for r in monthly(scoped(Penalty.objects.all())).values('emp_code', 'month', 'year').annotate(total=Sum('deduction_amount')):
+            self._penalty[(r['emp_code'], r['month'], r['year'])] = float(r['total'] or 0)
+
+        # Shift OT bonus hours: date -> {emp_code: hours}
+        self.ot_bonus = defaultdict(dict)
+        for emp, d, hrs in dated(scoped(ShiftOvertimeBonus.objects.all())).values_list('emp_code', 'date', 'bonus_hours'):
+            self.ot_bonus[d][emp] = self.ot_bonus[d].get(emp, 0.0) + float(hrs or 0)
+
+    # ---------- Slices ----------
+    def attendance(self, date_from=None, date_to=None):
+        """Attendance row dicts (emp_code, date, total_working_hours, status, punch_in, punch_out) in [date_from, date_to]."""
+        lo = bisect_left(self.dates, date_from) if date_from else 0
+        hi = bisect_right(self.dates, date_to) if date_to else len(self.dates)
+        return [r for d in self.dates[lo:hi] for r in self._att_by_date[d]]
+
+    def salary_type(self, emp_code):
+        emp = self.emp_by_code.get(emp_code)
+        return ((emp.salary_type if emp else None) or 'Monthly').strip() or 'Monthly'
+
+    def _by_emp(self, table, months):
+        wanted = set(months)
+        out = defaultdict(float)
+        for (emp, m, y), amount in table.items():
+            if (m, y) in wanted:
+                out[emp] += amount
+        return dict(out)
+
+    def advance_by_emp(self, months):
+        """emp_code -> total advance for the given (month, year) pairs (same as _get_advance_by_emp)."""
+        return self._by_emp(self._advance, months)
+
+    def penalty_by_emp(self, months):
+        """emp_code -> total penalty deduction for the given (month, year) pairs."""
+        return self._by_emp(self._penalty, months)
+
+    def bonus_months(self):
+        """(year, month) pairs that have any Salary.bonus > 0."""
+        return {(y, m) for (_, m, y), (bonus, _) in self.salary.items() if bonus > 0}
+
+    def ot_bonus_hours_by_emp(self, date_from, date_to):
+        """emp_code -> ShiftOvertimeBonus hours in [date_from, date_to]."""
+        out = defaultdict(float)
+        for d, by_emp in self.ot_bonus.items():
+            if date_from <= d <= date_to:
+                for emp, hrs in by_emp.items():
+                    out[emp] += hrs
+        return dict(out)
@@ -0,0 +1,301 @@
+"""
+Historical reward engine backfill: evaluate streak / weekly overtime / absentee rules for
+every day in a date range, for one or all companies.
+Work is split into (company, month) chunks run in a process pool. Each chunk loads one
+attendance window (the month plus the longest look-back) and evaluates its days in memory.
+Rewards get created_at on the evaluated day, and the same (emp, reason, day) dedupe as the
+daily run applies, so re-running a backfill or the daily engine never duplicates entries.
+The process pool is for the management command; the API queues a RewardBackfillJob (submit_job)
+that runs the same chunks one after another on a background thread, scoped to the admin's employees.
+"""
+import logging
+import os
+import secrets
+import threading
+from bisect import bisect_left, bisect_right
+from calendar import monthrange
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import connection, connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = 8
+STALE_JOB_SECONDS = 6 * 3600  # queued / running longer than this: worker gone (restart), mark failed
+
+_lock = threading.Lock()
+_pool = None
+
+
+def _month_chunks(start, end):
+    """Yield (chunk_start, chunk_end) per calendar month, clipped to [start, end]."""
+    cur = start
+    while cur <= end:
+        last = date(cur.year, cur.month, monthrange(cur.year, cur.month)[1])
+        yield cur, min(last, end)
+        cur = last + timedelta(days=1)
+
+
+def _day_created_at(d):
+    """created_at value that falls on day d (noon, so the __date lookup is stable)."""
+    return timezone.make_aware(datetime.combine(d, time(12, 0)), timezone.get_default_timezone())
+
+
+def _backfill_chunk(company_id, start, end, emp_codes=None, unassigned=False):
+    """
+    Evaluate all three rules for each day in [start, end] for one engine pass (see reward_engine.reward_passes):
+    a company, employees without a company (unassigned), or everyone (company_id None). Only emp_codes when given.
+    Returns counts.
+    """
+    from .models import Attendance, Employee, PerformanceReward
+    from .reward_engine import _get_setting, _has_present_streak, _has_absent_streak
+
+    counts = {'streak': 0, 'overtime': 0, 'absentee': 0}
+    if company_id is not None:
+        employees = Employee.objects.filter(company_id=company_id)
+    elif unassigned:
+        employees = Employee.objects.filter(company__isnull=True)
+    else:
+        employees = Employee.objects.all()
+    if emp_codes is not None:
+        employees = employees.filter(emp_code__in=emp_codes)
+    emp_codes = list(employees.values_list('emp_code', flat=True))
+    if not emp_codes:
+        return counts
+
+    streak_days = int(_get_setting('streak_days', '4', company_id=company_id))
+    threshold = Decimal(str(float(_get_setting('weekly_overtime_threshold_hours', '6', company_id=company_id))))
+    absent_days = int(_get_setting('absent_streak_days', '3', company_id=company_id))
+    streak_reason = f'{streak_days} Day Streak'
+    streak_metric = f'{streak_days} consecutive present days'
+    absent_reason = f'{absent_days} Days Absent'
+
+    # One attendance window for the whole chunk: longest look-back of the three rules
+    lookback = max(streak_days + 5, absent_days + 10, 6)
+    present_by_emp = {}
+    absent_by_emp = {}
+    ot_by_emp = {}
+    att = Attendance.objects.filter(
+        emp_code__in=emp_codes, date__gte=start - timedelta(days=lookback), date__lte=end,
+    ).values_list('emp_code', 'date', 'status', 'over_time')
+    for emp_code, d, status, over_time in att.iterator(chunk_size=5000):
+        if status == 'Present':
+            present_by_emp.setdefault(emp_code, set()).add(d)
+        elif status == 'Absent':
+            absent_by_emp.setdefault(emp_code, set()).add(d)
+        ot_by_emp.setdefault(emp_code, {})
+        ot_by_emp[emp_code][d] = ot_by_emp[emp_code].get(d, Decimal('0')) + (over_time or Decimal('0'))
+    present_by_emp = {k: sorted(v) for k, v in present_by_emp.items()}
+    absent_by_emp = {k: sorted(v) for k, v in absent_by_emp.items()}
+
+    # Existing entries in the chunk, keyed the same way the daily run dedupes
+    existing = set()
+    for emp_code, entry_type, reason, metric, created_at in PerformanceReward.objects.filter(
+        emp_code__in=emp_codes,
+        trigger_reason__in=[streak_reason, 'High Weekly Overtime', absent_reason],
+        created_at__date__gte=start, created_at__date__lte=end,
+    ).values_list('emp_code', 'entry_type', 'trigger_reason', 'metric_data', 'created_at'):
+        d = timezone.localtime(created_at).date()
+        if reason == streak_reason and metric == streak_metric:
+            existing.add(('streak', emp_code, d))
+        elif reason == 'High Weekly Overtime':
+            existing.add(('overtime', emp_code, d))
+        elif reason == absent_reason and entry_type == 'ACTION':
+            existing.add(('absentee', emp_code, d))
+
+    to_create = {}  # day -> [PerformanceReward]
+    d = start
+    while d <= end:
+        for emp_code, dates in present_by_emp.items():
+            lo = bisect_left(dates, d - timedelta(days=streak_days + 5))
+            hi = bisect_right(dates, d)
+            if ('streak', emp_code, d) not in existing and _has_present_streak(dates[lo:hi], streak_days):
+                to_create.setdefault(d, []).append(PerformanceReward(
+                    emp_code=emp_code, entry_type='REWARD', trigger_reason=streak_reason,
+                    metric_data=streak_metric, is_on_leaderboard=True,
+                ))
+                counts['streak'] += 1
+        week = [d - timedelta(days=i) for i in range(7)]
+        for emp_code, by_date in ot_by_emp.items():
+            if not any(w in by_date for w in week):
+                continue
+            total_ot = sum((by_date[w] for w in reversed(week) if w in by_date), Decimal('0'))
+            if total_ot >= threshold and ('overtime', emp_code, d) not in existing:
+                to_create.setdefault(d, []).append(PerformanceReward(
+                    emp_code=emp_code, entry_type='REWARD', trigger_reason='High Weekly Overtime',
+                    metric_data=f'{total_ot} hours this week', is_on_leaderboard=True,
+                ))
+                counts['overtime'] += 1
+        for emp_code, dates in absent_by_emp.items():
+            lo = bisect_left(dates, d - timedelta(days=absent_days + 10))
+            hi = bisect_right(dates, d)
+            if ('absentee', emp_code, d) not in existing and _has_absent_streak(dates[lo:hi], absent_days, company_id):
+                to_create.setdefault(d, []).append(PerformanceReward(
+                    emp_code=emp_code, entry_type='ACTION', trigger_reason=absent_reason,
+                    metric_data=f'{absent_days} consecutive absents', is_on_leaderboard=False,
+                    admin_action_status='Pending',
+                ))
+                counts['absentee'] += 1
+        d += timedelta(days=1)
+
+    for day, objs in to_create.items():
+        # created_at is auto_now_add, so move the new rows onto the evaluated day afterwards
+        created = PerformanceReward.objects.bulk_create(objs, batch_size=1000)
+        PerformanceReward.objects.filter(pk__in=[o.pk for o in created]).update(created_at=_day_created_at(day))
+    return counts
+
+
+def _worker_init():
+    """Pool initializer: make sure Django is set up (spawn start method) and no parent connection is reused."""
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+    connections.close_all()
+
+
+def _evaluate_chunk(args):
+    company_id, unassigned, start, end, emp_codes = args
+    try:
+        return company_id, start, _backfill_chunk(company_id, start, end, emp_codes, unassigned), None
+    except Exception as e:
+        logger.exception('Reward backfill failed for company=%s %s..%s', company_id, start, end)
+        return company_id, start, None, str(e)
+
+
+def _run_chunk(args):
+    """Pool worker entry point."""
+    try:
+        return _evaluate_chunk(args)
+    finally:
+        connections.close_all()
+
+
+def backfill_rewards(start, end, company_id=None, workers=None, emp_codes=None, progress=None):
+    """
+    Run the reward engine for every day in [start, end]. company_id=None = every pass the daily run makes
+    (each company, employees without a company); emp_codes limits it to those employees.
+    workers: process count (default: CPU count, capped at MAX_WORKERS); 1 runs inline on the calling
+    thread without touching its DB connection. progress(fraction) is called after each chunk.
+    Returns {'streak', 'overtime', 'absentee', 'chunks', 'errors'}.
+    """
+    from .reward_engine import reward_passes
+
+    if end < start:
+        start, end = end, start
+    passes = [(company_id, False)] if company_id is not None else reward_passes()
+    chunks = [(cid, unassigned, s, e, emp_codes) for cid, unassigned in passes for s, e in _month_chunks(start, end)]
+    totals = {'streak': 0, 'overtime': 0, 'absentee': 0, 'chunks': len(chunks), 'errors': []}
+    if not chunks:
+        return totals
+    workers = workers or min(os.cpu_count() or 1, MAX_WORKERS)
+    workers = max(1, min(workers, len(chunks)))
+
+    if workers == 1:
+        results = map(_evaluate_chunk, chunks)
+    else:
+        # Forked children must not share the parent's DB socket
+        connections.close_all()
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_worker_init)
+        results = pool.map(_run_chunk, chunks)
+    try:
+        for done, (cid, chunk_start, counts, error) in enumerate(results, 1):
+            if progress is not None:
+                progress(done / len(chunks))
+            if error:
+                totals['errors'].append({'company_id': cid, 'month': chunk_start.strftime('%Y-%m'), 'error': error})
+                continue
+            for k in ('streak', 'overtime', 'absentee'):
+                totals[k] += counts[k]
+    finally:
+        if workers > 1:
+            pool.shutdown()
+    return totals
+
+
+# ---------- Background job (API) ----------
+def _get_pool():
+    """One thread: API backfills run one at a time per process."""
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='reward-backfill')
+        return _pool
+
+
+def _active_jobs(company_id):
+    from .models import RewardBackfillJob
+    qs = RewardBackfillJob.objects.filter(status__in=[RewardBackfillJob.STATUS_QUEUED, RewardBackfillJob.STATUS_RUNNING])
+    return qs.filter(company__isnull=True) if company_id is None else qs.filter(company_id=company_id)
+
+
+def submit_job(start, end, admin, allowed_emp_codes):
+    """
+    Queue a backfill of [start, end] for the admin's company (every company for the system owner),
+    limited to allowed_emp_codes. A company has one backfill at a time: the same request joins the
+    active job, a different one raises ValueError. Returns (job, joined).
+    """
+    from .models import RewardBackfillJob
+    company_id = getattr(admin, 'company_id', None) if admin else None
+    now = timezone.now()
+    _active_jobs(company_id).filter(created_at__lt=now - timedelta(seconds=STALE_JOB_SECONDS)).update(
+        status=RewardBackfillJob.STATUS_FAILED, finished_at=now, message='Backfill worker stopped before finishing',
+    )
+    existing = _active_jobs(company_id).first()
+    if existing is not None:
+        same_scope = (existing.emp_codes is None) == (allowed_emp_codes is None) and \
+            set(existing.emp_codes or []) == set(allowed_emp_codes or [])
+        if existing.date_from == start and existing.date_to == end and same_scope:
+            return existing, True
+        raise ValueError(f'A reward backfill ({existing.date_from}..{existing.date_to}) is already running for this company')
+    job = RewardBackfillJob.objects.create(
+        token=secrets.token_urlsafe(32), admin=admin, company_id=company_id,
+        date_from=start, date_to=end, emp_codes=allowed_emp_codes,
+    )
+    _get_pool().submit(_run_job, job.pk)
+    return job, False
+
+
+def _run_job(job_id):
+    from .models import RewardBackfillJob
+    jobs = RewardBackfillJob.objects.filter(pk=job_id)
+
+    def progress(fraction):
+        jobs.update(progress=max(0, min(99, int(fraction * 100))))
+
+    try:
+        job = jobs.get()
+        jobs.update(status=RewardBackfillJob.STATUS_RUNNING, started_at=timezone.now())
+        result = backfill_rewards(
+            job.date_from, job.date_to, company_id=job.company_id, workers=1,
+            emp_codes=job.emp_codes, progress=progress,
+        )
+        jobs.update(
+            status=RewardBackfillJob.STATUS_DONE if not result['errors'] else RewardBackfillJob.STATUS_FAILED,
+            progress=100, finished_at=timezone.now(), result=result,
+            message='' if not result['errors'] else f"{len(result['errors'])} chunk(s) failed",
+        )
+    except Exception as e:
+        logger.exception('Reward backfill job %s failed', job_id)
+        jobs.update(status=RewardBackfillJob.STATUS_FAILED, finished_at=timezone.now(), message=str(e)[:2000])
+    finally:
+        connection.close()  # worker thread outlives the request cycle
+
+
+def job_status(job):
+    """API shape of a backfill job."""
+    return {
+        'token': job.token,
+        'company_id': job.company_id,
+        'date_from': job.date_from.isoformat(),
+        'date_to': job.date_to.isoformat(),
+        'status': job.status,
+        'progress': job.progress,
+        'message': job.message,
+        'result': job.result,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
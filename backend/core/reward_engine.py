@@ -1,6 +1,7 @@
 """
 Automation: Streak reward, Weekly overtime reward, Absentee red flag.
-Uses Holiday model so absentee logic doesn't flag holidays.
+Uses the shared work calendar (Holiday table + company weekly off) so absentee logic doesn't flag holidays.
+Streak and absentee rules only scan employees picked by streak_state.streak_candidates().
 """
 from datetime import date, timedelta
 from decimal import Decimal
@@ -8,8 +9,10 @@ from decimal import Decimal
 from django.db.models import Sum
 from django.db.models.functions import TruncDate
 
-from .models import Attendance, PerformanceReward, Holiday, SystemSetting, Employee
+from .models import Attendance, PerformanceReward, SystemSetting, Employee
 from .settings_utils import get_company_setting
+from . import work_calendar
+from .streak_state import streak_candidates
 
 
 def _get_setting(key, default, company_id=None):
@@ -22,25 +25,63 @@ def _get_setting(key, default, company_id=None):
         return default
 
 
-def _is_holiday(d):
-    """Treat Sundays as auto holiday; also any date in Holiday table."""
-    if d.weekday() == 6:  # Sunday
-        return True
-    return Holiday.objects.filter(date=d).exists()
+def _is_holiday(d, company_id=None):
+    """Weekly off (Sunday by default) or any date in Holiday table; served from the cached calendar."""
+    return work_calendar.is_holiday(d, company_id=company_id)
 
 
-def run_streak_reward(target_date=None, company_id=None):
+def _scope_emp_codes(company_id=None, unassigned=False):
+    """Emp codes a run covers: one company's, those without a company (unassigned), or None = everyone."""
+    if unassigned:
+        return list(Employee.objects.filter(company__isnull=True).values_list('emp_code', flat=True))
+    if company_id is not None:
+        return list(Employee.objects.filter(company_id=company_id).values_list('emp_code', flat=True))
+    return None
+
+
+def _has_present_streak(sorted_dates, streak_days):
+    """True if sorted unique dates contain streak_days consecutive days."""
+    i = 0
+    while i <= len(sorted_dates) - streak_days:
+        window = sorted_dates[i:i + streak_days]
+        if (window[-1] - window[0]).days == streak_days - 1:
+            return True
+        i += 1
+    return False
+
+
+def _has_absent_streak(sorted_dates, absent_days, company_id=None):
+    """True if sorted unique absent dates contain absent_days consecutive days, none of them holidays."""
+    i = 0
+    while i <= len(sorted_dates) - absent_days:
+        window = sorted_dates[i:i + absent_days]
+        if (window[-1] - window[0]).days == absent_days - 1:
+            # Consecutive absent streak - check none are holidays
+            if all(not _is_holiday(d, company_id) for d in window):
+                return True
+            i += absent_days
+        else:
+            i += 1
+    return False
+
+
+def run_streak_reward(target_date=None, company_id=None, unassigned=False):
     """Present 4 consecutive days -> REWARD, leaderboard."""
     target_date = target_date or date.today()
     streak_days = int(_get_setting('streak_days', '4', company_id=company_id))
     start = target_date - timedelta(days=streak_days + 5)
     end = target_date
     att = Attendance.objects.filter(date__gte=start, date__lte=end, status='Present').order_by('emp_code', 'date')
-    if company_id is not None:
-        emp_codes = list(Employee.objects.filter(company_id=company_id).values_list('emp_code', flat=True))
+    emp_codes = _scope_emp_codes(company_id, unassigned)
+    if emp_codes is not None:
         if not emp_codes:
             return 0
         att = att.filter(emp_code__in=emp_codes)
+    # Only employees whose streak state reached the threshold recently
+    candidates = streak_candidates('present', target_date, streak_days, company_id=company_id)
+    if not candidates:
+        return 0
+    att = att.filter(emp_code__in=list(candidates))
     by_emp = {}
     for a in att:
         if a.emp_code not in by_emp:
@@ -49,40 +90,33 @@ def run_streak_reward(target_date=None, company_id=None):
 
     created = 0
     for emp_code, dates in by_emp.items():
-        sorted_dates = sorted(set(dates))
-        i = 0
-        while i <= len(sorted_dates) - streak_days:
-            window = sorted_dates[i:i + streak_days]
-            if (window[-1] - window[0]).days == streak_days - 1:
-                # Consecutive streak
-                if not PerformanceReward.objects.filter(
-                    emp_code=emp_code,
-                    trigger_reason=f'{streak_days} Day Streak',
-                    metric_data=f'{streak_days} consecutive present days',
-                    created_at__date=target_date,
-                ).exists():
-                    PerformanceReward.objects.create(
-                        emp_code=emp_code,
-                        entry_type='REWARD',
-                        trigger_reason=f'{streak_days} Day Streak',
-                        metric_data=f'{streak_days} consecutive present days',
-                        is_on_leaderboard=True,
-                    )
-                    created += 1
-                i += streak_days
-            else:
-                i += 1
+        if not _has_present_streak(sorted(set(dates)), streak_days):
+            continue
+        if not PerformanceReward.objects.filter(
+            emp_code=emp_code,
+            trigger_reason=f'{streak_days} Day Streak',
+            metric_data=f'{streak_days} consecutive present days',
+            created_at__date=target_date,
+        ).exists():
+            PerformanceReward.objects.create(
+                emp_code=emp_code,
+                entry_type='REWARD',
+                trigger_reason=f'{streak_days} Day Streak',
+                metric_data=f'{streak_days} consecutive present days',
+                is_on_leaderboard=True,
+            )
+            created += 1
     return created
 
 
-def run_weekly_overtime_reward(target_date=None, company_id=None):
+def run_weekly_overtime_reward(target_date=None, company_id=None, unassigned=False):
     """Sum over_time in last 7 days > 6 hours -> REWARD, leaderboard."""
     target_date = target_date or date.today()
     week_start = target_date - timedelta(days=6)
     threshold_hours = float(_get_setting('weekly_overtime_threshold_hours', '6', company_id=company_id))
     att_qs = Attendance.objects.filter(date__gte=week_start, date__lte=target_date)
-    if company_id is not None:
-        emp_codes = list(Employee.objects.filter(company_id=company_id).values_list('emp_code', flat=True))
+    emp_codes = _scope_emp_codes(company_id, unassigned)
+    if emp_codes is not None:
         if not emp_codes:
             return 0
         att_qs = att_qs.filter(emp_code__in=emp_codes)
@@ -107,7 +141,7 @@ def run_weekly_overtime_reward(target_date=None, company_id=None):
     return created
 
 
-def run_absentee_red_flag(target_date=None, company_id=None):
+def run_absentee_red_flag(target_date=None, company_id=None, unassigned=False):
     """Absent 3 consecutive days (excluding holidays) -> ACTION, Pending, not leaderboard."""
     target_date = target_date or date.today()
     absent_days = int(_get_setting('absent_streak_days', '3', company_id=company_id))
@@ -115,11 +149,15 @@ def run_absentee_red_flag(target_date=None, company_id=None):
     abs_qs = Attendance.objects.filter(
         date__gte=start, date__lte=target_date, status='Absent'
     )
-    if company_id is not None:
-        emp_codes = list(Employee.objects.filter(company_id=company_id).values_list('emp_code', flat=True))
+    emp_codes = _scope_emp_codes(company_id, unassigned)
+    if emp_codes is not None:
         if not emp_codes:
             return 0
         abs_qs = abs_qs.filter(emp_code__in=emp_codes)
+    candidates = streak_candidates('absent', target_date, absent_days, company_id=company_id)
+    if not candidates:
+        return 0
+    abs_qs = abs_qs.filter(emp_code__in=list(candidates))
     absents = abs_qs.values_list('emp_code', 'date')
     by_emp = {}
     for emp_code, d in absents:
@@ -127,38 +165,118 @@ def run_absentee_red_flag(target_date=None, company_id=None):
 
     created = 0
     for emp_code, dates in by_emp.items():
-        sorted_dates = sorted(set(dates))
-        i = 0
-        while i <= len(sorted_dates) - absent_days:
-            window = sorted_dates[i:i + absent_days]
-            if (window[-1] - window[0]).days == absent_days - 1:
-                # Consecutive absent streak - check none are holidays
-                if all(not _is_holiday(d) for d in window):
-                    if not PerformanceReward.objects.filter(
-                        emp_code=emp_code,
-                        entry_type='ACTION',
-                        trigger_reason=f'{absent_days} Days Absent',
-                        created_at__date=target_date,
-                    ).exists():
-                        PerformanceReward.objects.create(
-                            emp_code=emp_code,
-                            entry_type='ACTION',
-                            trigger_reason=f'{absent_days} Days Absent',
-                            metric_data=f'{absent_days} consecutive absents',
-                            is_on_leaderboard=False,
-                            admin_action_status='Pending',
-                        )
-                        created += 1
-                i += absent_days
-            else:
-                i += 1
+        if not _has_absent_streak(sorted(set(dates)), absent_days, company_id):
+            continue
+        if not PerformanceReward.objects.filter(
+            emp_code=emp_code,
+            entry_type='ACTION',
+            trigger_reason=f'{absent_days} Days Absent',
+            created_at__date=target_date,
+        ).exists():
+            PerformanceReward.objects.create(
+                emp_code=emp_code,
+                entry_type='ACTION',
+                trigger_reason=f'{absent_days} Days Absent',
+                metric_data=f'{absent_days} consecutive absents',
+                is_on_leaderboard=False,
+                admin_action_status='Pending',
+            )
+            created += 1
     return created
 
 
-def run_reward_engine(target_date=None, company_id=None):
-    """Run all three automations. When company_id is set, only that company's employees and settings are used."""
+def run_reward_engine(target_date=None, company_id=None, unassigned=False):
+    """
+    Run all three automations. When company_id is set, only that company's employees and settings are used.
+    unassigned: only employees without a company (global settings and calendar).
+    """
     target_date = target_date or date.today()
-    a = run_streak_reward(target_date, company_id=company_id)
-    b = run_weekly_overtime_reward(target_date, company_id=company_id)
-    c = run_absentee_red_flag(target_date, company_id=company_id)
+    a = run_streak_reward(target_date, company_id=company_id, unassigned=unassigned)
+    b = run_weekly_overtime_reward(target_date, company_id=company_id, unassigned=unassigned)
+    c = run_absentee_red_flag(target_date, company_id=company_id, unassigned=unassigned)
     return {'streak': a, 'overtime': b, 'absentee': c}
+
+
+# ---------- Scheduled run (single-flight, per company) ----------
+LAST_RUN_KEY = 'reward_engine_last_run'  # CompanySetting: ISO datetime of last successful run
+LAST_RESULT_KEY = 'reward_engine_last_result'
+
+
+def _own_setting(key, company_id):
+    """
+    The company's own CompanySetting row only (company_id None = the employees-without-company pass).
+    No fallback to the global layer: that is the unassigned pass's run, not this company's.
+    """
+    from .models import CompanySetting
+    return CompanySetting.objects.filter(company_id=company_id, key=key).values_list('value', flat=True).first() or ''
+
+
+def get_reward_engine_last_run(company_id=None):
+    """Datetime of the last successful scheduled run for this company, or None."""
+    from datetime import datetime
+    from django.utils import timezone
+    raw = _own_setting(LAST_RUN_KEY, company_id)
+    try:
+        dt = datetime.fromisoformat(raw) if raw else None
+    except ValueError:
+        return None
+    if dt is not None and timezone.is_naive(dt):
+        dt = timezone.make_aware(dt)
+    return dt
+
+
+def get_reward_engine_last_result(company_id=None):
+    """Summary line of the last successful scheduled run for this company ('' if none)."""
+    return _own_setting(LAST_RESULT_KEY, company_id)
+
+
+def reward_passes():
+    """
+    (company_id, unassigned) per engine pass: one per company, then one for employees without a company
+    (only if any); (None, False) = everyone when there are no companies.
+    """
+    from .models import Company
+    company_ids = list(Company.objects.values_list('id', flat=True))
+    passes = [(company_id, False) for company_id in company_ids]
+    if not company_ids:
+        passes.append((None, False))
+    elif Employee.objects.filter(company__isnull=True).exists():
+        passes.append((None, True))
+    return passes
+
+
+def run_scheduled_reward_engine(target_date=None, force=False, company_ids=None):
+    """
+    Run the engine once per day per company, from the scheduler (force=True: the manual trigger and uploads).
+    Employees without a company get their own pass (key None), as does everyone when there are no companies.
+    company_ids: only these passes (None = all).
+    Single-flight across processes; records last successful run per company.
+    Returns {company_id: result} for companies run now, or {'skipped': reason}.
+    """
+    import logging
+    from django.utils import timezone
+    from .job_lock import single_flight
+    from .settings_utils import set_company_setting
+
+    logger = logging.getLogger(__name__)
+    target_date = target_date or timezone.localdate()
+    with single_flight('reward_engine') as acquired:
+        if not acquired:
+            return {'skipped': 'already running'}
+        passes = reward_passes()
+        if company_ids is not None:
+            passes = [p for p in passes if p[0] in company_ids]
+        results = {}
+        for company_id, unassigned in passes:
+            last = get_reward_engine_last_run(company_id)
+            if not force and last is not None and timezone.localtime(last).date() >= target_date:
+                continue
+            try:
+                result = run_reward_engine(target_date, company_id=company_id, unassigned=unassigned)
+            except Exception:
+                logger.exception('Reward engine failed for company %s', company_id)
+                continue
+            set_company_setting(LAST_RUN_KEY, timezone.now().isoformat(), company_id, description='Last successful reward engine run')
+            set_company_setting(LAST_RESULT_KEY, f"{target_date}: streak={result['streak']} overtime={result['overtime']} absentee={result['absentee']}", company_id, description='Last reward engine result')
+            results[company_id] = result
+        return results
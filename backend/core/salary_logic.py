@@ -1,12 +1,16 @@
 """
 Salary history: ensure monthly records exist; bonus = floor(overtime_hours/2) for hourly + ShiftOvertimeBonus for month.
+Gross / net pay per employee and month (gross_and_rate, period_pay_totals).
 """
+from collections import defaultdict
 from decimal import Decimal
 from django.db.models import Sum, Count, Q
 
-from .models import Employee, Attendance, Salary, ShiftOvertimeBonus
+from .models import Employee, Attendance, Salary, SalaryAdvance, Penalty, ShiftOvertimeBonus
+from . import data_version
 
 
+@data_version.deferred()
 def ensure_monthly_salaries(year, month):
     """Create or update salary records for the month from attendance (overtime, bonus, total hours, days present)."""
     from datetime import date
@@ -55,13 +59,19 @@ def ensure_monthly_salaries(year, month):
         ).first()
 
         if existing:
-            existing.salary_type = emp.salary_type
-            existing.base_salary = base
-            existing.overtime_hours = overtime_hours
-            existing.total_working_hours = total_working_hours
-            existing.days_present = days_present
+            values = {
+                'salary_type': emp.salary_type,
+                'base_salary': base,
+                'overtime_hours': overtime_hours,
+                'total_working_hours': total_working_hours,
+                'days_present': days_present,
+            }
             # Do not overwrite existing.bonus — may include manual bonus; shift OT is added by apply_shift_overtime_bonus_for_date
-            existing.save()
+            # Unchanged rows are not saved, so other companies' sheets are not marked changed (data_version)
+            if any(getattr(existing, k) != v for k, v in values.items()):
+                for k, v in values.items():
+                    setattr(existing, k, v)
+                existing.save()
         else:
             Salary.objects.create(
                 emp_code=emp.emp_code,
@@ -74,4 +84,84 @@ def ensure_monthly_salaries(year, month):
                 days_present=days_present,
                 bonus=new_record_bonus,
             )
+    # Salary base / new bonus rows feed the plant report rollup's bonus Rs
+    from .dept_rollup import safe_mark_month_stale
+    safe_mark_month_stale(year, month)
     return True
+
+
+# ---------- Salary gross logic ----------
+# Hourly: (total_working_hours + bonus_hours) × per_hour_rate. OT → bonus hours.
+# Monthly: base_salary + (bonus_hours × hourly_rate). hourly_rate = base/208.
+# Fixed: base_salary + (bonus_hours × hourly_rate). Bonus only when given by admin/leaderboard etc.
+def gross_and_rate(salary_type, base_salary, total_working_hours, overtime_hours, bonus_hours):
+    """Returns (gross, hourly_rate). bonus_hours is stored in Salary.bonus."""
+    base = Decimal(str(base_salary or 0))
+    total_hrs = Decimal(str(total_working_hours or 0))
+    bonus = Decimal(str(bonus_hours or 0))
+    st = (salary_type or '').strip()
+    if st == 'Hourly':
+        hourly_rate = base
+        gross = (total_hrs + bonus) * base
+        return (gross, hourly_rate)
+    if st == 'Fixed':
+        hourly_rate = base / Decimal('208') if base else Decimal('0')
+        gross = base + (bonus * hourly_rate)
+        return (gross, hourly_rate)
+    # Monthly: full monthly + bonus hours at hourly rate
+    hourly_rate = base / Decimal('208') if base else Decimal('0')
+    gross = base + (bonus * hourly_rate)
+    return (gross, hourly_rate)
+
+
+def _periods_q(periods):
+    """Q matching month/year rows of the given (month, year) pairs: one term per year."""
+    months_by_year = defaultdict(set)
+    for m, y in periods:
+        months_by_year[int(y)].add(int(m))
+    q = Q()
+    for y, months in months_by_year.items():
+        q |= Q(year=y, month__in=sorted(months))
+    return q
+
+
+def period_pay_totals(periods, emp_codes=None):
+    """
+    Pay figures per (emp_code, month, year) for the given (month, year) pairs, in three queries
+    (advance and penalty grouped by employee and month, Salary rows) whatever the number of months.
+    emp_codes: None = all employees, else a list / queryset of emp codes (empty = none).
+    Each value: advance, penalty (all penalties of the month), penalty_deduction (penalty counted
+    against pay: Hourly only), and from the Salary row salary_type, gross, hourly_rate and
+    net = gross - advance - penalty_deduction (2 dp); gross / hourly_rate / net are None without a Salary row.
+    """
+    periods = list(periods or [])
+    if not periods or (isinstance(emp_codes, (list, tuple, set)) and not emp_codes):
+        return {}
+    q = _periods_q(periods)
+
+    def scoped(qs):
+        qs = qs.filter(q)
+        return qs.filter(emp_code__in=emp_codes) if emp_codes is not None else qs
+
+    totals = defaultdict(lambda: {
+        'advance': Decimal('0'), 'penalty': Decimal('0'), 'penalty_deduction': Decimal('0'),
+        'salary_type': None, 'gross': None, 'hourly_rate': None, 'net': None,
+    })
+    for r in scoped(SalaryAdvance.objects.all()).values('emp_code', 'month', 'year').annotate(total=Sum('amount')):
+        totals[(r['emp_code'], r['month'], r['year'])]['advance'] = r['total'] or Decimal('0')
+    for r in scoped(Penalty.objects.all()).values('emp_code', 'month', 'year').annotate(total=Sum('deduction_amount')):
+        totals[(r['emp_code'], r['month'], r['year'])]['penalty'] = r['total'] or Decimal('0')
+    for s in scoped(Salary.objects.all()).values(
+        'emp_code', 'month', 'year', 'salary_type', 'base_salary', 'total_working_hours', 'overtime_hours', 'bonus'
+    ):
+        t = totals[(s['emp_code'], s['month'], s['year'])]
+        t['salary_type'] = s['salary_type']
+        t['gross'], t['hourly_rate'] = gross_and_rate(
+            s['salary_type'], s['base_salary'], s['total_working_hours'], s['overtime_hours'], s['bonus'],
+        )
+    for t in totals.values():
+        if (t['salary_type'] or '').strip() == 'Hourly':
+            t['penalty_deduction'] = t['penalty']
+        if t['gross'] is not None:
+            t['net'] = round(t['gross'] - t['advance'] - t['penalty_deduction'], 2)
+    return dict(totals)
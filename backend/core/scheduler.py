@@ -0,0 +1,173 @@
+"""
+Background scheduler with one leader across all processes and hosts.
+Every process may start it; the one holding the PostgreSQL advisory lock 'scheduler_leader'
+(session lock on the scheduler thread's own DB connection) runs the jobs, the others just
+retry the lock. Each job has its own cadence; last-run bookkeeping lives in ScheduledJobRun,
+so a new leader picks up the cadence where the old one left off.
+Started from CoreConfig.ready() (runserver, or SCHEDULER_AUTOSTART=true) or `manage.py run_scheduler`.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+
+from . import job_lock
+
+logger = logging.getLogger(__name__)
+
+LEADER_LOCK = 'scheduler_leader'
+TICK_SECONDS = 15
+
+
+def _today_sync():
+    from .attendance_sync import mark_today_punched_present
+    return mark_today_punched_present()
+
+
+def _auto_absent():
+    from .attendance_sync import _run_auto_absent
+    return _run_auto_absent(force_run=False)
+
+
+def _inactive_mark():
+    from .inactive_mark import mark_inactive_no_punch_6_days
+    return mark_inactive_no_punch_6_days()
+
+
+def _plant_report():
+    from .plant_report_email import maybe_send_plant_report_daily
+    return maybe_send_plant_report_daily()
+
+
+def _reward_engine():
+    from .reward_engine import run_scheduled_reward_engine
+    return run_scheduled_reward_engine()
+
+
+def _dept_rollup_rebuild():
+    from .dept_rollup import rebuild_all
+    return rebuild_all()
+
+
+def _google_sheet_sync():
+    """Per-company sheets only: each company with google_sheet_id gets only its own data (in parallel, see sheet_sync_pool)."""
+    from .sheet_sync_pool import run_sync_cycle
+    return run_sync_cycle()
+
+
+def _export_jobs_cleanup():
+    from .export_jobs import cleanup
+    return cleanup()
+
+
+# (name, interval seconds, callable)
+JOBS = [
+    ('today_sync', 180, _today_sync),
+    ('auto_absent', 60, _auto_absent),  # no-op before cutoff / once per day after
+    ('plant_report', 30, _plant_report),  # matches the configured send minute
+    ('google_sheet_sync', 30, _google_sheet_sync),  # only companies whose data changed (data_version)
+    ('reward_engine', 600, _reward_engine),  # once per day per company
+    ('inactive_mark', 900, _inactive_mark),  # once per day
+    ('dept_rollup_rebuild', 86400, _dept_rollup_rebuild),  # safety net for writes that skip the stale marks
+    ('export_jobs_cleanup', 3600, _export_jobs_cleanup),  # expired background export files
+]
+
+_started = False
+_start_lock = threading.Lock()
+
+
+def _host_id():
+    return f'{socket.gethostname()}:{os.getpid()}'[:255]
+
+
+def _run_job(name, func):
+    from .models import ScheduledJobRun
+    now = timezone.now()
+    ScheduledJobRun.objects.update_or_create(name=name, defaults={'last_started_at': now, 'last_host': _host_id()})
+    try:
+        result = func()
+    except Exception as e:
+        logger.warning('Scheduler job %s failed: %s', name, e, exc_info=True)
+        ScheduledJobRun.objects.filter(name=name).update(
+            last_finished_at=timezone.now(), last_error=str(e)[:2000],
+        )
+        return
+    finished = timezone.now()
+    ScheduledJobRun.objects.filter(name=name).update(
+        last_finished_at=finished, last_success_at=finished, last_error='',
+        last_result=str(result)[:500] if result is not None else '', run_count=F('run_count') + 1,
+    )
+
+
+def run_due_jobs():
+    """Run every job whose interval elapsed since its last start (per ScheduledJobRun)."""
+    from .models import ScheduledJobRun
+    now = timezone.now()
+    last_started = dict(ScheduledJobRun.objects.values_list('name', 'last_started_at'))
+    for name, interval, func in JOBS:
+        last = last_started.get(name)
+        if last is not None and now - last < timedelta(seconds=interval):
+            continue
+        _run_job(name, func)
+
+
+class _Leader:
+    """Holds the leader advisory lock on this thread's DB connection."""
+
+    def __init__(self):
+        self.is_leader = False
+
+    def check(self):
+        if self.is_leader:
+            if connection.connection is not None and connection.is_usable():
+                return True
+            # Connection dropped: the server released the lock with it
+            logger.warning('Scheduler lost DB connection; re-electing leader')
+            connection.close()
+            self.is_leader = False
+        try:
+            self.is_leader = job_lock.try_acquire(LEADER_LOCK)
+        except Exception as e:
+            logger.warning('Scheduler leader election failed: %s', e)
+            connection.close()
+            self.is_leader = False
+        if self.is_leader:
+            logger.info('Scheduler leader: %s', _host_id())
+        return self.is_leader
+
+
+def run_forever(stop_event=None):
+    """Scheduler loop; returns when stop_event is set."""
+    leader = _Leader()
+    while stop_event is None or not stop_event.is_set():
+        try:
+            if leader.check():
+                run_due_jobs()
+        except Exception as e:
+            logger.warning('Scheduler tick error: %s', e, exc_info=True)
+        if stop_event is not None:
+            stop_event.wait(TICK_SECONDS)
+        else:
+            time.sleep(TICK_SECONDS)
+    if leader.is_leader:
+        job_lock.release(LEADER_LOCK)
+    connection.close()
+
+
+def start_in_background():
+    """Start the scheduler thread once per process. Safe in every worker: only the leader runs jobs."""
+    global _started
+    with _start_lock:
+        if _started:
+            return False
+        _started = True
+    thread = threading.Thread(target=run_forever, name='hr-scheduler', daemon=True)
+    thread.start()
+    logger.info('Background scheduler started (%s)', _host_id())
+    return True
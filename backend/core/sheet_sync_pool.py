@@ -0,0 +1,141 @@
+"""
+Google Sheet auto-sync across companies on a small worker pool.
+Only companies whose data changed (core.data_version) are synced; each gets its own sync_all() on a
+pool thread (GOOGLE_SHEETS_SYNC_WORKERS), all sharing the process-wide Sheets API rate limiter in
+google_sheets_sync. The scheduler cycle only starts syncs and never waits for them. Every sync has a
+time budget (GOOGLE_SHEETS_SYNC_TIMEOUT); a company whose sync is still running is skipped next cycle
+instead of queued again. A failed sync (quota error, timeout, bad sheet) backs that company off
+exponentially (BACKOFF_BASE_SECONDS, doubling, capped at BACKOFF_MAX_SECONDS); a successful sync
+resets it. The manual push (submit) uses the same pool.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_BASE_SECONDS = 120
+BACKOFF_MAX_SECONDS = 3600
+
+_lock = threading.Lock()
+_pool = None
+_in_flight = {}  # company_id -> Future
+_backoff = {}  # company_id -> (consecutive failures, retry after: monotonic seconds)
+
+
+def _get_pool():
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=max(1, getattr(settings, 'GOOGLE_SHEETS_SYNC_WORKERS', 4)),
+                thread_name_prefix='sheet-sync',
+            )
+        return _pool
+
+
+def _sync_company(company_id, timeout, force_full=False):
+    from .google_sheets_sync import sync_all
+    try:
+        return sync_all(force_full=force_full, company_id=company_id, timeout=timeout)
+    finally:
+        connection.close()  # pool threads outlive the request cycle; don't leave their connections open
+
+
+def _on_done(company_id, future):
+    """Record a finished sync: reset or extend the company's backoff."""
+    try:
+        result = future.result()
+    except Exception as e:
+        result = {'success': False, 'message': str(e)}
+    with _lock:
+        if _in_flight.get(company_id) is future:
+            del _in_flight[company_id]
+        if result.get('success'):
+            _backoff.pop(company_id, None)
+            return
+        if result.get('already_running'):
+            return  # another process is syncing this company and picked up our request
+        failures = _backoff.get(company_id, (0, 0))[0] + 1
+        delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (failures - 1))
+        _backoff[company_id] = (failures, time.monotonic() + delay)
+    if result.get('quota_exceeded'):
+        reason = 'quota exceeded'
+    elif result.get('timed_out'):
+        reason = 'timed out'
+    else:
+        reason = result.get('message', '')
+    logger.warning('Google Sheet auto-sync (company %s): %s; retry in %ss', company_id, reason, delay)
+
+
+def submit(company_id, force_full=False):
+    """
+    Start a sync for one company in the background (manual push), ignoring its backoff, or join the
+    one already in flight in this process. Returns (future, joined). Progress: google_sheets_sync.get_sync_status.
+    Joining with force_full still gets a full pass: a sync_all(force_full=True) call against the running
+    sync queues a forced follow-up, which the running sync performs before it lets go.
+    """
+    timeout = getattr(settings, 'GOOGLE_SHEETS_SYNC_TIMEOUT', 90)
+    pool = _get_pool()
+    with _lock:
+        future = _in_flight.get(company_id)
+        if future is not None:
+            if force_full:
+                # Not tracked in _in_flight: it returns at once (already_running) or, if the running sync
+                # just finished, does the full pass itself
+                pool.submit(_sync_company, company_id, timeout, True)
+            return future, True
+        future = pool.submit(_sync_company, company_id, timeout, force_full)
+        _in_flight[company_id] = future
+    future.add_done_callback(partial(_on_done, company_id))
+    return future, False
+
+
+def companies_to_sync():
+    """Company ids that have their own google_sheet_id (per-company sheets only)."""
+    from .google_sheets_sync import get_sheet_id
+    from .models import CompanySetting
+    company_ids = CompanySetting.objects.filter(
+        key='google_sheet_id', company_id__isnull=False,
+    ).exclude(value='').values_list('company_id', flat=True).distinct()
+    return [c for c in company_ids if get_sheet_id(company_id=c)]
+
+
+def run_sync_cycle():
+    """
+    Start a sync for every company whose data changed (data_version.due_for_sync) and return without
+    waiting, so the scheduler thread is never held by Sheets I/O. Companies still in flight are skipped;
+    results and backoff are recorded by _on_done. Unchanged companies cost one shared query.
+    Returns counts: started, still running, skipped for backoff, unchanged.
+    """
+    from .data_version import due_for_sync
+    timeout = getattr(settings, 'GOOGLE_SHEETS_SYNC_TIMEOUT', 90)
+    company_ids = companies_to_sync()
+    due = due_for_sync(company_ids)
+    if not due:
+        return {'started': 0, 'running': 0, 'backoff': 0, 'unchanged': len(company_ids)}
+    pool = _get_pool()
+    started = running = backing_off = 0
+    now = time.monotonic()
+    for company_id in due:
+        with _lock:
+            if company_id in _in_flight:
+                running += 1
+                continue
+            backoff = _backoff.get(company_id)
+            if backoff and backoff[1] > now:
+                backing_off += 1
+                continue
+            future = pool.submit(_sync_company, company_id, timeout)
+            _in_flight[company_id] = future
+        future.add_done_callback(partial(_on_done, company_id))
+        started += 1
+    return {
+        'started': started, 'running': running, 'backoff': backing_off,
+        'unchanged': len(company_ids) - len(due),
+    }
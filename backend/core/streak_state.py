@@ -0,0 +1,188 @@
+"""
+Incremental present/absent streak state per employee (EmployeeStreakState).
+Attendance writes call update_streak_state() with the (emp_code, date) pairs they touched:
+appends after last_evaluated extend the stored streaks, older edits re-walk a bounded window.
+The reward engine asks streak_candidates() for employees whose streak reached the threshold
+recently, so the nightly run scans those few instead of every employee's trailing window.
+"""
+import logging
+from datetime import timedelta
+
+from .models import Attendance, Employee, EmployeeStreakState
+from . import work_calendar
+
+logger = logging.getLogger(__name__)
+
+REBUILD_LOOKBACK_DAYS = 62  # streak lengths saturate here; only thresholds matter to the engine
+# Latest streak end date that can still fall in the engine's look-back window (see reward_engine)
+HIT_SPAN_DAYS = {'present': 6, 'absent': 11}
+
+
+def _thresholds(company_id, cache):
+    """(streak_days, absent_streak_days) for a company, memoized per call."""
+    if company_id not in cache:
+        from .reward_engine import _get_setting
+        cache[company_id] = (
+            int(_get_setting('streak_days', '4', company_id=company_id)),
+            int(_get_setting('absent_streak_days', '3', company_id=company_id)),
+        )
+    return cache[company_id]
+
+
+def _walk(state, rows, start, end, company_id):
+    """Fold attendance statuses for start..end (inclusive) into state. Missing rows break both streaks."""
+    d = start
+    while d <= end:
+        status = rows.get(d)
+        state.present_streak = state.present_streak + 1 if status == 'Present' else 0
+        if status == 'Absent' and work_calendar.is_working_day(d, company_id):
+            state.absent_streak += 1
+        else:
+            state.absent_streak = 0
+        if state.streak_days and state.present_streak >= state.streak_days:
+            state.present_hit_date = d
+        if state.absent_days and state.absent_streak >= state.absent_days:
+            state.absent_hit_date = d
+        d += timedelta(days=1)
+    if state.last_evaluated is None or end > state.last_evaluated:
+        state.last_evaluated = end
+
+
+def update_streak_state(emp_dates, rebuild=False):
+    """
+    Fold attendance changes into EmployeeStreakState.
+    emp_dates: iterable of (emp_code, date) whose attendance row was created/changed.
+    rebuild=True ignores stored streaks and re-walks from the earliest date minus REBUILD_LOOKBACK_DAYS.
+    Returns number of states written.
+    """
+    changed = {}
+    for emp_code, d in emp_dates:
+        if not emp_code or not d:
+            continue
+        lo, hi = changed.get(emp_code, (d, d))
+        changed[emp_code] = (min(lo, d), max(hi, d))
+    if not changed:
+        return 0
+
+    states = {s.emp_code: s for s in EmployeeStreakState.objects.filter(emp_code__in=list(changed))}
+    emp_company = dict(Employee.objects.filter(emp_code__in=list(changed)).values_list('emp_code', 'company_id'))
+    thresholds = {}
+    plans = {}  # emp_code -> (state, start, end)
+    for emp_code, (lo, hi) in changed.items():
+        streak_days, absent_days = _thresholds(emp_company.get(emp_code), thresholds)
+        state = states.get(emp_code)
+        stale = (
+            rebuild or state is None or state.last_evaluated is None
+            or state.streak_days != streak_days or state.absent_days != absent_days
+        )
+        if not stale and lo > state.last_evaluated:
+            # Append: continue from the stored streaks
+            plans[emp_code] = (state, state.last_evaluated + timedelta(days=1), hi)
+            continue
+        start = lo - timedelta(days=REBUILD_LOOKBACK_DAYS)
+        end = max(hi, state.last_evaluated) if state is not None and state.last_evaluated else hi
+        if state is None:
+            state = EmployeeStreakState(emp_code=emp_code)
+        keep_hits = not stale
+        state.present_streak = 0
+        state.absent_streak = 0
+        state.streak_days = streak_days
+        state.absent_days = absent_days
+        if not (keep_hits and state.present_hit_date and state.present_hit_date < start):
+            state.present_hit_date = None
+        if not (keep_hits and state.absent_hit_date and state.absent_hit_date < start):
+            state.absent_hit_date = None
+        state.last_evaluated = None
+        plans[emp_code] = (state, start, end)
+
+    window_start = min(p[1] for p in plans.values())
+    window_end = max(p[2] for p in plans.values())
+    rows_by_emp = {}
+    for emp_code, d, status in Attendance.objects.filter(
+        emp_code__in=list(plans), date__gte=window_start, date__lte=window_end,
+    ).values_list('emp_code', 'date', 'status').iterator(chunk_size=5000):
+        rows_by_emp.setdefault(emp_code, {})[d] = status
+
+    to_create, to_update = [], []
+    for emp_code, (state, start, end) in plans.items():
+        _walk(state, rows_by_emp.get(emp_code, {}), start, end, emp_company.get(emp_code))
+        (to_update if state.pk else to_create).append(state)
+    if to_create:
+        EmployeeStreakState.objects.bulk_create(to_create, batch_size=1000, ignore_conflicts=True)
+    if to_update:
+        EmployeeStreakState.objects.bulk_update(
+            to_update,
+            ['present_streak', 'absent_streak', 'last_evaluated', 'present_hit_date', 'absent_hit_date',
+             'streak_days', 'absent_days'],
+            batch_size=1000,
+        )
+    return len(to_create) + len(to_update)
+
+
+def safe_update_streak_state(emp_dates):
+    """update_streak_state for write paths: never fail the caller's request/upload."""
+    try:
+        return update_streak_state(emp_dates)
+    except Exception:
+        logger.warning('Streak state update failed', exc_info=True)
+        return 0
+
+
+def mark_calendar_changed(year=None, company_id=None):
+    """
+    Holidays / weekly off changed (work_calendar.invalidate): drop the states whose walked window can
+    include year (all when None), for company_id's employees (everyone when None). streak_candidates
+    treats them as missing, so the next engine run rebuilds them against the new calendar.
+    Returns number of states dropped.
+    """
+    from datetime import date
+    qs = EmployeeStreakState.objects.all()
+    if company_id is not None:
+        qs = qs.filter(emp_code__in=Employee.objects.filter(company_id=company_id).values('emp_code'))
+    if year is not None:
+        qs = qs.filter(
+            last_evaluated__gte=date(year, 1, 1),
+            last_evaluated__lte=date(year, 12, 31) + timedelta(days=REBUILD_LOOKBACK_DAYS),
+        )
+    deleted, _ = qs.delete()
+    return deleted
+
+
+def streak_candidates(kind, target_date, threshold, company_id=None):
+    """
+    Emp codes the engine must scan for kind 'present' or 'absent' on target_date:
+    states whose streak reached threshold within the look-back window, plus employees with no
+    state or a state built for another threshold (those are (re)built on the way).
+    """
+    hit_field = 'present_hit_date' if kind == 'present' else 'absent_hit_date'
+    threshold_field = 'streak_days' if kind == 'present' else 'absent_days'
+    emp_qs = Employee.objects.all()
+    if company_id is not None:
+        emp_qs = emp_qs.filter(company_id=company_id)
+    codes = set(emp_qs.values_list('emp_code', flat=True))
+    if not codes:
+        return set()
+    since = target_date - timedelta(days=HIT_SPAN_DAYS[kind])
+    candidates = set()
+    known = set()
+    mismatched = []
+    for emp_code, used, hit in EmployeeStreakState.objects.filter(emp_code__in=codes).values_list(
+        'emp_code', threshold_field, hit_field,
+    ):
+        known.add(emp_code)
+        if used != threshold:
+            candidates.add(emp_code)
+            mismatched.append(emp_code)
+        elif hit is not None and hit >= since:
+            candidates.add(emp_code)
+    missing = codes - known
+    candidates |= missing
+    # Bootstrap missing states; rebuild ones whose company threshold changed (not when the
+    # engine runs with global settings, which may legitimately differ from the company's)
+    to_build = list(missing) + (mismatched if company_id is not None else [])
+    if to_build:
+        try:
+            update_streak_state(((c, target_date) for c in to_build), rebuild=True)
+        except Exception:
+            logger.warning('Streak state bootstrap failed', exc_info=True)
+    return candidates
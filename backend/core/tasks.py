@@ -1,17 +1,21 @@
 from celery import shared_task
-from .reward_engine import run_reward_engine
+from .reward_engine import run_scheduled_reward_engine
 
 
 @shared_task
 def run_reward_engine_task():
-    """Run daily reward/flag engine. Schedule via Celery Beat or cron."""
-    return run_reward_engine()
+    """Run daily reward/flag engine per company (single-flight). Schedule via Celery Beat or cron."""
+    result = run_scheduled_reward_engine()
+    return {str(k): v for k, v in result.items()}
 
 
 @shared_task
 def sync_google_sheet_task():
-    """Push reports to Google Sheet. Scheduled every 2 minutes via Celery Beat."""
+    """Push reports to the global Google Sheet when data changed since the last push (Celery Beat, every minute)."""
+    from .data_version import global_sheet_due
     from .google_sheets_sync import sync_all
+    if not global_sheet_due():
+        return {'success': True, 'message': 'No changes since last sync.', 'skipped': True}
     return sync_all()
 
 
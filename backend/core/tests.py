@@ -0,0 +1,107 @@
+"""
+Google Sheet sync against core.fake_sheets: per-sync call budget, and the auto-sync pool's 429 backoff.
+TransactionTestCase: the pool's worker threads use their own DB connections and must see committed rows.
+"""
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import TransactionTestCase
+from django.utils import timezone
+
+from . import google_sheets_sync, sheet_sync_pool
+from .fake_sheets import FakeSheetsService
+from .models import Attendance, Company, CompanySetting, Employee
+
+SHEET_ID = 'fake-sheet'
+
+
+def _wait_idle(company_id, timeout=30):
+    """Wait until the pool has no sync in flight for the company (its _on_done ran)."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with sheet_sync_pool._lock:
+            if company_id not in sheet_sync_pool._in_flight:
+                return
+        time.sleep(0.05)
+    raise AssertionError(f'Sync for company {company_id} still running after {timeout}s')
+
+
+class SheetSyncTestCase(TransactionTestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Test Co', code='TEST')
+        CompanySetting.objects.create(company=self.company, key='google_sheet_id', value=SHEET_ID)
+        today = timezone.localdate()
+        for i in range(3):
+            emp = Employee.objects.create(
+                emp_code=f'T{i:03d}', name=f'Employee {i}', company=self.company, dept_name='Production',
+                base_salary=Decimal('15000'),
+            )
+            for days_ago in range(1, 4):
+                Attendance.objects.create(
+                    emp_code=emp.emp_code, name=emp.name, date=today - timedelta(days=days_ago),
+                    status='Present', total_working_hours=Decimal('9'), over_time=Decimal('1'),
+                )
+        with sheet_sync_pool._lock:
+            sheet_sync_pool._in_flight.clear()
+            sheet_sync_pool._backoff.clear()
+
+    def tearDown(self):
+        with sheet_sync_pool._lock:
+            sheet_sync_pool._in_flight.clear()
+            sheet_sync_pool._backoff.clear()
+
+
+class SyncCallBudgetTests(SheetSyncTestCase):
+    def test_first_sync_uses_one_structure_and_one_values_batch(self):
+        fake = FakeSheetsService()
+        with google_sheets_sync.use_service(fake):
+            result = google_sheets_sync.sync_all(company_id=self.company.id, timeout=60)
+        self.assertTrue(result['success'], result.get('message'))
+        by_method = fake.summary()['by_method']
+        self.assertEqual(by_method['batchUpdate']['calls'], 1)
+        self.assertEqual(by_method['values.batchUpdate']['calls'], 1)
+        self.assertLessEqual(by_method.get('get', {}).get('calls', 0), 1)  # sheet metadata, once per process
+        self.assertEqual(fake.summary()['errors'], 0)
+
+    def test_unchanged_data_makes_no_write_calls(self):
+        fake = FakeSheetsService()
+        with google_sheets_sync.use_service(fake):
+            google_sheets_sync.sync_all(company_id=self.company.id, timeout=60)
+            fake.reset_calls()
+            result = google_sheets_sync.sync_all(company_id=self.company.id, timeout=60)
+        self.assertTrue(result['success'], result.get('message'))
+        by_method = fake.summary()['by_method']
+        self.assertNotIn('batchUpdate', by_method)
+        self.assertNotIn('values.batchUpdate', by_method)
+
+
+class SyncPoolBackoffTests(SheetSyncTestCase):
+    def test_quota_error_backs_the_company_off(self):
+        fake = FakeSheetsService(quota_per_minute=0)  # every call answers 429
+        with google_sheets_sync.use_service(fake):
+            counts = sheet_sync_pool.run_sync_cycle()
+            self.assertEqual(counts['started'], 1)
+            _wait_idle(self.company.id)
+            failures, retry_after = sheet_sync_pool._backoff[self.company.id]
+            self.assertEqual(failures, 1)
+            self.assertGreater(retry_after, time.monotonic())
+            self.assertGreaterEqual(fake.summary()['errors'], 1)
+
+            # Still due (never synced) but backing off: no new sync and no API call
+            fake.reset_calls()
+            counts = sheet_sync_pool.run_sync_cycle()
+            self.assertEqual(counts['started'], 0)
+            self.assertEqual(counts['backoff'], 1)
+            self.assertEqual(fake.summary()['calls'], 0)
+
+    def test_successful_sync_clears_the_backoff(self):
+        with sheet_sync_pool._lock:
+            sheet_sync_pool._backoff[self.company.id] = (3, time.monotonic() - 1)  # retry time passed
+        fake = FakeSheetsService()
+        with google_sheets_sync.use_service(fake):
+            counts = sheet_sync_pool.run_sync_cycle()
+            self.assertEqual(counts['started'], 1)
+            _wait_idle(self.company.id)
+        self.assertNotIn(self.company.id, sheet_sync_pool._backoff)
+        self.assertEqual(fake.summary()['by_method']['values.batchUpdate']['calls'], 1)
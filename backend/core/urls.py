@@ -53,11 +53,15 @@ urlpatterns = [
     path('penalty/create/', views.PenaltyCreateView.as_view()),
     path('penalty/<int:pk>/', views.PenaltyDetailView.as_view()),
     path('reward-engine/run/', views.RunRewardEngineView.as_view()),
+    path('reward-engine/backfill/', views.RewardBackfillView.as_view()),
+    path('reward-engine/backfill/<str:token>/', views.RewardBackfillJobView.as_view()),
     path('settings/smtp/', views.EmailSmtpConfigView.as_view()),
     path('settings/google-sheet/', views.GoogleSheetConfigView.as_view()),
     path('settings/google-sheet/sync/', views.GoogleSheetSyncView.as_view()),
+    path('settings/google-sheet/sync/status/', views.GoogleSheetSyncStatusView.as_view()),
     path('settings/plant-report-email/', views.PlantReportEmailConfigView.as_view()),
     path('settings/plant-report-email/send-now/', views.PlantReportEmailSendNowView.as_view()),
+    path('settings/plant-report-email/download/', views.PlantReportDownloadView.as_view()),
     path('settings/plant-report-email/recipients/', views.PlantReportRecipientListCreateView.as_view()),
     path('settings/plant-report-email/recipients/<int:pk>/', views.PlantReportRecipientDetailView.as_view()),
     path('leaderboard/bonus/', views.GiveBonusView.as_view()),
@@ -69,6 +73,9 @@ urlpatterns = [
     path('export/payroll-excel/', views.ExportPayrollExcelView.as_view()),
     path('export/employee-salary-history/', views.ExportEmployeeSalaryHistoryView.as_view()),
     path('export/', views.ExportView.as_view()),
+    path('export/jobs/', views.ExportJobCreateView.as_view()),
+    path('export/jobs/<str:token>/', views.ExportJobDetailView.as_view()),
+    path('export/jobs/<str:token>/download/', views.ExportJobDownloadView.as_view()),
     path('employees/<str:emp_code>/profile/', views.EmployeeProfileView.as_view()),
     path('system-owner/dashboard/', views.SystemOwnerDashboardView.as_view()),
     path('system-owner/notifications/', views.SystemOwnerNotificationsView.as_view()),
@@ -1,4 +1,4 @@
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from rest_framework import viewsets, status
@@ -9,14 +9,15 @@ from django_filters.rest_framework import DjangoFilterBackend
 from django.db import transaction
 from django.db.models import Sum, Count, Q, Max
 from django.utils import timezone
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta
 from decimal import Decimal
 
 from django.conf import settings
 from .models import (
     Admin, Company, CompanyRegistrationRequest, Employee, Attendance, Salary, SalaryAdvance, Adjustment,
     ShiftOvertimeBonus, Penalty, PenaltyInquiry, PerformanceReward, Holiday,
-    LeaveRequest, SystemSetting, CompanySetting, PlantReportRecipient, EmailSmtpConfig, AuditLog
+    LeaveRequest, SystemSetting, CompanySetting, PlantReportRecipient, EmailSmtpConfig, AuditLog, ExportJob,
+    RewardBackfillJob,
 )
 from .serializers import (
     AdminSerializer, AdminProfileSerializer, AdminUpdateSerializer,
@@ -41,11 +42,13 @@ from .excel_upload import (
     build_shift_sample_rows,
     build_force_punch_sample_rows,
 )
-from .reward_engine import run_reward_engine
+from .reward_engine import run_scheduled_reward_engine
+from .salary_logic import gross_and_rate, period_pay_totals
 from .export_excel import generate_payroll_excel, generate_payroll_excel_previous_day
 from .audit_logging import log_activity, log_activity_manual
-from .google_sheets_sync import get_sheet_id, sync_all
+from .google_sheets_sync import get_sheet_id, get_sync_status
 from .settings_utils import get_company_setting, set_company_setting
+from . import work_calendar
 from .jwt_auth import encode_access, encode_refresh, encode_access_employee, encode_refresh_employee, decode_token
 
 
@@ -505,7 +508,7 @@ class EmployeeSalarySummaryView(APIView):
         total_hrs = float(sal.total_working_hours or 0)
         ot_hrs = float(sal.overtime_hours or 0)
         bonus = float(sal.bonus or 0)
-        gross, hr_rate = _gross_and_rate(salary_type, sal.base_salary, total_hrs, ot_hrs, bonus)
+        gross, hr_rate = gross_and_rate(salary_type, sal.base_salary, total_hrs, ot_hrs, bonus)
         # Earned from hours only (before adding bonus): Hourly = hrs×rate, Monthly/Fixed = base
         if salary_type.strip().lower() == 'hourly':
             earned_before_bonus = Decimal(str(total_hrs)) * Decimal(str(hr_rate))
@@ -603,7 +606,7 @@ class EmployeeLeaveBalanceView(APIView):
             from_date__year=year, to_date__year=year,
         )
         for lr in qs_approved:
-            days = (lr.to_date - lr.from_date).days + 1
+            days = work_calendar.working_days_between(lr.from_date, lr.to_date, company_id=emp.company_id)
             lt = lr.leave_type or 'casual'
             taken[lt] = taken.get(lt, 0) + days
         balance = {}
@@ -658,7 +661,7 @@ def _employee_payslip_data(emp_code, emp, y, m):
     total_hrs = float(sal.total_working_hours or 0)
     ot_hrs = float(sal.overtime_hours or 0)
     bonus = float(sal.bonus or 0)
-    gross, _ = _gross_and_rate(salary_type, sal.base_salary, total_hrs, ot_hrs, bonus)
+    gross, _ = gross_and_rate(salary_type, sal.base_salary, total_hrs, ot_hrs, bonus)
     if salary_type.strip().lower() == 'hourly':
         earned_before_bonus = Decimal(str(total_hrs)) * Decimal(str(sal.base_salary or 0))
     else:
@@ -838,7 +841,7 @@ def _admin_leave_balance_for_employee(emp_code, leave_type_key, year):
     allowance = int(emp_val) if emp_val is not None else _get_leave_allowance(f'{leave_type_key}_allowance_per_year', default)
     days_taken = 0
     for lr in LeaveRequest.objects.filter(emp_code=emp_code, status=LeaveRequest.STATUS_APPROVED, from_date__year=year, to_date__year=year, leave_type=leave_type_key):
-        days_taken += (lr.to_date - lr.from_date).days + 1
+        days_taken += work_calendar.working_days_between(lr.from_date, lr.to_date, company_id=emp.company_id)
     balance = max(0, allowance - days_taken)
     return allowance, days_taken, balance
 
@@ -866,7 +869,11 @@ class LeaveRequestAdminListView(APIView):
         today = timezone.localdate()
         year = today.year
         emp_codes = list({r['emp_code'] for r in data})
-        name_map = dict(Employee.objects.filter(emp_code__in=emp_codes).values_list('emp_code', 'name'))
+        name_map = {}
+        company_map = {}
+        for code, name, company_id in Employee.objects.filter(emp_code__in=emp_codes).values_list('emp_code', 'name', 'company_id'):
+            name_map[code] = name
+            company_map[code] = company_id
         for r in data:
             r['employee_name'] = name_map.get(r['emp_code']) or r['emp_code']
             from_d = r.get('from_date')
@@ -875,7 +882,7 @@ class LeaveRequestAdminListView(APIView):
                 try:
                     fd = date.fromisoformat(str(from_d))
                     td = date.fromisoformat(str(to_d))
-                    r['days_requested'] = (td - fd).days + 1
+                    r['days_requested'] = work_calendar.working_days_between(fd, td, company_id=company_map.get(r['emp_code']))
                 except (TypeError, ValueError):
                     r['days_requested'] = None
             else:
@@ -1261,13 +1268,13 @@ class UploadAttendanceView(APIView):
         # Auto-run reward engine and today attendance sync after actual upload (not preview)
         if not preview:
             try:
-                reward_result = run_reward_engine(company_id=company_id)
+                reward_result = _run_reward_engine_now(company_id)
                 result['rewards'] = reward_result
             except Exception:
                 pass
             try:
                 from .attendance_sync import run_today_attendance_sync
-                run_today_attendance_sync(force_absent=True)
+                run_today_attendance_sync(force_absent=True, company_id=company_id)
             except Exception:
                 pass
             log_activity(request, 'upload', 'upload', 'attendance', '', details={'filename': getattr(f, 'name', ''), 'result': result})
@@ -1306,7 +1313,7 @@ class UploadForcePunchView(APIView):
             try:
                 admin, _ = get_request_admin(request)
                 company_id = getattr(admin, 'company_id', None) if admin else None
-                reward_result = run_reward_engine(company_id=company_id)
+                reward_result = _run_reward_engine_now(company_id)
                 result['rewards'] = reward_result
             except Exception:
                 pass
@@ -1427,16 +1434,26 @@ class EmployeeViewSet(viewsets.ModelViewSet):
         serializer.save()
         obj = serializer.instance
         log_activity(self.request, 'create', 'employees', 'employee', obj.emp_code, details={'name': obj.name})
+        # Attendance uploaded before the employee existed moves out of the no-company rollup
+        from .dept_rollup import safe_mark_employees_stale
+        safe_mark_employees_stale([obj.emp_code], company_ids=(None,))
 
     def perform_update(self, serializer):
         obj = serializer.instance
         log_activity(self.request, 'update', 'employees', 'employee', obj.emp_code, details={'name': obj.name})
+        old_code, old_company_id = obj.emp_code, obj.company_id
         serializer.save()
+        # Department / rate / company may have changed: plant report rollup months for this employee
+        from .dept_rollup import safe_mark_employees_stale
+        safe_mark_employees_stale({old_code, serializer.instance.emp_code}, company_ids=(old_company_id, None))
 
     def perform_destroy(self, instance):
         ec, name = instance.emp_code, instance.name
+        company_id = instance.company_id
         log_activity(self.request, 'delete', 'employees', 'employee', ec, details={'name': name})
         instance.delete()
+        from .dept_rollup import safe_mark_employees_stale
+        safe_mark_employees_stale([ec], company_ids=(company_id,))
 
     @action(detail=False, methods=['get'], url_path='next_emp_code')
     def next_emp_code(self, request):
@@ -1468,12 +1485,8 @@ class AttendanceViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_fields = ['emp_code', 'status']
 
     def get_queryset(self):
-        today = timezone.localdate()
+        # Read-only: "punched in = Present" is enforced when rows are written (upload, adjust, Attendance.save)
         _, allowed_emp_codes = get_request_admin(self.request)
-        punch_in_update_qs = Attendance.objects.filter(date=today, punch_in__isnull=False).exclude(status='Present')
-        if allowed_emp_codes is not None:
-            punch_in_update_qs = punch_in_update_qs.filter(emp_code__in=allowed_emp_codes) if allowed_emp_codes else punch_in_update_qs.none()
-        punch_in_update_qs.update(status='Present')
         qs = super().get_queryset()
         if allowed_emp_codes is not None:
             qs = qs.filter(emp_code__in=allowed_emp_codes) if allowed_emp_codes else qs.none()
@@ -1600,16 +1613,23 @@ class HolidayViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save()
         obj = serializer.instance
+        work_calendar.invalidate(obj.date.year)
         log_activity(self.request, 'create', 'holidays', 'holiday', str(obj.date), details={'name': obj.name})
 
     def perform_update(self, serializer):
         obj = serializer.instance
+        old_year = obj.date.year
         log_activity(self.request, 'update', 'holidays', 'holiday', str(obj.date), details={'name': obj.name})
         serializer.save()
+        work_calendar.invalidate(old_year)
+        if serializer.instance.date.year != old_year:
+            work_calendar.invalidate(serializer.instance.date.year)
 
     def perform_destroy(self, instance):
         log_activity(self.request, 'delete', 'holidays', 'holiday', str(instance.date), details={'name': instance.name})
+        year = instance.date.year
         instance.delete()
+        work_calendar.invalidate(year)
 
 
 # Keys that can be overridden per company (bonus/penalty rules). Company-scoped admin sees and edits these for their company.
@@ -1617,6 +1637,8 @@ COMPANY_SETTING_KEYS = {
     'streak_days': 'Consecutive present days for streak reward',
     'weekly_overtime_threshold_hours': 'Min weekly OT hours for reward',
     'absent_streak_days': 'Consecutive absent days for red flag',
+    'weekly_off_days': 'Weekly off weekdays, comma-separated (Mon=0 .. Sun=6); default 6 = Sunday',
+    'absent_cutoff_time': 'Time (HH:MM) after which no-punch employees are marked Absent for today',
     # Penalty (late punch): Rs per minute
     'penalty_rate_per_minute_rs': 'Rs per minute late (until monthly threshold)',
     'penalty_monthly_threshold_rs': 'Monthly penalty threshold (Rs); after this, higher rate applies',
@@ -1687,6 +1709,8 @@ class SystemSettingViewSet(viewsets.ModelViewSet):
                 raise NotFound()
             value = (request.data.get('value') or '').strip()
             set_company_setting(key, value, company_id, description=COMPANY_SETTING_KEYS.get(key, ''))
+            if key == work_calendar.WEEKLY_OFF_KEY:
+                work_calendar.invalidate(company_id=company_id)
             log_activity(request, 'update', 'settings', 'setting', key, details={'company_id': company_id, 'value': value})
             return Response({
                 'key': key,
@@ -1708,6 +1732,8 @@ class SystemSettingViewSet(viewsets.ModelViewSet):
         obj = serializer.instance
         log_activity(self.request, 'update', 'settings', 'setting', obj.key, details={'value': obj.value})
         serializer.save()
+        if obj.key == work_calendar.WEEKLY_OFF_KEY:
+            work_calendar.invalidate()
 
     def perform_destroy(self, instance):
         log_activity(self.request, 'delete', 'settings', 'setting', instance.key, details={})
@@ -1785,7 +1811,9 @@ class GoogleSheetConfigView(APIView):
 
 
 class GoogleSheetSyncView(APIView):
-    """POST: trigger manual sync to current admin's company Google Sheet. Returns { success, message, last_sync }. Full access only.
+    """POST: start a manual sync of current admin's company Google Sheet in the background (or join the one running).
+    Returns 202 { success, message, job: { company_id, requested_at }, status } at once; poll GoogleSheetSyncStatusView
+    with since=requested_at for progress and the final result. Full access only.
     Only company-scoped admins can push (so the sheet gets only that company's data). System owner has no company_id so cannot push here."""
     def post(self, request):
         if not _full_settings_access(request):
@@ -1798,11 +1826,46 @@ class GoogleSheetSyncView(APIView):
                 'message': 'Push is available only for a company. Log in as a company admin (e.g. Tubematic) and use Settings → Push to Google Sheet now.',
                 'last_sync': None,
             }, status=400)
-        result = sync_all(force_full=True, company_id=company_id)
-        log_activity(request, 'export', 'settings', 'google_sheet_sync', '', details={**result, 'company_id': company_id})
-        if result['success']:
-            return Response(result, status=200)
-        return Response(result, status=400)
+        if not get_sheet_id(company_id=company_id):
+            return Response({
+                'success': False,
+                'message': 'Google Sheet ID not set. Set it in Settings or GOOGLE_SHEET_ID in .env.',
+                'last_sync': None,
+            }, status=400)
+        from .sheet_sync_pool import submit
+        requested_at = timezone.now()
+        _, joined = submit(company_id, force_full=True)
+        log_activity(request, 'export', 'settings', 'google_sheet_sync', '', details={'company_id': company_id, 'joined': joined})
+        return Response({
+            'success': True,
+            'message': 'Joined the sync already running.' if joined else 'Sync started.',
+            'job': {'company_id': company_id, 'requested_at': requested_at.isoformat()},
+            'status': get_sync_status(company_id, since=requested_at),
+        }, status=202)
+
+
+class GoogleSheetSyncStatusView(APIView):
+    """GET ?since=<requested_at from the sync POST>: { state (queued/running/done/failed), phase, sheets, elapsed_seconds,
+    last_result, last_sync } for current admin's company sheet. Full access only."""
+    def get(self, request):
+        if not _full_settings_access(request):
+            return Response({'error': 'Not allowed'}, status=403)
+        admin, _ = get_request_admin(request)
+        company_id = getattr(admin, 'company_id', None) if admin else None
+        if company_id is None:
+            return Response({'error': 'Sync status is available only for a company.'}, status=400)
+        since = None
+        raw = (request.query_params.get('since') or '').strip()
+        if raw:
+            try:
+                since = datetime.fromisoformat(raw)
+            except ValueError:
+                return Response({'error': 'since must be an ISO datetime'}, status=400)
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+        result = get_sync_status(company_id, since=since)
+        result['last_sync'] = get_company_setting('google_sheet_last_sync', company_id=company_id, default='') or None
+        return Response(result)
 
 
 # ---------- Plant Report daily email (recipients + send time in DB) ----------
@@ -1944,6 +2007,31 @@ class PlantReportEmailSendNowView(APIView):
         return Response(result, status=200 if result.get('success') else 400)
 
 
+class PlantReportDownloadView(APIView):
+    """GET ?type=xlsx|png: the Plant Report (Previous day) as emailed; reuses the file rendered by the email / send now.
+    Not ?format=: DRF reads that as its renderer override and answers 404 before get() runs."""
+    def get(self, request):
+        from django.http import FileResponse
+        from .plant_report_email import FORMATS, plant_report_file
+        if not _plant_report_email_settings_access(request):
+            return Response({'error': 'Not allowed'}, status=403)
+        fmt = request.query_params.get('type', 'xlsx').strip().lower()
+        if fmt not in FORMATS:
+            return Response({'error': f"type must be one of: {', '.join(FORMATS)}"}, status=400)
+        try:
+            f, hit = plant_report_file(fmt)
+        except Exception as e:
+            return Response({'error': str(e)}, status=500)
+        if f is None:
+            return Response({'error': 'Plant Report image not available (no data or Pillow not installed)'}, status=404)
+        suffix, content_type = FORMATS[fmt]
+        filename = f"Plant_Report_{(timezone.localdate() - timedelta(days=1)).strftime('%d_%m_%Y')}{suffix}"
+        log_activity(request, 'export', 'settings', 'plant_report_download', '', details={'format': fmt, 'cached': hit})
+        response = FileResponse(f, as_attachment=True, filename=filename, content_type=content_type)
+        response['X-Export-Cache'] = 'hit' if hit else 'miss'
+        return response
+
+
 # ---------- Attendance Adjust (audit trail) ----------
 def _time_to_decimal_hours(t):
     """Convert time to decimal hours (e.g. 09:30 -> 9.5)."""
@@ -2075,6 +2163,10 @@ class AttendanceAdjustView(APIView):
             created_by_admin=admin_name,
         )
         log_activity(request, 'adjust', 'attendance', 'attendance', emp_code, details={'date': str(adj_date), 'by': admin_name})
+        from .streak_state import safe_update_streak_state
+        from .dept_rollup import safe_mark_dates_stale
+        safe_update_streak_state([(emp_code, att.date)])
+        safe_mark_dates_stale([(emp_code, att.date)])
         from .shift_bonus import recalculate_shift_overtime_bonus_for_date
         from .penalty_logic import recalculate_late_penalty_for_date, _minutes_late
         recalculate_shift_overtime_bonus_for_date(emp_code, adj_date)
@@ -2098,31 +2190,35 @@ class AttendanceAdjustView(APIView):
 
 
 # ---------- Dashboard ----------
-class DashboardView(APIView):
-    _last_reward_run_date = None  # class-level cache to avoid running every request
+def _reward_engine_freshness(company_id):
+    """Last scheduled reward engine run for the dashboard. System owner (no company) sees the oldest company run."""
+    from .reward_engine import get_reward_engine_last_run, get_reward_engine_last_result
+    if company_id is not None:
+        last = get_reward_engine_last_run(company_id)
+        result = get_reward_engine_last_result(company_id)
+    else:
+        runs = [get_reward_engine_last_run(cid) for cid in Company.objects.values_list('id', flat=True)] or [get_reward_engine_last_run(None)]
+        last = None if any(r is None for r in runs) else min(runs)
+        result = ''
+    return {
+        'last_run': last.isoformat() if last else None,
+        'is_fresh': bool(last) and timezone.localtime(last).date() == timezone.localdate(),
+        'result': result,
+    }
 
+
+class DashboardView(APIView):
     def get(self, request):
         current_admin, allowed_emp_codes = get_request_admin(request)
         today = timezone.localdate()
         emp_filter = Q()
         if allowed_emp_codes is not None:
             emp_filter = Q(emp_code__in=allowed_emp_codes) if allowed_emp_codes else Q(pk=None)
-        # Auto-run reward engine once per day on first dashboard load (super only, for all companies)
-        if current_admin and current_admin.is_super_admin and DashboardView._last_reward_run_date != today:
-            try:
-                run_reward_engine(today, company_id=None)
-                DashboardView._last_reward_run_date = today
-            except Exception:
-                pass
         total_employees = Employee.objects.filter(emp_filter).count()  # all (including Inactive)
         active_employees = Employee.objects.filter(status__in=Employee.EMPLOYED_STATUSES).filter(emp_filter).count()  # not Inactive
         att_qs = Attendance.objects.filter(date=today)
         if allowed_emp_codes is not None:
             att_qs = att_qs.filter(emp_filter)
-        punch_in_update_qs = Attendance.objects.filter(date=today, punch_in__isnull=False).exclude(status='Present')
-        if allowed_emp_codes is not None:
-            punch_in_update_qs = punch_in_update_qs.filter(emp_filter)
-        punch_in_update_qs.update(status='Present')
         today_present = att_qs.filter(Q(punch_in__isnull=False) | Q(status='Present')).count()
         today_absent = max(active_employees - today_present, 0)  # absent among active (expected to work)
         week_start = today - timedelta(days=6)
@@ -2161,31 +2257,19 @@ class DashboardView(APIView):
             'overtime_leaders': ot_leaders,
             'red_flag_employees': red_flags,
             'streak_rewards': streak_list,
+            'reward_engine': _reward_engine_freshness(getattr(current_admin, 'company_id', None) if current_admin else None),
         })
 
 
-# ---------- Salary gross logic ----------
-# Hourly: (total_working_hours + bonus_hours) × per_hour_rate. OT → bonus hours.
-# Monthly: base_salary + (bonus_hours × hourly_rate). hourly_rate = base/208.
-# Fixed: base_salary + (bonus_hours × hourly_rate). Bonus only when given by admin/leaderboard etc.
-def _gross_and_rate(salary_type, base_salary, total_working_hours, overtime_hours, bonus_hours):
-    """Returns (gross, hourly_rate). bonus_hours is stored in Salary.bonus."""
-    base = Decimal(str(base_salary or 0))
-    total_hrs = Decimal(str(total_working_hours or 0))
-    bonus = Decimal(str(bonus_hours or 0))
-    st = (salary_type or '').strip()
-    if st == 'Hourly':
-        hourly_rate = base
-        gross = (total_hrs + bonus) * base
-        return (gross, hourly_rate)
-    if st == 'Fixed':
-        hourly_rate = base / Decimal('208') if base else Decimal('0')
-        gross = base + (bonus * hourly_rate)
-        return (gross, hourly_rate)
-    # Monthly: full monthly + bonus hours at hourly rate
-    hourly_rate = base / Decimal('208') if base else Decimal('0')
-    gross = base + (bonus * hourly_rate)
-    return (gross, hourly_rate)
+def _add_salary_pay_columns(sal_list, emp_code):
+    """Set advance_total, penalty_deduction, gross_salary and net_pay on one employee's serialized Salary rows."""
+    pay = period_pay_totals([(row.get('month'), row.get('year')) for row in sal_list], emp_codes=[emp_code])
+    for row in sal_list:
+        p = pay[(emp_code, row.get('month'), row.get('year'))]
+        row['advance_total'] = str(p['advance'])
+        row['penalty_deduction'] = str(p['penalty_deduction'])
+        row['gross_salary'] = str(round(p['gross'], 2))
+        row['net_pay'] = str(p['net'])
 
 
 # ---------- Salary monthly (compute or return stored) ----------
@@ -2213,14 +2297,7 @@ class SalaryMonthlyView(APIView):
             emp_codes = list(emp_qs.values_list('emp_code', flat=True))
             salaries = salaries.filter(emp_code__in=emp_codes)
         data = SalarySerializer(salaries.order_by('emp_code'), many=True).data
-        advance_by_emp = get_advance_totals_by_emp(month=month, year=year)
-        if allowed_emp_codes is not None:
-            advance_by_emp = {k: v for k, v in advance_by_emp.items() if k in allowed_emp_codes} if allowed_emp_codes else {}
-        penalty_by_emp = {}
-        for r in Penalty.objects.filter(month=month, year=year).values('emp_code').annotate(total=Sum('deduction_amount')):
-            penalty_by_emp[r['emp_code']] = r['total'] or Decimal('0')
-        if allowed_emp_codes is not None:
-            penalty_by_emp = {k: v for k, v in penalty_by_emp.items() if k in allowed_emp_codes} if allowed_emp_codes else {}
+        pay = period_pay_totals([(month, year)], emp_codes=allowed_emp_codes)
         today = timezone.localdate()
         # Earned so far (money from hours worked from 1st of month up to today)
         from calendar import monthrange
@@ -2289,21 +2366,14 @@ class SalaryMonthlyView(APIView):
             dp = row.get('days_present', 0)
             twh = float(row.get('total_working_hours', 0) or 0)
             row['avg_daily_hours'] = str(round(twh / dp, 2)) if dp > 0 else '0'
-            # Advance total for this month
-            advance_total = advance_by_emp.get(ec, Decimal('0'))
-            row['advance_total'] = str(advance_total)
-            # Gross: bonus is always HOURS; bonus money = bonus_hours × hourly_rate (same for all types)
-            gross, hourly_rate = _gross_and_rate(
-                row.get('salary_type'),
-                row.get('base_salary'),
-                row.get('total_working_hours'),
-                row.get('overtime_hours'),
-                row.get('bonus'),
-            )
-            row['gross_salary'] = str(round(gross, 2))
-            penalty_total = penalty_by_emp.get(ec, Decimal('0')) if (row.get('salary_type') or '').strip() == 'Hourly' else Decimal('0')
-            row['penalty_deduction'] = str(penalty_total)
-            row['net_pay'] = str(round(gross - advance_total - penalty_total, 2))
+            # Advance, penalty (Hourly only) and net for this month; gross: bonus is always HOURS,
+            # bonus money = bonus_hours × hourly_rate (same for all types)
+            p = pay[(ec, month, year)]
+            hourly_rate = p['hourly_rate']
+            row['advance_total'] = str(p['advance'])
+            row['gross_salary'] = str(round(p['gross'], 2))
+            row['penalty_deduction'] = str(p['penalty_deduction'])
+            row['net_pay'] = str(p['net'])
             # Earned so far (from 1st of month up to today, based on hours worked)
             so_far = earned_so_far_by_emp.get(ec, {'total_hrs': Decimal('0'), 'total_ot': Decimal('0')})
             hrs_so_far = so_far['total_hrs'] + so_far['total_ot']
@@ -2313,21 +2383,6 @@ class SalaryMonthlyView(APIView):
 
 
 # ---------- Salary Advance ----------
-def get_advance_totals_by_emp(month=None, year=None, month_year_list=None):
-    """Return dict emp_code -> total advance amount. Either (month, year) or month_year_list [(m,y), ...]."""
-    from django.db.models import Sum
-    if month is not None and year is not None:
-        qs = SalaryAdvance.objects.filter(month=month, year=year).values('emp_code').annotate(total=Sum('amount'))
-    elif month_year_list:
-        q = Q()
-        for m, y in month_year_list:
-            q = q | Q(month=m, year=y)
-        qs = SalaryAdvance.objects.filter(q).values('emp_code').annotate(total=Sum('amount'))
-    else:
-        return {}
-    return {r['emp_code']: (r['total'] or Decimal('0')) for r in qs}
-
-
 class SalaryAdvanceListCreateView(APIView):
     def get(self, request):
         _, allowed_emp_codes = get_request_admin(request)
@@ -2529,6 +2584,8 @@ class GiveBonusView(APIView):
         )
         sal.bonus = (sal.bonus or Decimal('0')) + bonus_hours
         sal.save()
+        from .dept_rollup import safe_mark_months_stale
+        safe_mark_months_stale([(emp_code, year, month)])
         log_activity(request, 'update', 'bonus', 'salary', emp_code, details={'action': 'give_bonus', 'hours': str(bonus_hours), 'new_bonus': str(sal.bonus), 'month': month, 'year': year})
         return Response({'success': True, 'emp_code': emp_code, 'new_bonus': str(sal.bonus)})
 
@@ -2579,6 +2636,8 @@ class GiveBonusBulkView(APIView):
                 awarded += 1
             except Exception as e:
                 errors.append({'emp_code': emp_code, 'reason': str(e)})
+        from .dept_rollup import safe_mark_months_stale
+        safe_mark_months_stale((str(c).strip(), year, month) for c in emp_codes if c)
         return Response({'success': True, 'awarded': awarded, 'skipped': len(errors), 'errors': errors})
 
 
@@ -2856,6 +2915,8 @@ class SetBonusView(APIView):
         )
         sal.bonus = bonus_hours
         sal.save()
+        from .dept_rollup import safe_mark_months_stale
+        safe_mark_months_stale([(emp_code, year, month)])
         log_activity(request, 'update', 'bonus', 'salary', emp_code, details={'action': 'set_bonus', 'bonus_hours': str(bonus_hours), 'month': month, 'year': year})
         return Response({'success': True, 'emp_code': emp_code, 'new_bonus': str(sal.bonus)})
 
@@ -3014,33 +3075,113 @@ class PenaltyDetailView(APIView):
 
 
 # ---------- Run reward engine (manual trigger) ----------
+def _run_reward_engine_now(company_id):
+    """
+    Run the reward engine for today now, through the scheduled run (same single-flight lock and last-run record).
+    company_id None (system owner) = every company. Returns summed {'streak', 'overtime', 'absentee'}, or None
+    when the scheduled run holds the lock.
+    """
+    results = run_scheduled_reward_engine(force=True, company_ids=None if company_id is None else [company_id])
+    if 'skipped' in results:
+        return None
+    totals = {'streak': 0, 'overtime': 0, 'absentee': 0}
+    for result in results.values():
+        for k in totals:
+            totals[k] += result[k]
+    return totals
+
+
 class RunRewardEngineView(APIView):
     def post(self, request):
         admin, _ = get_request_admin(request)
         company_id = getattr(admin, 'company_id', None) if admin else None
-        result = run_reward_engine(company_id=company_id)
-        log_activity(request, 'run', 'rewards', 'reward_engine', '', details={**(result if isinstance(result, dict) else {'created': result}), 'company_id': company_id})
+        result = _run_reward_engine_now(company_id)
+        if result is None:
+            return Response({'error': 'Reward engine is already running, try again in a moment'}, status=409)
+        log_activity(request, 'run', 'rewards', 'reward_engine', '', details={**result, 'company_id': company_id})
         return Response({'success': True, 'created': result})
 
 
+class RewardBackfillView(APIView):
+    """POST { date_from, date_to }: queue the reward engine over a past date range for the admin's company and
+    employees (every company for the system owner). Full access only. 202 with the job; poll reward-engine/backfill/<token>/."""
+    MAX_DAYS = 366
+
+    def post(self, request):
+        if not _full_settings_access(request):
+            return Response({'error': 'Not allowed'}, status=403)
+        admin, allowed_emp_codes = get_request_admin(request)
+        try:
+            start = date.fromisoformat(str(request.data.get('date_from') or '').strip())
+            end = date.fromisoformat(str(request.data.get('date_to') or '').strip())
+        except ValueError:
+            return Response({'error': 'date_from and date_to must be YYYY-MM-DD'}, status=400)
+        if end < start:
+            return Response({'error': 'date_to must be on or after date_from'}, status=400)
+        if end >= timezone.localdate():
+            return Response({'error': 'date_to must be before today'}, status=400)
+        if (end - start).days + 1 > self.MAX_DAYS:
+            return Response({'error': f'Range too long (max {self.MAX_DAYS} days)'}, status=400)
+        from . import reward_backfill
+        try:
+            job, joined = reward_backfill.submit_job(start, end, admin, allowed_emp_codes)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=409)
+        if not joined:
+            log_activity(request, 'run', 'rewards', 'reward_backfill', f'{start}..{end}', details={
+                'company_id': job.company_id, 'job': job.token[:8],
+            })
+        return Response({'success': True, 'joined': joined, 'job': reward_backfill.job_status(job)}, status=202)
+
+
+class RewardBackfillJobView(APIView):
+    """GET: status, progress and (once done) streak / overtime / absentee counts of a reward backfill job."""
+    def get(self, request, token):
+        from . import reward_backfill
+        if not _full_settings_access(request):
+            return Response({'error': 'Not allowed'}, status=403)
+        job = RewardBackfillJob.objects.filter(token=token).first()
+        if not job:
+            return Response({'error': 'Not found'}, status=404)
+        return Response(reward_backfill.job_status(job))
+
+
 # ---------- Export ----------
+def _cached_export(report, params, admin, allowed_emp_codes, suffix, build):
+    """(file, hit): the export from core.export_cache, or build() (returns a file) stored into it."""
+    from . import export_cache
+    company_id = getattr(admin, 'company_id', None) if admin else None
+    key = export_cache.make_key(report, params, company_id=company_id, allowed_emp_codes=allowed_emp_codes)
+    cached = export_cache.get(key, suffix)
+    if cached is not None:
+        return cached, True
+    return export_cache.put(key, suffix, build()), False
+
+
 class ExportPayrollExcelView(APIView):
-    """Export payroll-style Excel (Department, Status, date columns = daily earnings, TOTAL, Advance)."""
+    """Export payroll-style Excel (Department, Status, date columns = daily earnings, TOTAL, Advance).
+    The workbook is streamed from a file (FileResponse closes it when sent); repeat downloads with unchanged
+    data come from the export cache (X-Export-Cache: hit)."""
+    XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
     def get(self, request):
-        from django.http import HttpResponse
-        _, allowed_emp_codes = get_request_admin(request)
+        from django.http import FileResponse
+        admin, allowed_emp_codes = get_request_admin(request)
         previous_day = request.query_params.get('previous_day', '').strip().lower() in ('1', 'true', 'yes')
         if previous_day:
+            from django.utils import timezone
+            yesterday = timezone.localdate() - timedelta(days=1)
             try:
-                buf = generate_payroll_excel_previous_day(allowed_emp_codes=allowed_emp_codes)
+                buf, hit = _cached_export(
+                    'payroll_previous_day', {'date': yesterday}, admin, allowed_emp_codes, '.xlsx',
+                    lambda: generate_payroll_excel_previous_day(allowed_emp_codes=allowed_emp_codes),
+                )
             except Exception as e:
                 return Response({'error': str(e)}, status=500)
-            from django.utils import timezone
-            yesterday = timezone.localdate() - timedelta(days=1)
             filename = f'payroll_previous_day_{yesterday.isoformat()}.xlsx'
-            log_activity(request, 'export', 'export', 'payroll', '', details={'type': 'previous_day', 'filename': filename})
-            response = HttpResponse(buf.getvalue(), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-            response['Content-Disposition'] = f'attachment; filename="{filename}"'
+            log_activity(request, 'export', 'export', 'payroll', '', details={'type': 'previous_day', 'filename': filename, 'cached': hit})
+            response = FileResponse(buf, as_attachment=True, filename=filename, content_type=self.XLSX_CONTENT_TYPE)
+            response['X-Export-Cache'] = 'hit' if hit else 'miss'
             return response
 
         month = request.query_params.get('month', '').strip()
@@ -3073,13 +3214,17 @@ class ExportPayrollExcelView(APIView):
 
         if emp_code_param and allowed_emp_codes is not None and emp_code_param not in allowed_emp_codes:
             return Response({'error': 'Not allowed to export this employee'}, status=403)
+        params = {
+            'date_from': d_from, 'date_to': d_to, 'date': d_single,
+            'month': month, 'year': year, 'emp_code': emp_code_param or None,
+        }
         try:
-            buf = generate_payroll_excel(
+            buf, hit = _cached_export('payroll', params, admin, allowed_emp_codes, '.xlsx', lambda: generate_payroll_excel(
                 date_from=d_from, date_to=d_to, single_date=d_single,
                 month=month, year=year,
                 allowed_emp_codes=allowed_emp_codes,
                 emp_code=emp_code_param or None
-            )
+            ))
         except Exception as e:
             return Response({'error': str(e)}, status=500)
 
@@ -3100,9 +3245,9 @@ class ExportPayrollExcelView(APIView):
             filename = f'payroll_{d_single.isoformat()}.xlsx'
         elif d_from or d_to:
             filename = 'payroll_range.xlsx'
-        log_activity(request, 'export', 'export', 'payroll', '', details={'filename': filename, 'month': month, 'year': year})
-        response = HttpResponse(buf.getvalue(), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        log_activity(request, 'export', 'export', 'payroll', '', details={'filename': filename, 'month': month, 'year': year, 'cached': hit})
+        response = FileResponse(buf, as_attachment=True, filename=filename, content_type=self.XLSX_CONTENT_TYPE)
+        response['X-Export-Cache'] = 'hit' if hit else 'miss'
         return response
 
 
@@ -3122,26 +3267,7 @@ class ExportEmployeeSalaryHistoryView(APIView):
             return Response({'error': 'Employee not found'}, status=404)
         salaries = Salary.objects.filter(emp_code=emp_code).order_by('-year', '-month')
         sal_list = list(SalarySerializer(salaries, many=True).data)
-        for row in sal_list:
-            m, y = row.get('month'), row.get('year')
-            adv = get_advance_totals_by_emp(month=m, year=y)
-            advance_total = adv.get(emp_code, Decimal('0'))
-            row['advance_total'] = str(advance_total)
-            penalty_total = Decimal('0')
-            if (row.get('salary_type') or '').strip() == 'Hourly':
-                agg = Penalty.objects.filter(emp_code=emp_code, month=m, year=y).aggregate(s=Sum('deduction_amount'))
-                if agg.get('s') is not None:
-                    penalty_total = agg['s']
-            row['penalty_deduction'] = str(penalty_total)
-            gross, _ = _gross_and_rate(
-                row.get('salary_type'),
-                row.get('base_salary'),
-                row.get('total_working_hours'),
-                row.get('overtime_hours'),
-                row.get('bonus'),
-            )
-            row['gross_salary'] = str(round(gross, 2))
-            row['net_pay'] = str(round(gross - advance_total - penalty_total, 2))
+        _add_salary_pay_columns(sal_list, emp_code)
         fieldnames = ['emp_code', 'name', 'month', 'year', 'salary_type', 'base_salary', 'days_present',
                       'total_working_hours', 'overtime_hours', 'bonus', 'advance_total', 'penalty_deduction',
                       'gross_salary', 'net_pay']
@@ -3158,14 +3284,129 @@ class ExportEmployeeSalaryHistoryView(APIView):
         return response
 
 
+ATTENDANCE_EXPORT_FIELDS = [
+    'Date', 'Employee Code', 'Employee Name', 'Punch In', 'Punch Out', 'Status',
+    'Working Hours', 'Break (hrs)', 'Overtime', 'Shift', 'Shift Start', 'Shift End', 'Punch to next day',
+    'Penalty (this day)', 'Minutes late (this day)',
+    'Advance (month)', 'Penalty (month)', 'To be paid (month)'
+]
+EXPORT_CHUNK_ROWS = 2000  # attendance rows per server-side cursor fetch / streamed CSV chunk
+
+
+def _csv_value(v):
+    if v is None:
+        return ''
+    if hasattr(v, 'isoformat'):
+        s = v.isoformat()
+        # Date only: YYYY-MM-DD (strip time if present)
+        if 'T' in s:
+            s = s.split('T')[0]
+        elif len(s) > 10 and s[10:11] == ' ':
+            s = s.split(' ')[0]
+        return s
+    if hasattr(v, 'hour'):  # time object
+        return v.strftime('%H:%M') if v else ''
+    return str(v)
+
+
+def _export_csv_filename(report, emp_code_filter):
+    if emp_code_filter:
+        safe_emp = ''.join(c for c in emp_code_filter if c.isalnum() or c in '-_')[:30] or 'employee'
+        return f'{report}_{safe_emp}.csv'
+    return f'{report}.csv'
+
+
+def _attendance_penalty_by_date(month_qs, m, y):
+    """Penalty per (emp_code, date) -> {'amount', 'minutes_late'} for one month of an attendance export, limited to the emp codes in month_qs."""
+    penalty_by_date = {}  # sum amount if multiple
+    for p in Penalty.objects.filter(emp_code__in=month_qs.values('emp_code'), date__year=y, date__month=m).values(
+        'emp_code', 'date', 'deduction_amount', 'minutes_late'
+    ):
+        key = (p['emp_code'], p['date'])
+        amt = p.get('deduction_amount') or Decimal('0')
+        mins = p.get('minutes_late') or 0
+        if key not in penalty_by_date:
+            penalty_by_date[key] = {'amount': amt, 'minutes_late': mins}
+        else:
+            penalty_by_date[key]['amount'] += amt
+            penalty_by_date[key]['minutes_late'] = max(penalty_by_date[key]['minutes_late'], mins)
+    return penalty_by_date
+
+
+def _attendance_export_rows(qs):
+    """
+    Yield one value list per attendance row (ATTENDANCE_EXPORT_FIELDS order), newest month first.
+    Advance / penalty / gross per employee and month for all exported months come from one
+    period_pay_totals call; then month by month the day penalties are looked up and the rows are read
+    through a server-side cursor (.iterator), so memory holds the pay map, one month's penalties and
+    one fetch chunk, not the whole export.
+    """
+    from .export_jobs import report_progress
+    months = list(qs.dates('date', 'month', order='DESC'))
+    pay = period_pay_totals([(d.month, d.year) for d in months], emp_codes=qs.values('emp_code')) if months else {}
+    no_pay = {'advance': Decimal('0'), 'penalty': Decimal('0'), 'gross': None}
+    for i, month_start in enumerate(months):
+        m, y = month_start.month, month_start.year
+        report_progress(i / len(months), f'{y}-{m:02d}')
+        month_qs = qs.filter(date__year=y, date__month=m)
+        penalty_by_date = _attendance_penalty_by_date(month_qs, m, y)
+        # Newest first so all dates of an employee are easy to read (no limit – full set)
+        for r in month_qs.order_by('-date', 'emp_code').values(
+            'date', 'emp_code', 'name', 'punch_in', 'punch_out', 'status',
+            'total_working_hours', 'total_break', 'over_time',
+            'shift', 'shift_from', 'shift_to', 'punch_spans_next_day'
+        ).iterator(chunk_size=EXPORT_CHUNK_ROWS):
+            ec = r['emp_code']
+            penalty_today = penalty_by_date.get((ec, r['date']), {})
+            p = pay.get((ec, m, y), no_pay)
+            # To be paid here deducts every penalty of the month (salary pages: Hourly only)
+            to_be_paid = round(p['gross'] - p['advance'] - p['penalty'], 2) if p['gross'] is not None else ''
+            yield [
+                r['date'], ec, r['name'], r['punch_in'], r['punch_out'], r['status'],
+                r['total_working_hours'], r['total_break'], r['over_time'],
+                r['shift'], r['shift_from'], r['shift_to'],
+                'Yes' if r['punch_spans_next_day'] else 'No',
+                penalty_today.get('amount', Decimal('0')),
+                penalty_today.get('minutes_late', ''),
+                p['advance'],
+                p['penalty'],
+                to_be_paid,
+            ]
+
+
+class _CsvLineBuffer:
+    """File-like target for csv.writer that hands back each written line."""
+    def write(self, value):
+        return value
+
+
+def _attendance_csv_stream(qs):
+    """CSV text chunks for StreamingHttpResponse: header first, then EXPORT_CHUNK_ROWS rows per chunk."""
+    import csv
+    writer = csv.writer(_CsvLineBuffer())
+    yield writer.writerow(ATTENDANCE_EXPORT_FIELDS)
+    lines = []
+    for values in _attendance_export_rows(qs):
+        lines.append(writer.writerow([_csv_value(v) for v in values]))
+        if len(lines) >= EXPORT_CHUNK_ROWS:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
 class ExportView(APIView):
+    """GET ?report=employees|attendance&type=csv|json, or report=attendance|salary|penalty|bonus&type=parquet|arrow
+    (typed columnar file for analytics, see core.export_arrow). Optional date_from, date_to, emp_code."""
     def get(self, request):
-        _, allowed_emp_codes = get_request_admin(request)
+        admin, allowed_emp_codes = get_request_admin(request)
         export_type = request.query_params.get('type', 'csv')
         report = request.query_params.get('report', 'attendance')
         date_from = request.query_params.get('date_from', '').strip()
         date_to = request.query_params.get('date_to', '').strip()
         emp_code_filter = request.query_params.get('emp_code', '').strip()
+        if export_type in ('parquet', 'arrow'):
+            return self._columnar(request, admin, allowed_emp_codes, export_type, report, date_from, date_to, emp_code_filter)
         if report == 'employees':
             qs = Employee.objects.all()
             if allowed_emp_codes is not None:
@@ -3188,103 +3429,27 @@ class ExportView(APIView):
                 qs = qs.filter(date__gte=date_from)
             if date_to:
                 qs = qs.filter(date__lte=date_to)
-            # Newest first so all dates of an employee are easy to read (no limit – full set)
-            qs = qs.order_by('-date', 'emp_code')
-            raw_rows = list(qs.values(
-                'date', 'emp_code', 'name', 'punch_in', 'punch_out', 'status',
-                'total_working_hours', 'total_break', 'over_time',
-                'shift', 'shift_from', 'shift_to', 'punch_spans_next_day'
-            ))
-            # Per (emp_code, date): penalty on that day (amount, minutes late) – sum amount if multiple
-            date_keys = set((r['emp_code'], r['date']) for r in raw_rows)
-            penalty_by_date = {}  # (emp_code, date) -> {'amount': Decimal, 'minutes_late': int}
-            if date_keys:
-                emp_codes = set(k[0] for k in date_keys)
-                dates = set(k[1] for k in date_keys)
-                for p in Penalty.objects.filter(emp_code__in=emp_codes, date__in=dates).values(
-                    'emp_code', 'date', 'deduction_amount', 'minutes_late'
-                ):
-                    key = (p['emp_code'], p['date'])
-                    amt = p.get('deduction_amount') or Decimal('0')
-                    mins = p.get('minutes_late') or 0
-                    if key not in penalty_by_date:
-                        penalty_by_date[key] = {'amount': amt, 'minutes_late': mins}
-                    else:
-                        penalty_by_date[key]['amount'] += amt
-                        penalty_by_date[key]['minutes_late'] = max(penalty_by_date[key]['minutes_late'], mins)
-            # Per (emp_code, month, year): advance, penalty total, to_be_paid (net for that month)
-            periods = set((r['date'].month, r['date'].year) for r in raw_rows)
-            advance_map = {}  # (emp_code, month, year) -> advance total
-            penalty_map = {}  # (emp_code, month, year) -> penalty total
-            to_be_paid_map = {}  # (emp_code, month, year) -> net pay
-            for (m, y) in periods:
-                adv = get_advance_totals_by_emp(month=m, year=y)
-                if allowed_emp_codes is not None:
-                    adv = {k: v for k, v in adv.items() if k in allowed_emp_codes}
-                pen_qs = Penalty.objects.filter(month=m, year=y).values('emp_code').annotate(total=Sum('deduction_amount'))
-                pen = {r['emp_code']: (r['total'] or Decimal('0')) for r in pen_qs}
-                if allowed_emp_codes is not None:
-                    pen = {k: v for k, v in pen.items() if k in allowed_emp_codes}
-                emp_codes_in_period = set(r['emp_code'] for r in raw_rows if (r['date'].month, r['date'].year) == (m, y))
-                for ec in emp_codes_in_period:
-                    advance_map[(ec, m, y)] = adv.get(ec, Decimal('0'))
-                    penalty_map[(ec, m, y)] = pen.get(ec, Decimal('0'))
-                # Gross and to_be_paid from Salary for this month
-                sal_list = list(Salary.objects.filter(month=m, year=y, emp_code__in=emp_codes_in_period).values(
-                    'emp_code', 'salary_type', 'base_salary', 'total_working_hours', 'overtime_hours', 'bonus'
-                ))
-                for s in sal_list:
-                    ec = s['emp_code']
-                    gross, _ = _gross_and_rate(
-                        s.get('salary_type'),
-                        s.get('base_salary'),
-                        s.get('total_working_hours'),
-                        s.get('overtime_hours'),
-                        s.get('bonus'),
-                    )
-                    adv_val = advance_map.get((ec, m, y), Decimal('0'))
-                    pen_val = penalty_map.get((ec, m, y), Decimal('0'))
-                    to_be_paid_map[(ec, m, y)] = round(gross - adv_val - pen_val, 2)
-            # Easy-to-read column order and headers for attendance (with penalty this day, advance, penalty month, to be paid)
-            fieldnames = [
-                'Date', 'Employee Code', 'Employee Name', 'Punch In', 'Punch Out', 'Status',
-                'Working Hours', 'Break (hrs)', 'Overtime', 'Shift', 'Shift Start', 'Shift End', 'Punch to next day',
-                'Penalty (this day)', 'Minutes late (this day)',
-                'Advance (month)', 'Penalty (month)', 'To be paid (month)'
-            ]
-            rows = []
-            for r in raw_rows:
-                d = r.get('date')
-                ec = r.get('emp_code')
-                m, y = d.month, d.year
-                key = (ec, m, y)
-                date_key = (ec, d)
-                penalty_today = penalty_by_date.get(date_key, {})
-                penalty_amount_today = penalty_today.get('amount', Decimal('0'))
-                minutes_late_today = penalty_today.get('minutes_late', '')
-                advance_val = advance_map.get(key, Decimal('0'))
-                penalty_val = penalty_map.get(key, Decimal('0'))
-                to_be_paid_val = to_be_paid_map.get(key, '')
-                rows.append({
-                    'Date': d,
-                    'Employee Code': ec,
-                    'Employee Name': r.get('name'),
-                    'Punch In': r.get('punch_in'),
-                    'Punch Out': r.get('punch_out'),
-                    'Status': r.get('status'),
-                    'Working Hours': r.get('total_working_hours'),
-                    'Break (hrs)': r.get('total_break'),
-                    'Overtime': r.get('over_time'),
-                    'Shift': r.get('shift'),
-                    'Shift Start': r.get('shift_from'),
-                    'Shift End': r.get('shift_to'),
-                    'Punch to next day': 'Yes' if r.get('punch_spans_next_day') else 'No',
-                    'Penalty (this day)': penalty_amount_today,
-                    'Minutes late (this day)': minutes_late_today,
-                    'Advance (month)': advance_val,
-                    'Penalty (month)': penalty_val,
-                    'To be paid (month)': to_be_paid_val,
-                })
+            if export_type == 'csv':
+                from django.http import FileResponse
+                from . import export_cache
+                csv_filename = _export_csv_filename(report, emp_code_filter)
+                key = export_cache.make_key(
+                    'attendance_csv', {'date_from': date_from, 'date_to': date_to, 'emp_code': emp_code_filter},
+                    company_id=getattr(admin, 'company_id', None) if admin else None, allowed_emp_codes=allowed_emp_codes,
+                )
+                cached = export_cache.get(key, '.csv')
+                log_activity(request, 'export', 'export', report, '', details={'type': 'csv', 'filename': csv_filename, 'rows': qs.count(), 'emp_code': emp_code_filter or None, 'cached': cached is not None})
+                if cached is not None:
+                    response = FileResponse(cached, as_attachment=True, filename=csv_filename, content_type='text/csv')
+                    response['X-Export-Cache'] = 'hit'
+                    return response
+                # Streamed to the client and into the cache at the same time
+                response = StreamingHttpResponse(export_cache.stream_and_store(key, '.csv', _attendance_csv_stream(qs)), content_type='text/csv')
+                response['Content-Disposition'] = f'attachment; filename="{csv_filename}"'
+                response['X-Export-Cache'] = 'miss'
+                return response
+            fieldnames = ATTENDANCE_EXPORT_FIELDS
+            rows = [dict(zip(fieldnames, values)) for values in _attendance_export_rows(qs)]
         else:
             rows = []
             fieldnames = []
@@ -3292,25 +3457,7 @@ class ExportView(APIView):
             import csv
             from django.http import HttpResponse
 
-            def csv_value(v):
-                if v is None:
-                    return ''
-                if hasattr(v, 'isoformat'):
-                    s = v.isoformat()
-                    # Date only: YYYY-MM-DD (strip time if present)
-                    if 'T' in s:
-                        s = s.split('T')[0]
-                    elif len(s) > 10 and s[10:11] == ' ':
-                        s = s.split(' ')[0]
-                    return s
-                if hasattr(v, 'hour'):  # time object
-                    return v.strftime('%H:%M') if v else ''
-                return str(v)
-
-            csv_filename = f'{report}.csv'
-            if emp_code_filter:
-                safe_emp = ''.join(c for c in emp_code_filter if c.isalnum() or c in '-_')[:30] or 'employee'
-                csv_filename = f'{report}_{safe_emp}.csv'
+            csv_filename = _export_csv_filename(report, emp_code_filter)
             log_activity(request, 'export', 'export', report, '', details={'type': 'csv', 'filename': csv_filename, 'rows': len(rows), 'emp_code': emp_code_filter or None})
             response = HttpResponse(content_type='text/csv')
             response['Content-Disposition'] = f'attachment; filename="{csv_filename}"'
@@ -3318,13 +3465,94 @@ class ExportView(APIView):
                 writer = csv.DictWriter(response, fieldnames=fieldnames, extrasaction='ignore')
                 writer.writeheader()
                 for r in rows:
-                    writer.writerow({k: csv_value(v) for k, v in r.items()})
+                    writer.writerow({k: _csv_value(v) for k, v in r.items()})
             else:
                 response.write('No data\n')
             return response
         log_activity(request, 'export', 'export', report, '', details={'type': 'json', 'rows': len(rows)})
         return Response({'rows': rows})
 
+    def _columnar(self, request, admin, allowed_emp_codes, export_type, report, date_from, date_to, emp_code_filter):
+        from django.http import FileResponse
+        from . import export_arrow, export_cache
+        if not export_arrow.available():
+            return Response({'error': 'Parquet / Arrow export needs pyarrow on the server (pip install pyarrow)'}, status=501)
+        if report not in export_arrow.REPORTS:
+            return Response({'error': f"report must be one of: {', '.join(export_arrow.REPORTS)}"}, status=400)
+        try:
+            d_from = date.fromisoformat(date_from) if date_from else None
+            d_to = date.fromisoformat(date_to) if date_to else None
+        except ValueError:
+            return Response({'error': 'date_from and date_to must be YYYY-MM-DD'}, status=400)
+        suffix, content_type = export_arrow.FORMATS[export_type]
+        filename = _export_csv_filename(report, emp_code_filter).rsplit('.', 1)[0] + suffix
+        qs = export_arrow.build_queryset(report, allowed_emp_codes, emp_code_filter or None, d_from, d_to)
+        key = export_cache.make_key(
+            f'{report}_{export_type}', {'date_from': d_from, 'date_to': d_to, 'emp_code': emp_code_filter},
+            company_id=getattr(admin, 'company_id', None) if admin else None, allowed_emp_codes=allowed_emp_codes,
+        )
+        cached = export_cache.get(key, suffix)
+        log_activity(request, 'export', 'export', report, '', details={'type': export_type, 'filename': filename, 'emp_code': emp_code_filter or None, 'cached': cached is not None})
+        if cached is not None:
+            response = FileResponse(cached, as_attachment=True, filename=filename, content_type=content_type)
+            response['X-Export-Cache'] = 'hit'
+            return response
+        response = StreamingHttpResponse(
+            export_cache.stream_and_store(key, suffix, export_arrow.stream(report, export_type, qs)), content_type=content_type,
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response['X-Export-Cache'] = 'miss'
+        return response
+
+
+class ExportJobCreateView(APIView):
+    """POST { kind: payroll|export|salary_history, params: {same query params as the export endpoint} }:
+    run the export in the background (core.export_jobs). 202 with the job; poll export/jobs/<token>/."""
+    def post(self, request):
+        from . import export_jobs
+        admin, allowed_emp_codes = get_request_admin(request)
+        if not admin:
+            return Response({'error': 'Not allowed'}, status=403)
+        kind = str(request.data.get('kind') or '').strip()
+        params = request.data.get('params') or {}
+        if kind not in export_jobs.KINDS:
+            return Response({'error': f"kind must be one of: {', '.join(export_jobs.KINDS)}"}, status=400)
+        if not isinstance(params, dict):
+            return Response({'error': 'params must be an object'}, status=400)
+        job, joined = export_jobs.submit(kind, params, admin, allowed_emp_codes)
+        if not joined:
+            log_activity(request, 'export', 'export', 'export_job', job.token[:8], details={'kind': kind, 'params': job.params})
+        return Response({'success': True, 'joined': joined, 'job': export_jobs.job_status(job)}, status=202)
+
+
+class ExportJobDetailView(APIView):
+    """GET: status, progress and phase of an export job; download_url once done (until it expires)."""
+    def get(self, request, token):
+        from . import export_jobs
+        job = ExportJob.objects.filter(token=token).first()
+        if not job:
+            return Response({'error': 'Not found'}, status=404)
+        return Response(export_jobs.job_status(job))
+
+
+class ExportJobDownloadView(APIView):
+    """GET: the finished export file (the token is the credential, so plain links work). 410 once expired."""
+    def get(self, request, token):
+        from django.http import FileResponse
+        from . import export_jobs
+        job = ExportJob.objects.filter(token=token).first()
+        if not job:
+            return Response({'error': 'Not found'}, status=404)
+        if export_jobs.is_expired(job):
+            return Response({'error': 'Export expired, start it again'}, status=410)
+        if job.status != ExportJob.STATUS_DONE:
+            return Response({'error': f'Export is {job.status}'}, status=409)
+        try:
+            f = open(job.file_path, 'rb')
+        except OSError:
+            return Response({'error': 'Export file missing, start it again'}, status=410)
+        return FileResponse(f, as_attachment=True, filename=job.filename, content_type=job.content_type)
+
 
 # ---------- Employee profile (detail + history) ----------
 class EmployeeProfileView(APIView):
@@ -3340,26 +3568,7 @@ class EmployeeProfileView(APIView):
         adjustments = Adjustment.objects.filter(emp_code=emp_code).order_by('-created_at')[:20]
         salaries = Salary.objects.filter(emp_code=emp_code).order_by('-year', '-month')[:24]
         sal_list = SalarySerializer(salaries, many=True).data
-        for row in sal_list:
-            m, y = row.get('month'), row.get('year')
-            adv = get_advance_totals_by_emp(month=m, year=y)
-            advance_total = adv.get(emp_code, Decimal('0'))
-            row['advance_total'] = str(advance_total)
-            penalty_total = Decimal('0')
-            if (row.get('salary_type') or '').strip() == 'Hourly':
-                agg = Penalty.objects.filter(emp_code=emp_code, month=m, year=y).aggregate(s=Sum('deduction_amount'))
-                if agg.get('s') is not None:
-                    penalty_total = agg['s']
-            row['penalty_deduction'] = str(penalty_total)
-            gross, _ = _gross_and_rate(
-                row.get('salary_type'),
-                row.get('base_salary'),
-                row.get('total_working_hours'),
-                row.get('overtime_hours'),
-                row.get('bonus'),
-            )
-            row['gross_salary'] = str(round(gross, 2))
-            row['net_pay'] = str(round(gross - advance_total - penalty_total, 2))
+        _add_salary_pay_columns(sal_list, emp_code)
         # Calendar + stats for current month (same as employee dashboard)
         today = timezone.localdate()
         y, m = today.year, today.month
@@ -3670,7 +3879,8 @@ class SystemOwnerCompanyDetailView(APIView):
         except Company.DoesNotExist:
             return Response({'error': 'Not found'}, status=404)
         emp_codes = list(Employee.objects.filter(company_id=pk).values_list('emp_code', flat=True))
-        with transaction.atomic():
+        from .data_version import deferred
+        with deferred(), transaction.atomic():
             if emp_codes:
                 Penalty.objects.filter(emp_code__in=emp_codes).delete()
                 LeaveRequest.objects.filter(emp_code__in=emp_codes).delete()
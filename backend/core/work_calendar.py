@@ -0,0 +1,154 @@
+"""
+Shared working-day calendar: Holiday table + per-company weekly off days.
+Each (company, year) is loaded once into a 366-slot bitmap with prefix sums, so
+is_working_day / working_days_between / next_working_day never hit the DB per date.
+HolidayViewSet writes call invalidate(); other processes notice through a version
+stamp in SystemSetting that is re-checked at most every VERSION_CHECK_SECONDS.
+invalidate() also drops the affected streak states (core.streak_state), which depend on working days.
+"""
+import logging
+import threading
+import time
+from datetime import date, timedelta
+
+from .models import Holiday, SystemSetting
+from .settings_utils import get_company_setting
+
+WEEKLY_OFF_KEY = 'weekly_off_days'  # comma-separated weekdays, Monday=0 .. Sunday=6
+DEFAULT_WEEKLY_OFF = '6'
+VERSION_KEY = 'work_calendar_version'
+VERSION_CHECK_SECONDS = 60
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_cache = {}  # (company_id, year) -> (off bytearray, prefix list of working-day counts)
+_version = None
+_version_checked_at = 0.0
+
+
+def _weekly_off_days(company_id=None):
+    """Set of weekday numbers (Monday=0) that are weekly off for this company."""
+    raw = get_company_setting(WEEKLY_OFF_KEY, company_id=company_id, default=DEFAULT_WEEKLY_OFF)
+    days = set()
+    for part in str(raw or '').split(','):
+        part = part.strip()
+        if part.isdigit() and 0 <= int(part) <= 6:
+            days.add(int(part))
+    return days
+
+
+def _read_version():
+    return SystemSetting.objects.filter(key=VERSION_KEY).values_list('value', flat=True).first() or ''
+
+
+def _check_version():
+    """Drop the cache when another process bumped the calendar version."""
+    global _version, _version_checked_at
+    now = time.monotonic()
+    if now - _version_checked_at < VERSION_CHECK_SECONDS:
+        return
+    _version_checked_at = now
+    try:
+        current = _read_version()
+    except Exception:
+        return
+    if _version is not None and current != _version:
+        _cache.clear()
+    _version = current
+
+
+def _load_year(year, company_id=None):
+    """Build (off, prefix) for one year. off[i] = 1 when day i (0 = Jan 1) is not a working day."""
+    start = date(year, 1, 1)
+    n_days = (date(year + 1, 1, 1) - start).days
+    off = bytearray(n_days)
+    weekly_off = _weekly_off_days(company_id)
+    if weekly_off:
+        first_wd = start.weekday()
+        for i in range(n_days):
+            if (first_wd + i) % 7 in weekly_off:
+                off[i] = 1
+    for d in Holiday.objects.filter(date__year=year).values_list('date', flat=True):
+        off[(d - start).days] = 1
+    prefix = [0] * (n_days + 1)
+    for i in range(n_days):
+        prefix[i + 1] = prefix[i] + (0 if off[i] else 1)
+    return off, prefix
+
+
+def _year_data(year, company_id=None):
+    with _lock:
+        _check_version()
+        key = (company_id, year)
+        data = _cache.get(key)
+        if data is None:
+            data = _load_year(year, company_id)
+            _cache[key] = data
+        return data
+
+
+def invalidate(year=None, company_id=None):
+    """
+    Forget cached years (all when year is None) and bump the shared version so other processes reload.
+    company_id: only that company's weekly off changed (None = holidays or the global weekly off, everyone).
+    Streak states over the changed days are dropped so the reward engine rebuilds them.
+    """
+    global _version
+    with _lock:
+        if year is None:
+            _cache.clear()
+        else:
+            for key in [k for k in _cache if k[1] == year]:
+                del _cache[key]
+        _version = str(time.time())
+    try:
+        SystemSetting.objects.update_or_create(
+            key=VERSION_KEY,
+            defaults={'value': _version, 'description': 'Bumped when holidays / weekly off change'},
+        )
+    except Exception:
+        pass
+    try:
+        from .streak_state import mark_calendar_changed
+        mark_calendar_changed(year=year, company_id=company_id)
+    except Exception:
+        logger.warning('Streak state invalidation failed', exc_info=True)
+
+
+def is_holiday(d, company_id=None):
+    """True when d is a weekly off for the company or a date in the Holiday table."""
+    off, _ = _year_data(d.year, company_id)
+    return bool(off[d.timetuple().tm_yday - 1])
+
+
+def is_working_day(d, company_id=None):
+    return not is_holiday(d, company_id)
+
+
+def working_days_between(start, end, company_id=None):
+    """Number of working days in [start, end] inclusive. 0 when end < start."""
+    if end < start:
+        return 0
+    total = 0
+    for year in range(start.year, end.year + 1):
+        _, prefix = _year_data(year, company_id)
+        lo = start.timetuple().tm_yday - 1 if year == start.year else 0
+        hi = end.timetuple().tm_yday if year == end.year else len(prefix) - 1
+        total += prefix[hi] - prefix[lo]
+    return total
+
+
+def next_working_day(d, company_id=None, include_self=False):
+    """First working day after d (or d itself when include_self and d is working). Gives up after 366 days."""
+    cur = d if include_self else d + timedelta(days=1)
+    limit = cur + timedelta(days=366)
+    year, offset = cur.year, cur.timetuple().tm_yday - 1
+    while year <= limit.year:
+        off, prefix = _year_data(year, company_id)
+        # Prefix sums tell whether the rest of the year has a working day at all; find() jumps to it
+        if prefix[-1] - prefix[offset] > 0:
+            found = date(year, 1, 1) + timedelta(days=off.find(0, offset))
+            return found if found <= limit else None
+        year, offset = year + 1, 0
+    return None
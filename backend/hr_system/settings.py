@@ -42,7 +42,6 @@ MIDDLEWARE = [
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'core.middleware.JWTAdminMiddleware',  # JWT: set request.jwt_admin_id from Authorization Bearer
-    'core.middleware.TodayPunchInSyncMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -117,6 +116,25 @@ CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 # Fallback: if Redis not available, run tasks synchronously in management command
 REWARD_ENGINE_USE_CELERY = os.environ.get('REWARD_ENGINE_USE_CELERY', 'false').lower() == 'true'
 
+# Background scheduler (core.scheduler): start in every server process (runserver, gunicorn, ...; never in other
+# management commands); one leader is elected via DB advisory lock. false = run `manage.py run_scheduler` separately
+SCHEDULER_AUTOSTART = os.environ.get('SCHEDULER_AUTOSTART', 'true').lower() == 'true'
+
+# Google Sheet auto-sync (core.sheet_sync_pool): companies synced in parallel under one Sheets API rate limit
+GOOGLE_SHEETS_SYNC_WORKERS = int(os.environ.get('GOOGLE_SHEETS_SYNC_WORKERS', 4))
+GOOGLE_SHEETS_REQUESTS_PER_MINUTE = int(os.environ.get('GOOGLE_SHEETS_REQUESTS_PER_MINUTE', 60))  # Sheets write quota per user
+GOOGLE_SHEETS_SYNC_TIMEOUT = int(os.environ.get('GOOGLE_SHEETS_SYNC_TIMEOUT', 90))  # seconds per company sync
+
+# Export cache (core.export_cache): generated payroll workbooks / attendance CSV on local disk, keyed by data version
+EXPORT_CACHE_DIR = os.environ.get('EXPORT_CACHE_DIR') or str(BASE_DIR / 'export_cache')
+EXPORT_CACHE_MAX_MB = int(os.environ.get('EXPORT_CACHE_MAX_MB', 500))  # 0 = cache off
+EXPORT_CACHE_MAX_AGE_SECONDS = int(os.environ.get('EXPORT_CACHE_MAX_AGE_SECONDS', 24 * 3600))
+
+# Background export jobs (core.export_jobs): large exports run in worker threads, files kept for download
+EXPORT_JOBS_DIR = os.environ.get('EXPORT_JOBS_DIR') or str(BASE_DIR / 'export_jobs')
+EXPORT_JOB_WORKERS = int(os.environ.get('EXPORT_JOB_WORKERS', 2))
+EXPORT_JOB_TTL_HOURS = int(os.environ.get('EXPORT_JOB_TTL_HOURS', 24))  # download link lifetime
+
 # JWT authentication (admin login / API auth)
 JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or SECRET_KEY
 JWT_ACCESS_TTL = int(os.environ.get('JWT_ACCESS_TTL', 15 * 60))   # 15 minutes
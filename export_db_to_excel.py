@@ -6,15 +6,30 @@ one sheet per table with columns and data as stored in the database.
 Run from project root:
   pip install psycopg2-binary openpyxl
   python export_db_to_excel.py
+  python export_db_to_excel.py --workers 8          # tables exported in parallel
+  python export_db_to_excel.py --incremental        # only rows changed since the last run
 
 Uses same DB as Django: set DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
 in backend/.env or environment (no default password).
+
+Large tables: rows are read through a named (server-side) cursor FETCH_BATCH_ROWS at a time and
+appended to write-only sheets, so memory does not grow with table size. A table with more rows than
+one Excel sheet holds continues on <table>_2, <table>_3, ...
+Parallel: each worker has its own connection; all of them read the same snapshot
+(pg_export_snapshot), so the sheets are consistent with each other.
+Incremental: rows whose updated_at (else created_at) is at or after the previous run's snapshot time
+(minus INCREMENTAL_OVERLAP_SECONDS, so rows committed late are not missed; they may repeat) go to a
+separate hr_export_changes_<time>.xlsx. Tables with neither column are exported in full. The time is
+kept in hr_export_state.json after a successful run. Payroll sheets are only built for full exports.
 """
 
+import argparse
 import json
 import os
 import re
-from datetime import date, datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
 from pathlib import Path
 
 try:
@@ -26,6 +41,7 @@ except ImportError:
 
 try:
     from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
     from openpyxl.styles import Font, PatternFill
     from openpyxl.utils import get_column_letter
 except ImportError:
@@ -53,6 +69,12 @@ DB_PASSWORD = os.environ.get("DB_PASSWORD", "Seeta#4597")
 DB_HOST = os.environ.get("DB_HOST", "localhost")
 DB_PORT = os.environ.get("DB_PORT", "5432")
 
+EXPORT_WORKERS = int(os.environ.get("EXPORT_WORKERS", 4))  # tables exported in parallel (one DB connection each)
+FETCH_BATCH_ROWS = 5000  # rows per round trip of the server-side cursor
+EXCEL_MAX_ROWS = 1048576  # rows per sheet (header included); longer tables continue on another sheet
+INCREMENTAL_OVERLAP_SECONDS = 300
+STATE_PATH = Path(__file__).resolve().parent / "hr_export_state.json"
+
 # Tables to export: (table_name, ORDER BY clause). Sheet name = table name (sanitized).
 # If FETCH_ALL_TABLES is True, ALL tables in public schema are discovered and exported
 # (including any new tables from migrations). Use False to export only the list below.
@@ -90,12 +112,16 @@ def sanitize_sheet_name(name):
     return (s[:31]) if len(s) > 31 else s
 
 
-def get_connection():
+def get_connection(snapshot=None):
+    """
+    New connection in a read-only REPEATABLE READ transaction. snapshot: id from export_snapshot()
+    on another connection, so this one sees exactly the same data.
+    """
     if not DB_PASSWORD and not os.environ.get("DB_PASSWORD"):
         raise SystemExit(
             "DB_PASSWORD not set. Create backend/.env from backend/.env.example with DB_* values, or set DB_PASSWORD in the environment."
         )
-    return psycopg2.connect(
+    conn = psycopg2.connect(
         dbname=DB_NAME,
         user=DB_USER,
         password=DB_PASSWORD,
@@ -103,6 +129,29 @@ def get_connection():
         port=DB_PORT,
         cursor_factory=RealDictCursor,
     )
+    conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+    if snapshot:
+        with conn.cursor() as cur:
+            cur.execute("SET TRANSACTION SNAPSHOT %s", (snapshot,))  # must be the transaction's first statement
+    return conn
+
+
+def export_snapshot(conn):
+    """(snapshot id, snapshot time) of conn's transaction; conn must stay open while others import it."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_export_snapshot() AS snapshot, now() AS at")
+        r = cur.fetchone()
+    return r["snapshot"], r["at"]
+
+
+def get_table_columns(conn, table_name):
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = 'public' AND table_name = %s
+            ORDER BY ordinal_position
+        """, (table_name,))
+        return [r["column_name"] for r in cur.fetchall()]
 
 
 def get_all_tables(conn):
@@ -116,13 +165,7 @@ def get_all_tables(conn):
         tables = [r["table_name"] for r in cur.fetchall()]
     result = []
     for table_name in tables:
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT column_name FROM information_schema.columns
-                WHERE table_schema = 'public' AND table_name = %s
-                ORDER BY ordinal_position
-            """, (table_name,))
-            cols = [r["column_name"] for r in cur.fetchall()]
+        cols = get_table_columns(conn, table_name)
         if not cols:
             result.append((table_name, "1"))
             continue
@@ -135,23 +178,47 @@ def get_all_tables(conn):
     return result
 
 
-def fetch_table(conn, table_name, order_by):
-    """Fetch all rows from a table. Returns list of dicts; columns = keys from first row."""
-    with conn.cursor() as cur:
-        cur.execute(f'SELECT * FROM "{table_name}" ORDER BY {order_by}')
-        return cur.fetchall()
+def change_column(columns):
+    """Column that tells when a row last changed (incremental mode), or None."""
+    for name in ("updated_at", "created_at"):
+        if name in columns:
+            return name
+    return None
+
+
+def iter_table(conn, table_name, order_by, since=None, since_column=None):
+    """
+    Yield (column names, list of row tuples) FETCH_BATCH_ROWS rows at a time from a named server-side
+    cursor. since / since_column: only rows with since_column >= since.
+    """
+    sql = f'SELECT * FROM "{table_name}"'
+    params = ()
+    if since is not None and since_column:
+        sql += f' WHERE "{since_column}" >= %s'
+        params = (since,)
+    sql += f" ORDER BY {order_by}"
+    cursor_name = "export_" + re.sub(r"\W", "_", table_name)
+    with conn.cursor(name=cursor_name, cursor_factory=psycopg2.extensions.cursor) as cur:
+        cur.itersize = FETCH_BATCH_ROWS
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(FETCH_BATCH_ROWS)
+            if not rows:
+                break
+            yield [d[0] for d in cur.description], rows
 
 
 def fetch_attendance_for_payroll(conn):
-    """Emp code, date, total_working_hours for daily earnings calc (computed payroll)."""
+    """Emp code, date, total_working_hours for daily earnings calc (computed payroll); streamed."""
     sql = """
     SELECT emp_code, date, total_working_hours
     FROM attendance
     ORDER BY date, emp_code
     """
-    with conn.cursor() as cur:
+    with conn.cursor(name="export_payroll_attendance") as cur:
+        cur.itersize = FETCH_BATCH_ROWS
         cur.execute(sql)
-        return cur.fetchall()
+        yield from cur
 
 
 def value_for_excel(v):
@@ -249,24 +316,19 @@ def build_payroll_data(emp_rows, att_rows):
     return sorted_dates, payroll_rows
 
 
-def write_sheet_from_rows(ws, title, rows, columns):
-    """Write header and rows to worksheet. columns = list of (key, header_label)."""
-    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-    header_font = Font(bold=True, color="FFFFFF")
-    for col_idx, (_, header) in enumerate(columns, 1):
-        cell = ws.cell(row=1, column=col_idx, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-    for row_idx, row in enumerate(rows, 2):
-        for col_idx, (key, _) in enumerate(columns, 1):
-            val = row.get(key)
-            ws.cell(row=row_idx, column=col_idx, value=value_for_excel(val))
-    # Auto-fit idea: set column width from max length
-    for col_idx, (key, header) in enumerate(columns, 1):
-        max_len = len(str(header))
-        for r in rows:
-            max_len = max(max_len, len(str(value_for_excel(r.get(key)))))
-        ws.column_dimensions[get_column_letter(col_idx)].width = min(max_len + 1, 50)
+HEADER_FILL = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+HEADER_FONT = Font(bold=True, color="FFFFFF")
+BOLD_FONT = Font(bold=True)
+
+
+def _cell(ws, value, font=None, fill=None):
+    """Styled cell for a write-only sheet."""
+    c = WriteOnlyCell(ws, value=value)
+    if font is not None:
+        c.font = font
+    if fill is not None:
+        c.fill = fill
+    return c
 
 
 def _column_header(col_name):
@@ -274,13 +336,85 @@ def _column_header(col_name):
     return str(col_name).replace("_", " ").strip().title()
 
 
-def write_sheet_from_table(ws, table_name, rows):
-    """Write one sheet from table rows (list of dicts). Columns = keys from first row."""
-    if not rows:
-        ws.cell(row=1, column=1, value=f"(no data in {table_name})")
-        return
-    columns = [(k, _column_header(k)) for k in rows[0].keys()]
-    write_sheet_from_rows(ws, table_name, rows, columns)
+class TableSheets:
+    """
+    Sheet(s) of one table in a write-only workbook. The first sheet is created up front (so sheets keep
+    the table order); more are added when a sheet is full. Workbook changes happen under the shared lock:
+    openpyxl is not thread-safe, the DB reads of the workers are what runs in parallel.
+    """
+
+    def __init__(self, wb, lock, table_name, used_names):
+        self.wb = wb
+        self.lock = lock
+        self.table_name = table_name
+        self.used_names = used_names
+        self.columns = None
+        self.widths = None
+        self.sheets = []
+        self.rows_in_sheet = 0
+        self.rows = 0
+        with lock:
+            self.ws = self._new_sheet()
+
+    def _new_sheet(self):
+        base = sanitize_sheet_name(self.table_name)
+        title = base
+        n = 2
+        while title in self.used_names:
+            title = f"{base[:31 - len(str(n)) - 1]}_{n}"
+            n += 1
+        self.used_names.add(title)
+        ws = self.wb.create_sheet(title=title)
+        self.sheets.append(title)
+        return ws
+
+    def _start_sheet(self, ws):
+        # Write-only sheets need widths before the first row
+        for col_idx, width in enumerate(self.widths, 1):
+            ws.column_dimensions[get_column_letter(col_idx)].width = width
+        ws.append([_cell(ws, _column_header(c), HEADER_FONT, HEADER_FILL) for c in self.columns])
+        self.rows_in_sheet = 1
+
+    def append(self, columns, rows):
+        values = [[value_for_excel(v) for v in r] for r in rows]
+        with self.lock:
+            if self.columns is None:
+                # Width from the header and the first batch (the rest is not known yet when streaming)
+                self.columns = columns
+                self.widths = [
+                    min(max([len(str(_column_header(c)))] + [len(str(v[i])) for v in values]) + 1, 50)
+                    for i, c in enumerate(columns)
+                ]
+                self._start_sheet(self.ws)
+            for v in values:
+                if self.rows_in_sheet >= EXCEL_MAX_ROWS:
+                    self.ws = self._new_sheet()
+                    self._start_sheet(self.ws)
+                self.ws.append(v)
+                self.rows_in_sheet += 1
+            self.rows += len(values)
+
+    def finish(self, empty_message):
+        if self.columns is None:
+            with self.lock:
+                self.ws.append([empty_message])
+
+
+def export_table(snapshot, wb_lock, sheets, table_name, order_by, since=None):
+    """Worker: stream one table into its sheets over its own connection. Returns a summary line."""
+    conn = get_connection(snapshot)
+    try:
+        since_column = change_column(get_table_columns(conn, table_name)) if since is not None else None
+        for columns, rows in iter_table(conn, table_name, order_by, since, since_column):
+            sheets.append(columns, rows)
+        if since is not None and since_column:
+            sheets.finish(f"(no changes in {table_name} since {since.isoformat()})")
+        else:
+            sheets.finish(f"(no data in {table_name})")
+    finally:
+        conn.close()
+    mode = "" if since is None else (f" changed since {since_column}" if since_column else " (full: no updated_at/created_at)")
+    return f"  {table_name}: {sheets.rows} rows{mode} -> {', '.join(sheets.sheets)}"
 
 
 def write_payroll_sheet(ws, sorted_dates, payroll_rows, sheet_title):
@@ -288,8 +422,12 @@ def write_payroll_sheet(ws, sorted_dates, payroll_rows, sheet_title):
     Write payroll layout: Emp Code, STAFF, Pla, Status, Under Work, Department, Sala, Du,
     then one column per date (daily earnings), TOTAL, Advance. Last row = totals.
     """
-    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-    header_font = Font(bold=True, color="FFFFFF")
+    # Column widths (write-only sheet: before any row)
+    ws.column_dimensions["A"].width = 12
+    ws.column_dimensions["B"].width = 20
+    for col_idx in range(9, 9 + len(sorted_dates)):
+        ws.column_dimensions[get_column_letter(col_idx)].width = 12
+
     # Headers
     headers = [
         "Emp Code", "STAFF", "Pla", "Status", "Under Work", "Department", "Sala", "Du"
@@ -298,91 +436,103 @@ def write_payroll_sheet(ws, sorted_dates, payroll_rows, sheet_title):
         headers.append(d.strftime("%d-%m-%y") if hasattr(d, "strftime") else str(d))
     headers.append("TOTAL")
     headers.append("Advance")
-
-    for col_idx, h in enumerate(headers, 1):
-        c = ws.cell(row=1, column=col_idx, value=h)
-        c.fill = header_fill
-        c.font = header_font
+    ws.append([_cell(ws, h, HEADER_FONT, HEADER_FILL) for h in headers])
 
     # Data rows
-    for row_idx, row in enumerate(payroll_rows, 2):
-        ws.cell(row=row_idx, column=1, value=row.get("emp_code"))
-        ws.cell(row=row_idx, column=2, value=row.get("name"))
-        ws.cell(row=row_idx, column=3, value=row.get("pla"))
-        ws.cell(row=row_idx, column=4, value=row.get("status"))
-        ws.cell(row=row_idx, column=5, value=row.get("under_work"))
-        ws.cell(row=row_idx, column=6, value=row.get("department"))
-        ws.cell(row=row_idx, column=7, value=row.get("sala"))
-        ws.cell(row=row_idx, column=8, value=row.get("du"))
-        for col_idx, day_val in enumerate(row.get("_day_totals", []), 9):
-            ws.cell(row=row_idx, column=col_idx, value=day_val)
-        ws.cell(row=row_idx, column=9 + len(sorted_dates), value=row.get("total"))
-        ws.cell(row=row_idx, column=10 + len(sorted_dates), value=row.get("advance"))
-
-    # Totals row at bottom
-    tot_row = len(payroll_rows) + 2
-    ws.cell(row=tot_row, column=1, value="Total")
-    ws.cell(row=tot_row, column=1).font = Font(bold=True)
-    for col_idx in range(2, 9):
-        ws.cell(row=tot_row, column=col_idx, value="")
     col_totals = [0.0] * len(sorted_dates)
     grand_total = 0.0
     advance_total = 0.0
     for row in payroll_rows:
-        for i, v in enumerate(row.get("_day_totals", [])):
+        day_totals = row.get("_day_totals", [])
+        ws.append(
+            [row.get("emp_code"), row.get("name"), row.get("pla"), row.get("status"), row.get("under_work"),
+             row.get("department"), row.get("sala"), row.get("du")]
+            + list(day_totals) + [row.get("total"), row.get("advance")]
+        )
+        for i, v in enumerate(day_totals):
             if i < len(col_totals):
                 col_totals[i] += v
         grand_total += row.get("total") or 0
         advance_total += row.get("advance") or 0
-    for col_idx, tot in enumerate(col_totals, 9):
-        ws.cell(row=tot_row, column=col_idx, value=round(tot, 2))
-        ws.cell(row=tot_row, column=col_idx).font = Font(bold=True)
-    ws.cell(row=tot_row, column=9 + len(sorted_dates), value=round(grand_total, 2))
-    ws.cell(row=tot_row, column=9 + len(sorted_dates)).font = Font(bold=True)
-    ws.cell(row=tot_row, column=10 + len(sorted_dates), value=round(advance_total, 2))
-    ws.cell(row=tot_row, column=10 + len(sorted_dates)).font = Font(bold=True)
-
-    # Column widths
-    ws.column_dimensions["A"].width = 12
-    ws.column_dimensions["B"].width = 20
-    for col_idx in range(9, 9 + len(sorted_dates)):
-        ws.column_dimensions[get_column_letter(col_idx)].width = 12
+
+    # Totals row at bottom
+    ws.append(
+        [_cell(ws, "Total", BOLD_FONT)] + [""] * 7
+        + [_cell(ws, round(v, 2), BOLD_FONT) for v in col_totals + [grand_total, advance_total]]
+    )
+
+
+def load_state():
+    try:
+        return json.loads(STATE_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(snapshot_at):
+    STATE_PATH.write_text(json.dumps({"last_run": snapshot_at.isoformat()}, indent=2), encoding="utf-8")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Export all HR database tables to one Excel workbook.")
+    parser.add_argument("--workers", type=int, default=EXPORT_WORKERS, help="Tables exported in parallel (one DB connection each)")
+    parser.add_argument("--incremental", action="store_true", help="Only rows changed since the last run (hr_export_state.json)")
+    parser.add_argument("--since", type=str, default="", help="Incremental from this ISO date/time instead of the last run")
+    parser.add_argument("--output", type=str, default="", help="Output .xlsx path")
+    return parser.parse_args()
 
 
 def main():
-    out_path = Path(__file__).resolve().parent / "hr_export_all_data.xlsx"
+    args = parse_args()
+    since = None
+    if args.since:
+        since = datetime.fromisoformat(args.since)
+    elif args.incremental:
+        last_run = load_state().get("last_run")
+        if not last_run:
+            raise SystemExit(f"No previous run in {STATE_PATH.name}; run a full export first or pass --since.")
+        since = datetime.fromisoformat(last_run) - timedelta(seconds=INCREMENTAL_OVERLAP_SECONDS)
+
     print(f"Connecting to DB {DB_NAME}@{DB_HOST}...")
     conn = get_connection()
-    stored = {}
 
     try:
-        wb = Workbook()
-        first_sheet = True
+        snapshot, snapshot_at = export_snapshot(conn)
+        if args.output:
+            out_path = Path(args.output).resolve()
+        elif since is not None:
+            out_path = Path(__file__).resolve().parent / f"hr_export_changes_{snapshot_at:%Y%m%d_%H%M%S}.xlsx"
+        else:
+            out_path = Path(__file__).resolve().parent / "hr_export_all_data.xlsx"
+        if since is not None:
+            print(f"Incremental: rows changed since {since.isoformat()}")
+
+        wb = Workbook(write_only=True)
+        wb_lock = threading.Lock()
+        used_names = set()
 
         tables_to_export = get_all_tables(conn) if FETCH_ALL_TABLES else TABLE_EXPORT_ORDER
 
-        # One sheet per table: columns and data as in the database
-        for table_name, order_by in tables_to_export:
-            print(f"Fetching table: {table_name}...")
-            rows = fetch_table(conn, table_name, order_by)
-            stored[table_name] = rows
-            print(f"  Got {len(rows)} rows.")
-            sheet_title = sanitize_sheet_name(table_name)
-            if first_sheet:
-                ws = wb.active
-                ws.title = sheet_title
-                first_sheet = False
-            else:
-                ws = wb.create_sheet(title=sheet_title)
-            write_sheet_from_table(ws, table_name, rows)
-            print(f"  Written sheet: {sheet_title}")
-
-        # Optional: computed Payroll sheets (daily earnings from employees + attendance)
-        emp_rows = stored.get("employees", [])
+        # One sheet per table (more for very long tables): columns and data as in the database
+        jobs = [(table_name, order_by, TableSheets(wb, wb_lock, table_name, used_names)) for table_name, order_by in tables_to_export]
+        print(f"Exporting {len(jobs)} tables with {max(1, args.workers)} worker(s)...")
+        with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+            futures = [
+                pool.submit(export_table, snapshot, wb_lock, sheets, table_name, order_by, since)
+                for table_name, order_by, sheets in jobs
+            ]
+            for future in futures:
+                print(future.result())
+
+        # Optional: computed Payroll sheets (daily earnings from employees + attendance); full export only
+        emp_rows = []
+        if since is None and any(t == "employees" for t, _ in tables_to_export):
+            with conn.cursor() as cur:
+                cur.execute("SELECT * FROM employees ORDER BY company_id, dept_name, emp_code")
+                emp_rows = cur.fetchall()
         if emp_rows:
             print("Fetching attendance for payroll (computed view)...")
-            att_payroll = fetch_attendance_for_payroll(conn)
-            sorted_dates, payroll_rows = build_payroll_data(emp_rows, att_payroll)
+            sorted_dates, payroll_rows = build_payroll_data(emp_rows, fetch_attendance_for_payroll(conn))
             print(f"  Dates: {len(sorted_dates)} days, Employees: {len(payroll_rows)}")
             ws_payroll_all = wb.create_sheet(title="Payroll_All")
             write_payroll_sheet(ws_payroll_all, sorted_dates, payroll_rows, "Payroll_All")
@@ -395,13 +545,15 @@ def main():
                 subset = [r for r in payroll_rows if (r.get("department") or "") == dept]
                 if not subset:
                     continue
-                sheet_name = "Payroll_" + sanitize_sheet_name(dept if dept else "No_Dept")
+                sheet_name = sanitize_sheet_name("Payroll_" + (dept if dept else "No_Dept"))
                 ws = wb.create_sheet(title=sheet_name)
                 write_payroll_sheet(ws, sorted_dates, subset, sheet_name)
                 print(f"  Written sheet: {sheet_name} ({len(subset)} rows)")
 
         wb.save(out_path)
         print(f"\nSaved: {out_path}")
+        if since is None or args.incremental:
+            save_state(snapshot_at)
     finally:
         conn.close()
 
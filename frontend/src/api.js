@@ -287,6 +287,7 @@ export const googleSheet = {
   getConfig: () => api.get('/settings/google-sheet/'),
   updateConfig: (data) => api.patch('/settings/google-sheet/', data),
   sync: () => api.post('/settings/google-sheet/sync/'),
+  syncStatus: (since) => api.get('/settings/google-sheet/sync/status/', { params: { since } }),
 }
 
 /** Plant Report (Previous day) daily email: recipients, send time, manual send */
@@ -298,6 +299,7 @@ export const plantReportEmail = {
   updateRecipient: (id, data) => api.patch(`/settings/plant-report-email/recipients/${id}/`, data),
   removeRecipient: (id) => api.delete(`/settings/plant-report-email/recipients/${id}/`),
   sendNow: (data) => api.post('/settings/plant-report-email/send-now/', data || {}),
+  download: (type) => api.get('/settings/plant-report-email/download/', { params: { type }, responseType: 'blob' }),
 }
 
 export const exportReport = (params) => api.get('/export/', { params, responseType: 'blob' })
@@ -45,7 +45,10 @@ export default function Dashboard() {
   }
   if (!data) return null
 
-  const { total_employees, active_employees, today_present, today_absent, overtime_leaders, red_flag_employees, streak_rewards } = data
+  const { total_employees, active_employees, today_present, today_absent, overtime_leaders, red_flag_employees, streak_rewards, reward_engine } = data
+  const rewardsUpdated = reward_engine?.last_run
+    ? new Date(reward_engine.last_run).toLocaleString('en-IN', { day: 'numeric', month: 'short', hour: '2-digit', minute: '2-digit' })
+    : null
 
   const presentPct = (active_employees ?? total_employees) > 0 ? Math.round((today_present / (active_employees ?? total_employees)) * 100) : 0
   const redCount = red_flag_employees?.length ?? 0
@@ -110,6 +113,9 @@ export default function Dashboard() {
           <div className="sectionHead">
             <h2 className="sectionTitle">Leaderboard & Streak</h2>
             <span className="sectionBadge">This week</span>
+            <span className={`sectionBadge${reward_engine?.is_fresh ? '' : ' danger'}`} title={reward_engine?.result || ''}>
+              {rewardsUpdated ? `Rewards updated ${rewardsUpdated}` : 'Rewards not run yet'}
+            </span>
           </div>
           <div className="sectionBody">
             <div className="leaderboardSubSection">
@@ -161,7 +167,7 @@ export default function Dashboard() {
                   </tbody>
                 </table>
               ) : (
-                <p className="muted">No streak rewards yet. Run reward engine.</p>
+                <p className="muted">No streak rewards yet. The reward engine runs daily in the background.</p>
               )}
             </div>
           </div>
@@ -15,6 +15,9 @@ const KEY_LABELS = {
   shift_ot_extra_hours_for_1_bonus: 'Every X extra hours = 1 bonus hour (e.g. 2)',
 }
 
+const SYNC_POLL_MS = 2000
+const SYNC_POLL_LIMIT_MS = 10 * 60 * 1000
+
 export default function SystemSettings() {
   const [admin, setAdmin] = useState(null)
   const [adminLoading, setAdminLoading] = useState(true)
@@ -62,6 +65,7 @@ export default function SystemSettings() {
   const [plantReportNewEmail, setPlantReportNewEmail] = useState('')
   const [plantReportSaving, setPlantReportSaving] = useState(false)
   const [plantReportSendNowLoading, setPlantReportSendNowLoading] = useState(false)
+  const [plantReportDownloading, setPlantReportDownloading] = useState('')
   const [plantReportMessage, setPlantReportMessage] = useState('')
   const [plantReportActionOpen, setPlantReportActionOpen] = useState(null)
 
@@ -207,7 +211,7 @@ export default function SystemSettings() {
       const { data } = await runRewardEngine()
       setRunResult(`Created: streak=${data.created?.streak ?? 0}, overtime=${data.created?.overtime ?? 0}, absentee=${data.created?.absentee ?? 0}`)
     } catch (err) {
-      setRunResult('Error: ' + (err.response?.data?.detail || err.message))
+      setRunResult('Error: ' + (err.response?.data?.error || err.response?.data?.detail || err.message))
     } finally {
       setRunLoading(false)
     }
@@ -232,9 +236,24 @@ export default function SystemSettings() {
     setGoogleSheetSyncing(true)
     setGoogleSheetMessage('')
     try {
-      const { data } = await googleSheet.sync()
-      setGoogleSheetLastSync(data.last_sync || null)
-      setGoogleSheetMessage(data.message || 'Sync completed.')
+      const { data: job } = await googleSheet.sync()
+      setGoogleSheetMessage(job.message || 'Sync started.')
+      const since = job.job?.requested_at
+      const startedAt = Date.now()
+      // Sync runs in the background: poll its status until it finished (give up after 10 minutes)
+      while (Date.now() - startedAt < SYNC_POLL_LIMIT_MS) {
+        await new Promise((resolve) => setTimeout(resolve, SYNC_POLL_MS))
+        const { data } = await googleSheet.syncStatus(since)
+        if (data.state === 'done' || data.state === 'failed') {
+          setGoogleSheetLastSync(data.last_sync || null)
+          const msg = data.last_result?.message || (data.state === 'done' ? 'Sync completed.' : 'Sync failed')
+          setGoogleSheetMessage(data.state === 'failed' && !msg.includes('Failed') ? `Failed: ${msg}` : msg)
+          return
+        }
+        const elapsed = data.elapsed_seconds != null ? ` · ${Math.round(data.elapsed_seconds)}s` : ''
+        setGoogleSheetMessage(data.state === 'running' ? `Syncing: ${data.phase || 'working'}${elapsed}` : 'Waiting for the running sync to finish…')
+      }
+      setGoogleSheetMessage('Sync is still running in the background; check Last sync later.')
     } catch (err) {
       const res = err.response?.data
       setGoogleSheetMessage(res?.message || res?.error || res?.detail || err.message || 'Sync failed')
@@ -330,6 +349,24 @@ export default function SystemSettings() {
     }
   }
 
+  const handlePlantReportDownload = async (format) => {
+    setPlantReportDownloading(format)
+    setPlantReportMessage('')
+    try {
+      const { data } = await plantReportEmail.download(format)
+      const url = URL.createObjectURL(data)
+      const a = document.createElement('a')
+      a.href = url
+      a.download = `Plant_Report_previous_day.${format}`
+      a.click()
+      URL.revokeObjectURL(url)
+    } catch (err) {
+      setPlantReportMessage(err.response?.status === 404 ? 'Plant Report image not available.' : (err.message || 'Download failed'))
+    } finally {
+      setPlantReportDownloading('')
+    }
+  }
+
   const handleSaveSmtp = async (e) => {
     e.preventDefault()
     if (!smtp?.id) {
@@ -674,6 +711,12 @@ export default function SystemSettings() {
                 <button type="button" className="btn btn-secondary" onClick={handlePlantReportSendNow} disabled={plantReportSendNowLoading}>
                   {plantReportSendNowLoading ? 'Sending…' : 'Send now'}
                 </button>
+                <button type="button" className="btn btn-secondary" onClick={() => handlePlantReportDownload('xlsx')} disabled={!!plantReportDownloading}>
+                  {plantReportDownloading === 'xlsx' ? 'Downloading…' : 'Download Excel'}
+                </button>
+                <button type="button" className="btn btn-secondary" onClick={() => handlePlantReportDownload('png')} disabled={!!plantReportDownloading}>
+                  {plantReportDownloading === 'png' ? 'Downloading…' : 'Download image'}
+                </button>
               </div>
               <p className="muted" style={{ marginTop: 6, fontSize: 12 }}>Difference in email = Ma'am amount − (Total Salary + OT bonus (rs)) from Plant Report. Send now uses the amount in the box and includes the difference (no need to Save first).</p>
             </form>